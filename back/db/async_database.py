@@ -0,0 +1,105 @@
+"""
+Асинхронный стек БД (AsyncEngine/AsyncSession), включается DB_MODE=async.
+
+В режиме sync (по умолчанию) обработчики - обычные def: FastAPI запускает
+их в пуле потоков anyio, и число одновременных запросов ограничено пулом.
+В режиме async декоратор db_endpoint превращает обработчик в async def:
+тот же код выполняется через AsyncSession.run_sync на асинхронном
+драйвере (aiosqlite / asyncpg) - ожидание БД не занимает поток.
+
+Служебный код (создание таблиц, начальные данные, скрипты, стриминг
+выгрузок) продолжает работать через синхронный engine из database.py.
+
+Ограничения режима async:
+- тело обработчика выполняется в потоке цикла событий, и асинхронным
+  становится только ожидание БД. Все остальное - CPU и блокировки
+  threading - останавливает цикл для всех запросов. Поэтому db_endpoint
+  ставится только на обработчики, занятые в основном запросами к БД.
+  Каталог автомобилей (routers/vehicles.py) работает с индексами в
+  памяти и остается обычным def в пуле потоков;
+- внутри db_endpoint нельзя держать блокировку threading во время
+  запроса к БД: пока запрос ждет, другой обработчик в том же потоке
+  встанет на этой блокировке и остановит цикл навсегда
+  (см. single-flight в services/cache.py);
+- на SQLite aiosqlite выполняет каждый запрос через отдельный поток и
+  медленнее синхронного драйвера: на смеси scripts/bench_db_modes.py
+  async дал 218 запросов/с против 352 в sync. Режим async имеет смысл
+  на PostgreSQL (asyncpg) при большом числе одновременных медленных
+  запросов; для SQLite остается sync.
+"""
+import functools
+import inspect
+import os
+
+from fastapi import Depends
+
+from .database import DATABASE_URL, SQLITE_PROFILE_ENABLED, install_sqlite_profile, pool_options
+
+DB_MODE = os.getenv("DB_MODE", "sync").lower()
+ASYNC_MODE = DB_MODE == "async"
+
+# Асинхронные драйверы для схем синхронного DATABASE_URL
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    """sqlite:///x.db -> sqlite+aiosqlite:///x.db, postgresql://... -> postgresql+asyncpg://..."""
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+", 1)[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"Нет асинхронного драйвера для {dialect}")
+    if dialect == "postgresql":
+        # asyncpg не понимает libpq-параметр sslmode
+        rest = rest.replace("sslmode=", "ssl=")
+    return f"{ASYNC_DRIVERS[dialect]}://{rest}"
+
+
+async_engine = None
+AsyncSessionLocal = None
+
+if ASYNC_MODE:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    async_engine = create_async_engine(
+        async_database_url(DATABASE_URL),
+        **pool_options(DATABASE_URL, "async", AsyncAdaptedQueuePool)
+    )
+    if SQLITE_PROFILE_ENABLED:
+        install_sqlite_profile(async_engine.sync_engine)
+    # Объекты не истекают после commit: ленивая загрузка после выхода из run_sync невозможна
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def db_endpoint(func):
+    """Обработчик с параметром db: Session для обоих режимов.
+
+    В режиме sync возвращает функцию без изменений. В режиме async -
+    async def с той же сигнатурой, где db берется из get_async_db,
+    а тело выполняется через run_sync.
+    """
+    if not ASYNC_MODE:
+        return func
+
+    signature = inspect.signature(func)
+    parameters = [
+        parameter.replace(default=Depends(get_async_db), annotation=inspect.Parameter.empty)
+        if name == "db" else parameter
+        for name, parameter in signature.parameters.items()
+    ]
+
+    @functools.wraps(func)
+    async def endpoint(*args, **kwargs):
+        db = kwargs.pop("db")
+        return await db.run_sync(lambda session: func(*args, db=session, **kwargs))
+
+    endpoint.__signature__ = signature.replace(parameters=parameters)
+    return endpoint
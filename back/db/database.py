@@ -1,8 +1,11 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
 
+from services.db_pool_metrics import instrumented_pool_class
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./carsharex.db")
@@ -16,13 +19,98 @@ if DATABASE_URL.startswith("sqlite"):
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# Настройки пула соединений (значения по умолчанию - как у SQLAlchemy)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+# Как обнаруживать мертвые соединения:
+#   pre_ping - SELECT 1 при каждой выдаче из пула (лишний round trip на запрос)
+#   recycle  - соединения старше DB_POOL_RECYCLE секунд (по умолчанию 1800) пересоздаются
+#   on_error - без проверок: при ошибке разрыва SQLAlchemy сбрасывает весь пул
+POOL_LIVENESS = os.getenv("DB_POOL_LIVENESS", "pre_ping").lower()
+if POOL_LIVENESS not in ("pre_ping", "recycle", "on_error"):
+    raise ValueError(f"Неизвестный DB_POOL_LIVENESS: {POOL_LIVENESS}")
+if POOL_LIVENESS == "recycle" and POOL_RECYCLE < 0:
+    POOL_RECYCLE = 1800
+
+
+def pool_options(url: str, name: str, base_pool) -> dict:
+    """Параметры пула для create_engine / create_async_engine с метриками под именем name"""
+    options = {
+        "pool_pre_ping": POOL_LIVENESS == "pre_ping",
+        "pool_recycle": POOL_RECYCLE
+    }
+    # SQLite в памяти живет в единственном соединении - размер пула к нему неприменим
+    if url.startswith("sqlite") and (":memory:" in url or url.split("://", 1)[1] in ("", "/")):
+        return options
+    options.update(
+        poolclass=instrumented_pool_class(base_pool, name),
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT
+    )
+    return options
+
+
+# Профиль SQLite для продакшена небольших филиалов: off (по умолчанию) | performance
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "off").lower()
+SQLITE_PRAGMAS = (
+    # Читатели не блокируются писателем, запись - последовательная в журнал
+    ("journal_mode", "WAL"),
+    # В режиме WAL fsync только на checkpoint; при сбое питания теряются последние транзакции, не БД
+    ("synchronous", "NORMAL"),
+    # Ждать освобождения блокировки вместо немедленного "database is locked"
+    ("busy_timeout", int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))),
+    ("mmap_size", int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))),
+    # Отрицательное значение - размер в КиБ (64 МиБ)
+    ("cache_size", int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))),
+    ("temp_store", "MEMORY"),
+)
+SQLITE_MAINTENANCE_INTERVAL = float(os.getenv("SQLITE_MAINTENANCE_INTERVAL", "600"))
+
+
+def install_sqlite_profile(engine):
+    """Применять прагмы SQLITE_PRAGMAS к каждому новому соединению engine"""
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def sqlite_maintenance(engine) -> dict:
+    """Перенести WAL в основной файл и обновить статистику планировщика запросов"""
+    with engine.connect() as conn:
+        busy, wal_frames, checkpointed = conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").one()
+        conn.exec_driver_sql("PRAGMA optimize")
+    return {"busy": bool(busy), "wal_frames": wal_frames, "checkpointed_frames": checkpointed}
+
+
+def dialect_insert(connection):
+    """insert() диалекта соединения - с on_conflict_do_update (SQLite и PostgreSQL)"""
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f"Нет INSERT ... ON CONFLICT для {dialect}")
+    return insert
+
+
 engine = create_engine(
     DATABASE_URL,
     connect_args=connect_args,
-    pool_pre_ping=True,  # Проверка соединения перед использованием
-    echo=False  # Отключаем SQL логи в продакшене
+    echo=False,  # Отключаем SQL логи в продакшене
+    **pool_options(DATABASE_URL, "sync", QueuePool)
 )
 
+SQLITE_PROFILE_ENABLED = DATABASE_URL.startswith("sqlite") and SQLITE_PROFILE == "performance"
+if SQLITE_PROFILE_ENABLED:
+    install_sqlite_profile(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -67,11 +67,11 @@ def initialize_database(db: Session):
 
     # Пользователи
     users_data = [
-        {"first_name": "Иван", "last_name": "Морозов", "email": "morozov@mail.ru", "phone": "+79161234572", "password": "user123", "drivers_license": "77 12 345678", "balance": 10000.0},
-        {"first_name": "Елена", "last_name": "Васильева", "email": "vasileva@gmail.com", "phone": "+79161234573", "password": "user123", "drivers_license": "77 23 456789", "balance": 10000.0},
-        {"first_name": "Михаил", "last_name": "Новиков", "email": "novikov@yandex.ru", "phone": "+79161234574", "password": "user123", "drivers_license": "77 34 567890", "balance": 10000.0},
-        {"first_name": "Ольга", "last_name": "Козлова", "email": "kozlova@mail.ru", "phone": "+79161234575", "password": "user123", "drivers_license": "77 45 678901", "balance": 10000.0},
-        {"first_name": "Александр", "last_name": "Лебедев", "email": "lebedev@gmail.com", "phone": "+79161234576", "password": "user123", "drivers_license": "77 56 789012", "balance": 10000.0}
+        {"first_name": "Иван", "last_name": "Морозов", "email": "morozov@mail.ru", "phone": "+79161234572", "password": "user123", "drivers_license": "77 12 345678", "opening_balance": 10000.0},
+        {"first_name": "Елена", "last_name": "Васильева", "email": "vasileva@gmail.com", "phone": "+79161234573", "password": "user123", "drivers_license": "77 23 456789", "opening_balance": 10000.0},
+        {"first_name": "Михаил", "last_name": "Новиков", "email": "novikov@yandex.ru", "phone": "+79161234574", "password": "user123", "drivers_license": "77 34 567890", "opening_balance": 10000.0},
+        {"first_name": "Ольга", "last_name": "Козлова", "email": "kozlova@mail.ru", "phone": "+79161234575", "password": "user123", "drivers_license": "77 45 678901", "opening_balance": 10000.0},
+        {"first_name": "Александр", "last_name": "Лебедев", "email": "lebedev@gmail.com", "phone": "+79161234576", "password": "user123", "drivers_license": "77 56 789012", "opening_balance": 10000.0}
     ]
 
     for user_data in users_data:
@@ -98,11 +98,11 @@ def initialize_database(db: Session):
 
     # Парковочные зоны
     parking_data = [
-        {"name": "Парковка Центр", "address": "Москва, ул. Тверская, 10", "capacity": 15},
-        {"name": "Парковка Арбат", "address": "Москва, ул. Арбат, 25", "capacity": 12},
-        {"name": "Парковка Лубянка", "address": "Москва, Лубянская площадь, 2", "capacity": 10},
-        {"name": "Парковка Парк Культуры", "address": "Москва, ул. Крымский Вал, 9", "capacity": 20},
-        {"name": "Парковка ВДНХ", "address": "Москва, проспект Мира, 119", "capacity": 25}
+        {"name": "Парковка Центр", "address": "Москва, ул. Тверская, 10", "capacity": 15, "latitude": 55.7610, "longitude": 37.6085},
+        {"name": "Парковка Арбат", "address": "Москва, ул. Арбат, 25", "capacity": 12, "latitude": 55.7494, "longitude": 37.5907},
+        {"name": "Парковка Лубянка", "address": "Москва, Лубянская площадь, 2", "capacity": 10, "latitude": 55.7600, "longitude": 37.6266},
+        {"name": "Парковка Парк Культуры", "address": "Москва, ул. Крымский Вал, 9", "capacity": 20, "latitude": 55.7298, "longitude": 37.6011},
+        {"name": "Парковка ВДНХ", "address": "Москва, проспект Мира, 119", "capacity": 25, "latitude": 55.8263, "longitude": 37.6377}
     ]
 
     for park_data in parking_data:
@@ -204,13 +204,13 @@ def initialize_database(db: Session):
         {"user_id": 5, "vehicle_id": 26, "tariff_id": 1, "start_time": datetime(2024, 11, 1, 15, 0), "end_time": datetime(2024, 11, 1, 16, 30), "total_cost": 720.0, "status": "completed"},
 
         # Активные бронирования
-        {"user_id": 1, "vehicle_id": 5, "tariff_id": 1, "start_time": datetime(2024, 11, 2, 8, 0), "end_time": None, "total_cost": 0.0, "status": "active"},
-        {"user_id": 3, "vehicle_id": 27, "tariff_id": 2, "start_time": datetime(2024, 11, 2, 10, 0), "end_time": None, "total_cost": 0.0, "status": "active"},
+        {"user_id": 1, "vehicle_id": 5, "tariff_id": 1, "start_time": datetime(2024, 11, 2, 8, 0), "end_time": datetime(2024, 11, 3), "total_cost": 0.0, "status": "active"},
+        {"user_id": 3, "vehicle_id": 27, "tariff_id": 2, "start_time": datetime(2024, 11, 2, 10, 0), "end_time": datetime(2024, 11, 3), "total_cost": 0.0, "status": "active"},
 
         # Ожидающие бронирования
-        {"user_id": 2, "vehicle_id": 28, "tariff_id": 4, "start_time": datetime(2024, 11, 3, 9, 0), "end_time": None, "total_cost": 0.0, "status": "pending"},
-        {"user_id": 4, "vehicle_id": 29, "tariff_id": 1, "start_time": datetime(2024, 11, 3, 14, 0), "end_time": None, "total_cost": 0.0, "status": "pending"},
-        {"user_id": 5, "vehicle_id": 30, "tariff_id": 2, "start_time": datetime(2024, 11, 4, 10, 0), "end_time": None, "total_cost": 0.0, "status": "pending"}
+        {"user_id": 2, "vehicle_id": 28, "tariff_id": 4, "start_time": datetime(2024, 11, 3, 9, 0), "end_time": datetime(2024, 11, 4), "total_cost": 0.0, "status": "pending"},
+        {"user_id": 4, "vehicle_id": 29, "tariff_id": 1, "start_time": datetime(2024, 11, 3, 14, 0), "end_time": datetime(2024, 11, 4), "total_cost": 0.0, "status": "pending"},
+        {"user_id": 5, "vehicle_id": 30, "tariff_id": 2, "start_time": datetime(2024, 11, 4, 10, 0), "end_time": datetime(2024, 11, 5), "total_cost": 0.0, "status": "pending"}
     ]
 
     for booking_data in bookings_data:
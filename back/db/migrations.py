@@ -0,0 +1,282 @@
+"""
+Версионные миграции схемы и начальных данных.
+
+Шаги MIGRATIONS применяются по порядку, номер каждого примененного
+шага записывается в таблицу schema_version. Запускает их
+scripts/migrate.py один раз на деплой; старт приложения только
+сравнивает номер версии в БД с последним шагом (check_schema).
+
+Шаги идемпотентны: БД, созданная до появления schema_version, проходит
+все шаги с первого, и уже существующие столбцы и индексы пропускаются.
+Шаг, упавший с ошибкой, не записывается и повторяется при следующем
+запуске.
+
+Новая таблица или столбец - новый шаг в конце списка (create_all
+первого шага на уже мигрированной БД больше не выполняется).
+
+Шаги меняют только схему и данные таблиц. Производные таблицы сервисов
+(счетчики дашборда, сводка выручки) заполняет после них вызывающий код -
+scripts/migrate.py (initialize_derived), модуль db от services не зависит.
+
+На PostgreSQL upgrade() держит advisory-блокировку: второй процесс ждет
+первого и видит уже примененные шаги. На SQLite блокировки нет, поэтому
+миграция при старте (SCHEMA_AUTO_MIGRATE=1) - только для одного процесса
+в разработке.
+"""
+import os
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import exc, func, inspect, text
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import Base, SessionLocal, engine
+from .init_data import initialize_database
+
+# 1 - при отставании схемы мигрировать при старте воркера (разработка);
+# по умолчанию запуск останавливается, миграции - отдельный шаг деплоя
+AUTO_MIGRATE = os.getenv("SCHEMA_AUTO_MIGRATE", "0") == "1"
+# Ключ pg_advisory_lock на время миграций
+LOCK_KEY = 0x6d696772
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Session], None]
+
+
+def _add_columns(db: Session, table: str, columns: dict):
+    """ALTER TABLE ADD COLUMN для столбцов, которых еще нет"""
+    existing = {column["name"] for column in inspect(db.connection()).get_columns(table)}
+    for column, column_type in columns.items():
+        if column not in existing:
+            db.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+            print(f"✅ Добавлен столбец {column} в таблицу {table}")
+
+
+def _create_indexes(db: Session, indexes: dict):
+    for name, target in indexes.items():
+        db.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
+
+
+def create_tables(db: Session):
+    Base.metadata.create_all(bind=db.connection())
+
+
+def transactions_description_created_at(db: Session):
+    _add_columns(db, "transactions", {"description": "VARCHAR(500)", "created_at": "TIMESTAMP"})
+
+
+def bookings_duration_hours(db: Session):
+    # DOUBLE PRECISION для PostgreSQL; SQLite принимает любое имя типа
+    _add_columns(db, "bookings", {"duration_hours": "DOUBLE PRECISION"})
+
+
+def coordinates_columns(db: Session):
+    for table in ("parking_zones", "vehicles"):
+        _add_columns(db, table, {"latitude": "FLOAT", "longitude": "FLOAT"})
+
+
+def booking_status_end_index(db: Session):
+    """Поиск просроченных бронирований фоновым обработчиком"""
+    _create_indexes(db, {"ix_booking_status_end": "bookings (status, end_time)"})
+
+
+def ledger_columns(db: Session):
+    """Журнал баланса: balance_delta и индекс для суммы хвоста журнала.
+
+    У старых транзакций balance_delta остается NULL: их сумма уже учтена
+    в начальном балансе пользователя (столбец users.balance).
+    """
+    _add_columns(db, "transactions", {"balance_delta": "FLOAT"})
+    _create_indexes(db, {"ix_transaction_user_id": "transactions (user_id, id)"})
+
+
+def history_indexes(db: Session):
+    """История поездок и платежей клиента"""
+    _create_indexes(db, {
+        "ix_booking_user_start": "bookings (user_id, start_time)",
+        "ix_transaction_user_created": "transactions (user_id, created_at)",
+    })
+
+
+def stats_counters_initial(db: Session):
+    # Счетчики заполняет scripts/migrate.py после миграций (initialize_derived)
+    pass
+
+
+def revenue_daily_initial(db: Session):
+    # Сводку заполняет scripts/migrate.py после миграций (initialize_derived)
+    pass
+
+
+def initial_data(db: Session):
+    initialize_database(db)
+
+
+def collection_versions_table(db: Session):
+    """Версии коллекций для ETag, общие для всех воркеров"""
+    models.CollectionVersion.__table__.create(bind=db.connection(), checkfirst=True)
+    now = datetime.utcnow()
+    for name in ("tariffs", "parking_zones", "vehicles"):
+        if db.get(models.CollectionVersion, name) is None:
+            db.add(models.CollectionVersion(name=name, version=1, modified_at=now))
+
+
+def bookings_half_open_end(db: Session):
+    """Конец активных и ожидающих бронирований - начало дня после аренды.
+
+    Раньше end_time был концом дня end_date (23:59:59.999999), и аренда
+    5 -> 6 не давала забронировать машину на 6 -> 7. Бронирования без
+    end_time (старые начальные данные) занимали машину навсегда - им
+    задается конец следующего дня после начала.
+    """
+    rows = db.query(models.Booking.id, models.Booking.start_time, models.Booking.end_time).filter(
+        models.Booking.status.in_(("active", "pending"))
+    ).all()
+    for booking_id, start_time, end_time in rows:
+        if end_time is None:
+            end = datetime.combine(start_time.date() + timedelta(days=1), time.min)
+        elif end_time.time() == time.max:
+            end = datetime.combine(end_time.date(), time.min)
+        else:
+            continue
+        db.query(models.Booking).filter(models.Booking.id == booking_id).update(
+            {models.Booking.end_time: end}, synchronize_session=False
+        )
+
+
+def bookings_parking_zone(db: Session):
+    """Парковка завершенного бронирования - ключ сводки выручки.
+
+    Для уже завершенных бронирований известна только текущая парковка
+    автомобиля - она и записывается. Сводку по новому столбцу
+    пересчитывает scripts/migrate.py после этого шага.
+    """
+    _add_columns(db, "bookings", {"parking_zone_id": "INTEGER"})
+    db.execute(text(
+        "UPDATE bookings SET parking_zone_id = "
+        "(SELECT vehicles.parking_zone_id FROM vehicles WHERE vehicles.id = bookings.vehicle_id) "
+        "WHERE status = 'completed' AND parking_zone_id IS NULL"
+    ))
+
+
+def ledger_folded(db: Session):
+    """Признак свернутой записи журнала вместо границы по id.
+
+    Раньше снимок покрывал записи до last_transaction_id, и каждая запись
+    в журнал блокировала счет, чтобы запись с меньшим id не закоммитилась
+    после компакции. Теперь компакция отмечает ровно те записи, которые
+    суммирует, и пополнения пишутся без блокировки.
+    """
+    _add_columns(db, "transactions", {"folded": "BOOLEAN NOT NULL DEFAULT FALSE"})
+    db.execute(text(
+        "UPDATE transactions SET folded = TRUE "
+        "WHERE balance_delta IS NOT NULL AND id <= "
+        "(SELECT last_transaction_id FROM balance_snapshots WHERE balance_snapshots.user_id = transactions.user_id)"
+    ))
+    for index in models.Transaction.__table__.indexes:
+        if index.name == "ix_transaction_unfolded":
+            index.create(bind=db.connection(), checkfirst=True)
+
+
+def collection_changes_table(db: Session):
+    """Журнал изменений коллекций: индексы процессов применяют изменения точечно"""
+    models.CollectionChange.__table__.create(bind=db.connection(), checkfirst=True)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create_tables", create_tables),
+    Migration(2, "transactions_description_created_at", transactions_description_created_at),
+    Migration(3, "bookings_duration_hours", bookings_duration_hours),
+    Migration(4, "coordinates_columns", coordinates_columns),
+    Migration(5, "booking_status_end_index", booking_status_end_index),
+    Migration(6, "ledger_columns", ledger_columns),
+    Migration(7, "history_indexes", history_indexes),
+    Migration(8, "stats_counters_initial", stats_counters_initial),
+    Migration(9, "revenue_daily_initial", revenue_daily_initial),
+    Migration(10, "initial_data", initial_data),
+    Migration(11, "collection_versions_table", collection_versions_table),
+    Migration(12, "bookings_half_open_end", bookings_half_open_end),
+    Migration(13, "bookings_parking_zone", bookings_parking_zone),
+    Migration(14, "ledger_folded", ledger_folded),
+    Migration(15, "collection_changes_table", collection_changes_table),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(bind=engine) -> int:
+    """Номер последнего примененного шага; 0 - миграции еще не запускались"""
+    table = models.SchemaVersion.__table__
+    try:
+        with bind.connect() as conn:
+            return conn.execute(table.select().with_only_columns(func.max(table.c.version))).scalar() or 0
+    except (exc.OperationalError, exc.ProgrammingError):
+        # Таблицы schema_version еще нет
+        return 0
+
+
+@contextmanager
+def _migration_lock(bind):
+    if bind.dialect.name != "postgresql":
+        yield
+        return
+    with bind.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+
+
+def upgrade(target: int = LATEST_VERSION, bind=engine) -> List[Migration]:
+    """Применить шаги после текущей версии до target включительно"""
+    with _migration_lock(bind):
+        return _apply(target, bind)
+
+
+def _apply(target: int, bind) -> List[Migration]:
+    models.SchemaVersion.__table__.create(bind=bind, checkfirst=True)
+    # Версия читается под блокировкой: шаги, примененные другим процессом, пропускаются
+    version = current_version(bind)
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= version or migration.version > target:
+            continue
+        db = SessionLocal(bind=bind)
+        try:
+            migration.apply(db)
+            db.add(models.SchemaVersion(version=migration.version, name=migration.name, applied_at=datetime.utcnow()))
+            db.commit()
+        except Exception:
+            db.rollback()
+            print(f"❌ Миграция {migration.version} ({migration.name}) не применена")
+            raise
+        finally:
+            db.close()
+        print(f"✅ Миграция {migration.version}: {migration.name}")
+        applied.append(migration)
+    return applied
+
+
+def check_schema(after_upgrade: Optional[Callable[[List[Migration]], None]] = None):
+    """Проверка при старте приложения: один SELECT, если схема актуальна.
+
+    after_upgrade(applied) вызывается, если шаги были применены при старте.
+    """
+    version = current_version()
+    if version >= LATEST_VERSION:
+        return
+    if not AUTO_MIGRATE:
+        raise RuntimeError(
+            f"Схема БД устарела (версия {version}, нужна {LATEST_VERSION}): "
+            "запустите python scripts/migrate.py"
+        )
+    print(f"ℹ️  Схема БД версии {version}, применяю миграции до {LATEST_VERSION}")
+    applied = upgrade()
+    if applied and after_upgrade is not None:
+        after_upgrade(applied)
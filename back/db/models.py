@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, Integer, String, Float, ForeignKey, Date, DateTime, Index, Text, UniqueConstraint, false, func, select
+from sqlalchemy.orm import column_property, relationship
 from datetime import datetime
 from .database import Base
 
@@ -48,7 +48,8 @@ class User(Base):
     phone = Column(String(20), unique=True, nullable=False, index=True)
     password = Column(String(100), nullable=False)
     drivers_license = Column(String(20), unique=True)
-    balance = Column(Float, default=0.0)
+    # Начальный баланс. Текущий баланс (User.balance) считается по журналу транзакций, см. ниже
+    opening_balance = Column('balance', Float, default=0.0)
 
     bookings = relationship('Booking', back_populates='user')
     transactions = relationship('Transaction', back_populates='user')
@@ -73,6 +74,8 @@ class ParkingZone(Base):
     name = Column(String(100), nullable=False, index=True)
     address = Column(String(255), nullable=False)
     capacity = Column(Integer, default=10)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
 
     vehicles = relationship('Vehicle', back_populates='parking_zone')
 
@@ -92,6 +95,9 @@ class Vehicle(Base):
     status = Column(String(30), default='available', index=True)
     parking_zone_id = Column(Integer, ForeignKey('parking_zones.id'), index=True)
     tariff_id = Column(Integer, ForeignKey('tariffs.id'), index=True)
+    # Собственные координаты (если не заданы - берутся координаты парковки)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
 
     parking_zone = relationship('ParkingZone', back_populates='vehicles')
     tariff = relationship('Tariff', back_populates='vehicles')
@@ -117,6 +123,8 @@ class Booking(Base):
     duration_hours = Column(Float)
     total_cost = Column(Float, default=0.0)
     status = Column(String(30), default='pending', index=True)
+    # Парковка автомобиля на момент завершения - ключ сводки выручки (services/revenue_rollup.py)
+    parking_zone_id = Column(Integer, nullable=True)
 
     user = relationship('User', back_populates='bookings')
     vehicle = relationship('Vehicle', back_populates='bookings')
@@ -127,6 +135,10 @@ class Booking(Base):
     __table_args__ = (
         Index('ix_booking_user_status', 'user_id', 'status'),
         Index('ix_booking_vehicle_status', 'vehicle_id', 'status'),
+        # Поиск просроченных бронирований фоновым обработчиком
+        Index('ix_booking_status_end', 'status', 'end_time'),
+        # История поездок клиента: WHERE user_id = ? ORDER BY start_time DESC
+        Index('ix_booking_user_start', 'user_id', 'start_time'),
     )
 
 
@@ -141,6 +153,10 @@ class Transaction(Base):
     description = Column(String(500), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=True)
     status = Column(String(30), default='completed', index=True)
+    # Изменение баланса этой записью: +пополнение, -оплата; NULL - запись до перехода на журнал
+    balance_delta = Column(Float, nullable=True)
+    # Запись уже учтена в снимке баланса (BalanceSnapshot) фоновой компакцией
+    folded = Column(Boolean, nullable=False, default=False, server_default=false())
 
     user = relationship('User', back_populates='transactions')
     booking = relationship('Booking', back_populates='transactions')
@@ -148,9 +164,29 @@ class Transaction(Base):
     # Индекс для поиска транзакций пользователя по типу
     __table_args__ = (
         Index('ix_transaction_user_type', 'user_id', 'transaction_type'),
+        # Записи пользователя по порядку
+        Index('ix_transaction_user_id', 'user_id', 'id'),
+        # Хвост журнала, не свернутый в снимок: WHERE user_id = ? AND NOT folded
+        Index(
+            'ix_transaction_unfolded', 'user_id',
+            postgresql_where=folded == false(), sqlite_where=folded == false()
+        ),
+        # История платежей клиента: WHERE user_id = ? ORDER BY created_at DESC
+        Index('ix_transaction_user_created', 'user_id', 'created_at'),
     )
 
 
+class BalanceSnapshot(Base):
+    """Снимок баланса: начальный баланс + сумма свернутых записей журнала (folded)"""
+    __tablename__ = 'balance_snapshots'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    balance = Column(Float, nullable=False)
+    # Последняя свернутая запись - для справки, в расчете баланса не участвует
+    last_transaction_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class Incident(Base):
     __tablename__ = 'incidents'
 
@@ -171,3 +207,104 @@ class Incident(Base):
         Index('ix_incident_status_type', 'status', 'incident_type'),
         Index('ix_incident_vehicle_status', 'vehicle_id', 'status'),
     )
+
+
+class IdempotencyKey(Base):
+    """Сохраненный ответ на запрос с заголовком Idempotency-Key"""
+    __tablename__ = 'idempotency_keys'
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String(100), nullable=False)
+    scope = Column(String(200), nullable=False)  # "POST /bookings/"
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)  # NULL - запрос еще выполняется
+    content_type = Column(String(100), nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        UniqueConstraint('key', 'scope', name='uq_idempotency_key_scope'),
+    )
+
+
+class SchedulerLease(Base):
+    """Аренда лидерства фоновой задачи: выполняет ее только владелец непросроченной записи"""
+    __tablename__ = 'scheduler_leases'
+
+    name = Column(String(100), primary_key=True)
+    owner = Column(String(100), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class StatsCounter(Base):
+    """Счетчик для дашборда: users, vehicles, vehicles:<статус>, bookings:<статус>, ..."""
+    __tablename__ = 'stats_counters'
+
+    name = Column(String(100), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class RevenueDaily(Base):
+    """Выручка завершенных бронирований по дням окончания, тарифам и парковкам"""
+    __tablename__ = 'revenue_daily'
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    # 0 - тариф или парковка не указаны (NULL не участвует в уникальности)
+    tariff_id = Column(Integer, nullable=False, default=0)
+    parking_zone_id = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    bookings_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint('day', 'tariff_id', 'parking_zone_id', name='uq_revenue_daily_key'),
+    )
+
+
+class CollectionVersion(Base):
+    """Версия коллекции для ETag / Last-Modified (services/versions.py)"""
+    __tablename__ = 'collection_versions'
+
+    name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    modified_at = Column(DateTime, nullable=False)
+
+
+class CollectionChange(Base):
+    """Что изменила версия коллекции: id записей (NULL - вся коллекция), для индексов в памяти"""
+    __tablename__ = 'collection_changes'
+
+    id = Column(Integer, primary_key=True)
+    collection = Column(String(100), nullable=False)
+    version = Column(Integer, nullable=False)
+    entity_id = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index('ix_collection_change_version', 'collection', 'version'),
+    )
+
+
+class SchemaVersion(Base):
+    """Примененные шаги миграций (db/migrations.py)"""
+    __tablename__ = 'schema_version'
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+# Текущий баланс = снимок (или начальный баланс) + изменения из журнала, еще не свернутые
+# в снимок. Считается в том же SELECT, что и пользователь; несвернутые записи - только
+# хвост, который еще не обработала фоновая компакция (services/ledger.py).
+_snapshot_balance = select(BalanceSnapshot.balance).where(
+    BalanceSnapshot.user_id == User.id
+).correlate_except(BalanceSnapshot).scalar_subquery()
+
+_ledger_tail = select(func.coalesce(func.sum(Transaction.balance_delta), 0.0)).where(
+    Transaction.user_id == User.id,
+    Transaction.folded == false()
+).correlate_except(Transaction).scalar_subquery()
+
+User.balance = column_property(func.coalesce(_snapshot_balance, User.opening_balance, 0.0) + _ledger_tail)
+
@@ -3,10 +3,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
-from db.database import engine, Base, SessionLocal
-from db.init_data import initialize_database
-from sqlalchemy import text, inspect
+from db.database import engine, SQLITE_PROFILE_ENABLED, SQLITE_MAINTENANCE_INTERVAL, sqlite_maintenance
+from db.migrations import check_schema
+from scripts.migrate import initialize_derived
+from services.idempotency import IdempotencyMiddleware
 from datetime import datetime
+from contextlib import asynccontextmanager
+from services.scheduler import PeriodicTask, scheduler
+from services.booking_expiry import EXPIRY_ENABLED, EXPIRY_INTERVAL, booking_expiry_worker
+from services import ledger, stats_counters
 import os
 
 # Роутеры клиентов
@@ -30,78 +35,42 @@ from routers import admin_parking
 from routers import admin_branches
 from routers import admin_stats
 from routers import update_images
+from routers import admin_metrics
+from routers import admin_export
+
+# Фоновые задачи
+if SQLITE_PROFILE_ENABLED:
+    scheduler.add(PeriodicTask("sqlite_maintenance", SQLITE_MAINTENANCE_INTERVAL, lambda: sqlite_maintenance(engine)))
+# BOOKING_EXPIRY_ENABLED=0 - если обработчик запущен отдельным процессом (scripts/booking_expiry_worker.py)
+if EXPIRY_ENABLED:
+    scheduler.add(PeriodicTask(
+        "booking_expiry",
+        EXPIRY_INTERVAL,
+        booking_expiry_worker.run,
+        leader=True,
+        metrics=booking_expiry_worker.stats
+    ))
+# Свертка журнала транзакций в снимки баланса
+if ledger.COMPACTION_ENABLED:
+    scheduler.add(PeriodicTask("balance_compaction", ledger.COMPACTION_INTERVAL, ledger.run_compaction, leader=True))
+# Сверка счетчиков дашборда с таблицами
+scheduler.add(PeriodicTask("stats_reconcile", stats_counters.RECONCILE_INTERVAL, stats_counters.run_reconcile, leader=True))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    scheduler.start()
+    yield
+    scheduler.stop()
 
 app = FastAPI(
     title="CarShareX API",
     description="API для каршеринг-приложения CarShareX (учебный проект)",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Создание таблиц
-Base.metadata.create_all(bind=engine)
-
-# Миграция: добавление столбцов description и created_at в transactions если их нет
-def migrate_transactions_table():
-    """Добавляет столбцы description и created_at в таблицу transactions если их нет"""
-    inspector = inspect(engine)
-    columns = [col['name'] for col in inspector.get_columns('transactions')]
-
-    with engine.connect() as conn:
-        # Добавляем description если его нет
-        if 'description' not in columns:
-            try:
-                conn.execute(text("ALTER TABLE transactions ADD COLUMN description VARCHAR(500)"))
-                conn.commit()
-                print("✅ Добавлен столбец description в таблицу transactions")
-            except Exception as e:
-                print(f"⚠️  Не удалось добавить столбец description: {e}")
-
-        # Добавляем created_at если его нет
-        if 'created_at' not in columns:
-            try:
-                conn.execute(text("ALTER TABLE transactions ADD COLUMN created_at TIMESTAMP"))
-                conn.commit()
-                print("✅ Добавлен столбец created_at в таблицу transactions")
-            except Exception as e:
-                print(f"⚠️  Не удалось добавить столбец created_at: {e}")
-
-# Миграция: добавление столбца duration_hours в bookings если его нет
-def migrate_bookings_table():
-    """Добавляет столбец duration_hours в таблицу bookings если его нет"""
-    inspector = inspect(engine)
-    columns = [col['name'] for col in inspector.get_columns('bookings')]
-
-    with engine.connect() as conn:
-        # Добавляем duration_hours если его нет
-        if 'duration_hours' not in columns:
-            try:
-                # Используем DOUBLE PRECISION для PostgreSQL совместимости
-                conn.execute(text("ALTER TABLE bookings ADD COLUMN duration_hours DOUBLE PRECISION"))
-                conn.commit()
-                print("✅ Добавлен столбец duration_hours в таблицу bookings")
-            except Exception as e:
-                print(f"⚠️  Не удалось добавить столбец duration_hours: {e}")
-                # Попытка с FLOAT для SQLite
-                try:
-                    conn.execute(text("ALTER TABLE bookings ADD COLUMN duration_hours FLOAT"))
-                    conn.commit()
-                    print("✅ Добавлен столбец duration_hours в таблицу bookings (FLOAT)")
-                except Exception as e2:
-                    print(f"⚠️  Повторная попытка не удалась: {e2}")
-
-# Запуск миграций
-try:
-    migrate_transactions_table()
-    migrate_bookings_table()
-except Exception as e:
-    print(f"⚠️  Ошибка миграции: {e}")
-
-# Инициализация начальных данных
-db = SessionLocal()
-try:
-    initialize_database(db)
-finally:
-    db.close()
+# Схема БД: миграции применяет scripts/migrate.py, при старте - только проверка версии
+check_schema(after_upgrade=initialize_derived)
 
 # Обработчик ошибок валидации для отладки
 @app.exception_handler(RequestValidationError)
@@ -116,13 +85,18 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         content={"detail": exc.errors(), "body": str(await request.body())},
     )
 
+# Idempotency-Key для бронирований и платежей (добавляется до CORS, чтобы
+# сохраненные ответы тоже проходили через CORS)
+app.add_middleware(IdempotencyMiddleware)
+
 # CORS (разрешаем все для учебного проекта)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Count-Source", "ETag", "Last-Modified", "Idempotency-Replayed"]
 )
 
 # === КЛИЕНТСКИЕ РОУТЕРЫ ===
@@ -146,6 +120,8 @@ app.include_router(admin_parking.router)
 app.include_router(admin_branches.router)
 app.include_router(admin_stats.router)
 app.include_router(update_images.router)
+app.include_router(admin_metrics.router)
+app.include_router(admin_export.router)
 
 # === СТАТИЧЕСКИЕ ФАЙЛЫ ===
 # Создаем папку static если её нет
@@ -161,7 +137,7 @@ def root():
         "version": "2.0.0",
         "docs": "/docs",
         "client_endpoints": "/auth, /profile, /vehicles (with filters), /bookings, /transactions, /tariffs, /parking-zones",
-        "admin_endpoints": "/admin/auth, /admin/users, /admin/vehicles, /admin/bookings, /admin/incidents, /admin/employees, /admin/tariffs, /admin/parking, /admin/branches, /admin/stats"
+        "admin_endpoints": "/admin/auth, /admin/users, /admin/vehicles, /admin/bookings, /admin/incidents, /admin/employees, /admin/tariffs, /admin/parking, /admin/branches, /admin/stats, /admin/metrics"
     }
 
 @app.get("/health", tags=["Health"])
@@ -1,16 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas import booking as booking_schemas
-from typing import List
+from services import stats_counters
+from services.list_query import ListQuery, filter_equal, filter_range
+from datetime import date
+from typing import List, Optional
 
 router = APIRouter(prefix="/admin/bookings", tags=["Админ: Бронирования"])
 
+bookings_list = ListQuery(
+    models.Booking,
+    sort_fields={
+        "start_time": models.Booking.start_time,
+        "end_time": models.Booking.end_time,
+        "total_cost": models.Booking.total_cost
+    },
+    counter="bookings"
+)
+
 @router.get("/", response_model=List[booking_schemas.BookingResponse])
-def get_all_bookings(db: Session = Depends(database.get_db)):
-    """Получить все бронирования"""
-    bookings = db.query(models.Booking).all()
-    return bookings
+def get_all_bookings(
+    response: Response,
+    status: Optional[str] = Query(None, description="Фильтр по статусу"),
+    user_id: Optional[int] = Query(None, description="Фильтр по пользователю"),
+    vehicle_id: Optional[int] = Query(None, description="Фильтр по автомобилю"),
+    tariff_id: Optional[int] = Query(None, description="Фильтр по тарифу"),
+    date_from: Optional[date] = Query(None, alias="from", description="Начало не раньше даты"),
+    date_to: Optional[date] = Query(None, alias="to", description="Начало не позже даты (включительно)"),
+    sort: str = Query("id", description="Поле сортировки: id, start_time, end_time, total_cost; -поле - по убыванию"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Размер страницы (без параметра - весь список)"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
+    with_total: bool = Query(False, description="Вернуть общее количество в X-Total-Count"),
+    db: Session = Depends(database.get_db)
+):
+    """Получить бронирования с фильтрами (страницами при указании limit)"""
+    query = db.query(models.Booking)
+    query = filter_equal(query, models.Booking.status, status)
+    query = filter_equal(query, models.Booking.user_id, user_id)
+    query = filter_equal(query, models.Booking.vehicle_id, vehicle_id)
+    query = filter_equal(query, models.Booking.tariff_id, tariff_id)
+    query = filter_range(query, models.Booking.start_time, date_from, date_to)
+
+    filters = {
+        "status": status, "user_id": user_id, "vehicle_id": vehicle_id,
+        "tariff_id": tariff_id, "from": date_from, "to": date_to
+    }
+    return bookings_list.page(
+        db, query, response, sort=sort, limit=limit, cursor=cursor, with_total=with_total, filters=filters
+    )
 
 @router.get("/{booking_id}", response_model=booking_schemas.BookingResponse)
 def get_booking(booking_id: int, db: Session = Depends(database.get_db)):
@@ -25,14 +63,11 @@ def get_booking(booking_id: int, db: Session = Depends(database.get_db)):
 @router.get("/stats/overview")
 def get_bookings_stats(db: Session = Depends(database.get_db)):
     """Статистика по бронированиям"""
-    total = db.query(models.Booking).count()
-    active = db.query(models.Booking).filter(models.Booking.status == "active").count()
-    completed = db.query(models.Booking).filter(models.Booking.status == "completed").count()
-    pending = db.query(models.Booking).filter(models.Booking.status == "pending").count()
+    counters = stats_counters.read(db)
 
     return {
-        "total_bookings": total,
-        "active_bookings": active,
-        "completed_bookings": completed,
-        "pending_bookings": pending
+        "total_bookings": counters.get("bookings", 0),
+        "active_bookings": counters.get("bookings:active", 0),
+        "completed_bookings": counters.get("bookings:completed", 0),
+        "pending_bookings": counters.get("bookings:pending", 0)
     }
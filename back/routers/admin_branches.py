@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas import branch as branch_schemas
+from services.cache import reference_cache
+from services.versions import collection_versions
 from typing import List
 
 router = APIRouter(prefix="/admin/branches", tags=["Админ: Офисы"])
@@ -9,8 +11,11 @@ router = APIRouter(prefix="/admin/branches", tags=["Админ: Офисы"])
 @router.get("/", response_model=List[branch_schemas.BranchResponse])
 def get_all_branches(db: Session = Depends(database.get_db)):
     """Получить все офисы"""
-    branches = db.query(models.Branch).all()
-    return branches
+    return reference_cache.get_or_set(
+        collection_versions.cache_key(db, "branches", "branches:all"),
+        lambda: [branch_schemas.BranchResponse.model_validate(b).model_dump() for b in db.query(models.Branch).all()],
+        tags=("branches",)
+    )
 
 @router.post("/", response_model=branch_schemas.BranchResponse)
 def create_branch(branch_data: branch_schemas.BranchCreate, db: Session = Depends(database.get_db)):
@@ -22,7 +27,9 @@ def create_branch(branch_data: branch_schemas.BranchCreate, db: Session = Depend
     )
 
     db.add(new_branch)
+    collection_versions.bump(db, "branches")
     db.commit()
+    reference_cache.invalidate("branches")
     db.refresh(new_branch)
 
     return new_branch
@@ -42,7 +49,9 @@ def update_branch(branch_id: int, branch_data: branch_schemas.BranchUpdate, db:
     if branch_data.phone:
         branch.phone = branch_data.phone
 
+    collection_versions.bump(db, "branches")
     db.commit()
+    reference_cache.invalidate("branches")
     db.refresh(branch)
 
     return branch
@@ -56,6 +65,8 @@ def delete_branch(branch_id: int, db: Session = Depends(database.get_db)):
         raise HTTPException(status_code=404, detail="Офис не найден")
 
     db.delete(branch)
+    collection_versions.bump(db, "branches")
     db.commit()
+    reference_cache.invalidate("branches")
 
     return {"message": "Офис удален", "branch_id": branch_id}
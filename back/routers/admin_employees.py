@@ -1,21 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas import employee as employee_schemas
-from typing import List
+from services.list_query import ListQuery, filter_equal
+from typing import List, Optional
 
 router = APIRouter(prefix="/admin/employees", tags=["Админ: Сотрудники"])
 
+employees_list = ListQuery(
+    models.Employee,
+    sort_fields={"last_name": models.Employee.last_name, "email": models.Employee.email}
+)
+
 @router.get("/", response_model=List[employee_schemas.EmployeeResponse])
-def get_all_employees(employee_id: int, db: Session = Depends(database.get_db)):
-    """Получить всех сотрудников (только SuperAdmin)"""
+def get_all_employees(
+    employee_id: int,
+    response: Response,
+    role_id: Optional[int] = Query(None, description="Фильтр по роли"),
+    branch_id: Optional[int] = Query(None, description="Фильтр по офису"),
+    sort: str = Query("id", description="Поле сортировки: id, last_name, email; -поле - по убыванию"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Размер страницы (без параметра - весь список)"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
+    with_total: bool = Query(False, description="Вернуть общее количество в X-Total-Count"),
+    db: Session = Depends(database.get_db)
+):
+    """Получить сотрудников (только SuperAdmin)"""
     # Проверка прав
     employee = db.query(models.Employee).filter(models.Employee.id == employee_id).first()
     if not employee or employee.role_id != 1:  # role_id=1 это SuperAdmin
         raise HTTPException(status_code=403, detail="Доступ запрещен. Требуется роль SuperAdmin")
 
-    employees = db.query(models.Employee).all()
-    return employees
+    query = db.query(models.Employee)
+    query = filter_equal(query, models.Employee.role_id, role_id)
+    query = filter_equal(query, models.Employee.branch_id, branch_id)
+
+    return employees_list.page(
+        db, query, response, sort=sort, limit=limit, cursor=cursor, with_total=with_total,
+        filters={"role_id": role_id, "branch_id": branch_id}
+    )
 
 @router.post("/", response_model=employee_schemas.EmployeeResponse)
 def create_employee(employee_data: employee_schemas.EmployeeCreate, admin_id: int, db: Session = Depends(database.get_db)):
@@ -0,0 +1,148 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from db import models, database
+from datetime import date, datetime, timedelta
+from typing import Optional
+import csv
+import io
+import json
+
+router = APIRouter(prefix="/admin/export", tags=["Админ: Выгрузки"])
+
+# Строк за одно чтение из курсора и в одном куске ответа
+EXPORT_BATCH_SIZE = 1000
+
+# Что выгружается: столбцы, столбец даты для from/to (None - фильтра нет), есть ли статус.
+# Строки читаются кортежами столбцов, без ORM-объектов и identity map
+EXPORTS = {
+    "bookings": {
+        "columns": [
+            models.Booking.id, models.Booking.user_id, models.Booking.vehicle_id, models.Booking.tariff_id,
+            models.Booking.start_time, models.Booking.end_time, models.Booking.duration_hours,
+            models.Booking.total_cost, models.Booking.status
+        ],
+        "date_column": models.Booking.start_time,
+        "status_column": models.Booking.status,
+        "user_column": models.Booking.user_id
+    },
+    "transactions": {
+        "columns": [
+            models.Transaction.id, models.Transaction.user_id, models.Transaction.booking_id,
+            models.Transaction.transaction_type, models.Transaction.amount, models.Transaction.balance_delta,
+            models.Transaction.description, models.Transaction.created_at, models.Transaction.status
+        ],
+        "date_column": models.Transaction.created_at,
+        "status_column": models.Transaction.status,
+        "user_column": models.Transaction.user_id
+    },
+    "users": {
+        # Пароль не выгружается
+        "columns": [
+            models.User.id, models.User.first_name, models.User.last_name, models.User.email,
+            models.User.phone, models.User.drivers_license, models.User.balance.label("balance")
+        ],
+        "date_column": None,
+        "status_column": None,
+        "user_column": models.User.id
+    },
+    "incidents": {
+        "columns": [
+            models.Incident.id, models.Incident.booking_id, models.Incident.vehicle_id, models.Incident.user_id,
+            models.Incident.incident_type, models.Incident.description, models.Incident.status
+        ],
+        "date_column": None,
+        "status_column": models.Incident.status,
+        "user_column": models.Incident.user_id
+    },
+}
+
+
+def build_export_query(entity: str, date_from: Optional[date], date_to: Optional[date], status: Optional[str], user_id: Optional[int]):
+    spec = EXPORTS[entity]
+    query = select(*spec["columns"])
+
+    if date_from is not None:
+        query = query.where(spec["date_column"] >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        query = query.where(spec["date_column"] < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if status:
+        query = query.where(spec["status_column"] == status)
+    if user_id is not None:
+        query = query.where(spec["user_column"] == user_id)
+
+    # Порядок по первичному ключу - выгрузка читается индексом, без сортировки всей таблицы
+    return query.order_by(spec["columns"][0])
+
+
+def export_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def stream_rows(query):
+    """Строки из курсора БД пачками по EXPORT_BATCH_SIZE"""
+    # Сессия из Depends закрывается до начала отправки ответа,
+    # поэтому для потока открываем собственную
+    db = database.SessionLocal()
+    try:
+        # stream_results - серверный курсор на PostgreSQL: память воркера не зависит от числа строк
+        result = db.execute(query.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE))
+        for batch in result.partitions():
+            yield batch
+    finally:
+        db.close()
+
+
+def stream_csv(query, header):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for batch in stream_rows(query):
+        writer.writerows([export_value(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    # Заголовок пустой выгрузки
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_ndjson(query, header):
+    for batch in stream_rows(query):
+        yield "".join(
+            json.dumps({name: export_value(value) for name, value in zip(header, row)}, ensure_ascii=False) + "\n"
+            for row in batch
+        )
+
+
+@router.get("/{entity}")
+def export_entity(
+    entity: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="Формат: csv или ndjson"),
+    date_from: Optional[date] = Query(None, alias="from", description="С даты (бронирования - по началу, транзакции - по созданию)"),
+    date_to: Optional[date] = Query(None, alias="to", description="По дату включительно"),
+    status: Optional[str] = Query(None, description="Фильтр по статусу"),
+    user_id: Optional[int] = Query(None, description="Фильтр по пользователю")
+):
+    """Потоковая выгрузка bookings, transactions, users или incidents в CSV/NDJSON"""
+    spec = EXPORTS.get(entity)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Неизвестная выгрузка: {entity}. Доступны: {', '.join(EXPORTS)}")
+    if (date_from or date_to) and spec["date_column"] is None:
+        raise HTTPException(status_code=400, detail=f"Выгрузка {entity} не поддерживает фильтр по дате")
+    if status and spec["status_column"] is None:
+        raise HTTPException(status_code=400, detail=f"Выгрузка {entity} не поддерживает фильтр по статусу")
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="Начало периода позже конца")
+
+    query = build_export_query(entity, date_from, date_to, status, user_id)
+    header = [column.key for column in spec["columns"]]
+    filename = f"{entity}-{date.today().isoformat()}.{format}"
+
+    return StreamingResponse(
+        stream_csv(query, header) if format == "csv" else stream_ndjson(query, header),
+        media_type="text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
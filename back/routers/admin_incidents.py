@@ -1,16 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas import incident as incident_schemas
-from typing import List
+from services.list_query import ListQuery, filter_equal
+from typing import List, Optional
 
 router = APIRouter(prefix="/admin/incidents", tags=["Админ: Инциденты"])
 
+incidents_list = ListQuery(
+    models.Incident,
+    sort_fields={"status": models.Incident.status, "incident_type": models.Incident.incident_type},
+    counter="incidents"
+)
+
 @router.get("/", response_model=List[incident_schemas.IncidentResponse])
-def get_all_incidents(db: Session = Depends(database.get_db)):
-    """Получить все инциденты"""
-    incidents = db.query(models.Incident).all()
-    return incidents
+def get_all_incidents(
+    response: Response,
+    status: Optional[str] = Query(None, description="Фильтр по статусу"),
+    incident_type: Optional[str] = Query(None, description="Фильтр по типу"),
+    vehicle_id: Optional[int] = Query(None, description="Фильтр по автомобилю"),
+    user_id: Optional[int] = Query(None, description="Фильтр по пользователю"),
+    booking_id: Optional[int] = Query(None, description="Фильтр по бронированию"),
+    sort: str = Query("id", description="Поле сортировки: id, status, incident_type; -поле - по убыванию"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Размер страницы (без параметра - весь список)"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
+    with_total: bool = Query(False, description="Вернуть общее количество в X-Total-Count"),
+    db: Session = Depends(database.get_db)
+):
+    """Получить инциденты с фильтрами (страницами при указании limit)"""
+    query = db.query(models.Incident)
+    query = filter_equal(query, models.Incident.status, status)
+    query = filter_equal(query, models.Incident.incident_type, incident_type)
+    query = filter_equal(query, models.Incident.vehicle_id, vehicle_id)
+    query = filter_equal(query, models.Incident.user_id, user_id)
+    query = filter_equal(query, models.Incident.booking_id, booking_id)
+
+    filters = {
+        "status": status, "incident_type": incident_type, "vehicle_id": vehicle_id,
+        "user_id": user_id, "booking_id": booking_id
+    }
+    return incidents_list.page(
+        db, query, response, sort=sort, limit=limit, cursor=cursor, with_total=with_total, filters=filters
+    )
 
 @router.post("/", response_model=incident_schemas.IncidentResponse)
 def create_incident(incident_data: incident_schemas.IncidentCreate, db: Session = Depends(database.get_db)):
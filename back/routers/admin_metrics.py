@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+from db import database
+from services.cache import all_cache_stats
+from services.db_pool_metrics import all_pool_stats
+from services.scheduler import scheduler
+
+router = APIRouter(prefix="/admin/metrics", tags=["Админ: Метрики"])
+
+@router.get("/cache")
+def get_cache_metrics():
+    """Счетчики попаданий/промахов кэшей в памяти процесса"""
+    return {"caches": all_cache_stats()}
+
+@router.get("/db-pool")
+def get_db_pool_metrics():
+    """Состояние пулов соединений: занятые соединения, overflow, ожидание и таймауты выдачи"""
+    return {
+        "settings": {
+            "pool_size": database.POOL_SIZE,
+            "max_overflow": database.POOL_MAX_OVERFLOW,
+            "pool_timeout": database.POOL_TIMEOUT,
+            "pool_recycle": database.POOL_RECYCLE,
+            "liveness": database.POOL_LIVENESS
+        },
+        "pools": all_pool_stats()
+    }
+
+@router.get("/tasks")
+def get_task_metrics():
+    """Фоновые задачи процесса: число запусков, ошибки, длительность последнего запуска"""
+    return {"tasks": scheduler.stats()}
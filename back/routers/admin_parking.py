@@ -2,6 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas import parking_zone as parking_schemas
+from services.vehicle_index import vehicle_index
+from services.cache import reference_cache
+from services.versions import collection_versions
 from typing import List
 
 router = APIRouter(prefix="/admin/parking", tags=["Админ: Парковки"])
@@ -18,12 +21,17 @@ def create_parking_zone(zone_data: parking_schemas.ParkingZoneCreate, db: Sessio
     new_zone = models.ParkingZone(
         name=zone_data.name,
         address=zone_data.address,
-        capacity=zone_data.capacity
+        capacity=zone_data.capacity,
+        latitude=zone_data.latitude,
+        longitude=zone_data.longitude
     )
 
     db.add(new_zone)
+    collection_versions.bump(db, "parking_zones")
     db.commit()
+    reference_cache.invalidate("parking_zones")
     db.refresh(new_zone)
+    vehicle_index.update_zone(new_zone.id, new_zone.latitude, new_zone.longitude)
 
     return new_zone
 
@@ -41,9 +49,16 @@ def update_parking_zone(zone_id: int, zone_data: parking_schemas.ParkingZoneUpda
         zone.address = zone_data.address
     if zone_data.capacity is not None:
         zone.capacity = zone_data.capacity
+    if zone_data.latitude is not None:
+        zone.latitude = zone_data.latitude
+    if zone_data.longitude is not None:
+        zone.longitude = zone_data.longitude
 
+    collection_versions.bump(db, "parking_zones")
     db.commit()
+    reference_cache.invalidate("parking_zones")
     db.refresh(zone)
+    vehicle_index.update_zone(zone.id, zone.latitude, zone.longitude)
 
     return zone
 
@@ -56,6 +71,9 @@ def delete_parking_zone(zone_id: int, db: Session = Depends(database.get_db)):
         raise HTTPException(status_code=404, detail="Парковка не найдена")
 
     db.delete(zone)
+    collection_versions.bump(db, "parking_zones")
     db.commit()
+    reference_cache.invalidate("parking_zones")
+    vehicle_index.remove_zone(zone_id)
 
     return {"message": "Парковка удалена", "zone_id": zone_id}
@@ -1,42 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, case, func
 from db import models, database
-from datetime import datetime, timedelta
+from db.database import SessionLocal
+from services import revenue_rollup, stats_counters
+from services.cache import create_cache
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Optional
+import os
+import time
 
 router = APIRouter(prefix="/admin/stats", tags=["Админ: Статистика"])
 
-@router.get("/dashboard")
-def get_dashboard_stats(db: Session = Depends(database.get_db)):
-    """Получить общую статистику для дашборда"""
-
-    # Общие показатели
-    total_users = db.query(models.User).count()
-    total_vehicles = db.query(models.Vehicle).count()
-    total_bookings = db.query(models.Booking).count()
-
-    # Статусы автомобилей
-    available_vehicles = db.query(models.Vehicle).filter(models.Vehicle.status == "available").count()
-    in_use_vehicles = db.query(models.Vehicle).filter(models.Vehicle.status == "in_use").count()
-    maintenance_vehicles = db.query(models.Vehicle).filter(models.Vehicle.status == "maintenance").count()
-
-    # Статусы бронирований
-    active_bookings = db.query(models.Booking).filter(models.Booking.status == "active").count()
-    completed_bookings = db.query(models.Booking).filter(models.Booking.status == "completed").count()
-    pending_bookings = db.query(models.Booking).filter(models.Booking.status == "pending").count()
-
-    # Общая выручка
-    total_revenue = db.query(func.sum(models.Booking.total_cost)).filter(
-        models.Booking.status == "completed"
-    ).scalar() or 0.0
-
-    # Выручка за текущий месяц
+# Дашборд открывают несколько админов сразу: результат живет DASHBOARD_CACHE_TTL секунд,
+# параллельные промахи ждут одно вычисление (single-flight в TTLCache)
+dashboard_cache = create_cache(
+    "dashboard", ttl=float(os.getenv("DASHBOARD_CACHE_TTL", "15")), maxsize=4, single_flight=True
+)
+_dashboard_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dashboard")
+
+
+def _with_session(query):
+    """Запрос в отдельной сессии - чтобы агрегаты шли параллельно в разных соединениях"""
+    db = SessionLocal()
+    try:
+        return query(db)
+    finally:
+        db.close()
+
+
+def _revenue(db: Session) -> dict:
+    # Общая и месячная выручка - одним проходом по бронированиям (условные агрегаты)
     current_month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    monthly_revenue = db.query(func.sum(models.Booking.total_cost)).filter(
-        models.Booking.status == "completed",
-        models.Booking.end_time >= current_month_start
-    ).scalar() or 0.0
+    completed = models.Booking.status == "completed"
+    total_revenue, monthly_revenue = db.query(
+        func.sum(case((completed, models.Booking.total_cost), else_=0.0)),
+        func.sum(case((and_(completed, models.Booking.end_time >= current_month_start), models.Booking.total_cost), else_=0.0))
+    ).one()
+    return {"total": total_revenue or 0.0, "monthly": monthly_revenue or 0.0}
+
 
+def _popular_vehicles(db: Session) -> list:
     # Самые популярные автомобили (топ-5 по количеству бронирований)
     popular_vehicles = db.query(
         models.Vehicle.id,
@@ -52,7 +57,7 @@ def get_dashboard_stats(db: Session = Depends(database.get_db)):
         func.count(models.Booking.id).desc()
     ).limit(5).all()
 
-    popular_vehicles_list = [
+    return [
         {
             "id": v.id,
             "brand": v.brand,
@@ -63,14 +68,18 @@ def get_dashboard_stats(db: Session = Depends(database.get_db)):
         for v in popular_vehicles
     ]
 
+
+def _vehicle_types(db: Session) -> dict:
     # Распределение по типам автомобилей
     vehicle_types = db.query(
         models.Vehicle.vehicle_type,
         func.count(models.Vehicle.id).label("count")
     ).group_by(models.Vehicle.vehicle_type).all()
 
-    vehicle_types_dict = {vt.vehicle_type: vt.count for vt in vehicle_types}
+    return {vt.vehicle_type: vt.count for vt in vehicle_types}
+
 
+def _active_users(db: Session) -> list:
     # Активность пользователей (топ-5 по количеству поездок)
     active_users = db.query(
         models.User.id,
@@ -87,7 +96,7 @@ def get_dashboard_stats(db: Session = Depends(database.get_db)):
         func.count(models.Booking.id).desc()
     ).limit(5).all()
 
-    active_users_list = [
+    return [
         {
             "id": u.id,
             "first_name": u.first_name,
@@ -99,92 +108,120 @@ def get_dashboard_stats(db: Session = Depends(database.get_db)):
         for u in active_users
     ]
 
-    # Инциденты
-    total_incidents = db.query(models.Incident).count()
-    reported_incidents = db.query(models.Incident).filter(models.Incident.status == "reported").count()
-    in_progress_incidents = db.query(models.Incident).filter(models.Incident.status == "in_progress").count()
-    resolved_incidents = db.query(models.Incident).filter(models.Incident.status == "resolved").count()
+
+def _compute_dashboard() -> dict:
+    computed_at = datetime.utcnow()
+    # Тяжелые агрегаты - параллельно, каждый в своем соединении
+    futures = {
+        name: _dashboard_executor.submit(_with_session, query)
+        for name, query in (
+            ("revenue", _revenue),
+            ("popular_vehicles", _popular_vehicles),
+            ("vehicle_types", _vehicle_types),
+            ("active_users", _active_users)
+        )
+    }
+    # Количества и статусы - из счетчиков (services/stats_counters.py), одним SELECT
+    counters = _with_session(stats_counters.read)
+    results = {name: future.result() for name, future in futures.items()}
 
     return {
-        "overview": {
-            "total_users": total_users,
-            "total_vehicles": total_vehicles,
-            "total_bookings": total_bookings,
-            "total_revenue": round(total_revenue, 2),
-            "monthly_revenue": round(monthly_revenue, 2)
-        },
-        "vehicles": {
-            "available": available_vehicles,
-            "in_use": in_use_vehicles,
-            "maintenance": maintenance_vehicles,
-            "by_type": vehicle_types_dict
-        },
-        "bookings": {
-            "active": active_bookings,
-            "completed": completed_bookings,
-            "pending": pending_bookings
+        "stats": {
+            "overview": {
+                "total_users": counters.get("users", 0),
+                "total_vehicles": counters.get("vehicles", 0),
+                "total_bookings": counters.get("bookings", 0),
+                "total_revenue": round(results["revenue"]["total"], 2),
+                "monthly_revenue": round(results["revenue"]["monthly"], 2)
+            },
+            "vehicles": {
+                "available": counters.get("vehicles:available", 0),
+                "in_use": counters.get("vehicles:in_use", 0),
+                "maintenance": counters.get("vehicles:maintenance", 0),
+                "by_type": results["vehicle_types"]
+            },
+            "bookings": {
+                "active": counters.get("bookings:active", 0),
+                "completed": counters.get("bookings:completed", 0),
+                "pending": counters.get("bookings:pending", 0)
+            },
+            "incidents": {
+                "total": counters.get("incidents", 0),
+                "reported": counters.get("incidents:reported", 0),
+                "in_progress": counters.get("incidents:in_progress", 0),
+                "resolved": counters.get("incidents:resolved", 0)
+            },
+            "popular_vehicles": results["popular_vehicles"],
+            "active_users": results["active_users"]
         },
-        "incidents": {
-            "total": total_incidents,
-            "reported": reported_incidents,
-            "in_progress": in_progress_incidents,
-            "resolved": resolved_incidents
-        },
-        "popular_vehicles": popular_vehicles_list,
-        "active_users": active_users_list
+        "computed_at": computed_at,
+        "computed_monotonic": time.monotonic()
     }
 
 
-@router.get("/revenue")
-def get_revenue_stats(db: Session = Depends(database.get_db)):
-    """Получить статистику выручки"""
-
-    # Выручка за последние 30 дней (по дням)
-    last_30_days = datetime.now() - timedelta(days=30)
-
-    daily_revenue = db.query(
-        func.date(models.Booking.end_time).label("date"),
-        func.sum(models.Booking.total_cost).label("revenue")
-    ).filter(
-        models.Booking.status == "completed",
-        models.Booking.end_time >= last_30_days
-    ).group_by(
-        func.date(models.Booking.end_time)
-    ).order_by(
-        func.date(models.Booking.end_time)
-    ).all()
+@router.get("/dashboard")
+def get_dashboard_stats(refresh: bool = False):
+    """Получить общую статистику для дашборда (refresh=true - пересчитать, не дожидаясь TTL)"""
+    if refresh:
+        dashboard_cache.invalidate("dashboard")
+    cached = dashboard_cache.get_or_set("dashboard", _compute_dashboard, tags=("dashboard",))
 
-    daily_revenue_list = [
-        {
-            "date": str(dr.date),
-            "revenue": float(dr.revenue or 0)
+    return {
+        **cached["stats"],
+        # Насколько данные могли устареть
+        "cache": {
+            "computed_at": cached["computed_at"],
+            "age_seconds": round(time.monotonic() - cached["computed_monotonic"], 3),
+            "ttl_seconds": dashboard_cache.ttl
         }
-        for dr in daily_revenue
-    ]
+    }
 
-    # Выручка по тарифам
-    revenue_by_tariff = db.query(
-        models.Tariff.name,
-        func.sum(models.Booking.total_cost).label("revenue"),
-        func.count(models.Booking.id).label("bookings_count")
-    ).join(
-        models.Booking, models.Tariff.id == models.Booking.tariff_id
-    ).filter(
-        models.Booking.status == "completed"
-    ).group_by(
-        models.Tariff.name
-    ).all()
 
-    tariff_revenue_list = [
-        {
-            "tariff": rt.name,
-            "revenue": float(rt.revenue or 0),
-            "bookings": rt.bookings_count
-        }
-        for rt in revenue_by_tariff
-    ]
+@router.get("/revenue")
+def get_revenue_stats(
+    date_from: Optional[date] = Query(None, alias="from", description="Начало периода (по умолчанию - 30 дней назад)"),
+    date_to: Optional[date] = Query(None, alias="to", description="Конец периода включительно (по умолчанию - сегодня)"),
+    granularity: str = Query("day", pattern="^(day|week|month)$", description="Период группировки"),
+    db: Session = Depends(database.get_db)
+):
+    """Статистика выручки из сводки revenue_daily за произвольный период"""
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=30)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="Начало периода позже конца")
+
+    # Число периодов, а не строк бронирований, определяет стоимость ответа
+    buckets = 0
+    current = revenue_rollup.bucket_start(date_from, granularity)
+    while current <= date_to and buckets <= revenue_rollup.MAX_BUCKETS:
+        buckets += 1
+        current = revenue_rollup.next_bucket(current, granularity)
+    if buckets > revenue_rollup.MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Слишком много периодов (больше {revenue_rollup.MAX_BUCKETS}) - увеличьте granularity"
+        )
+
+    series = revenue_rollup.revenue_series(db, date_from, date_to, granularity)
 
     return {
-        "daily_revenue_last_30_days": daily_revenue_list,
-        "revenue_by_tariff": tariff_revenue_list
+        "from": date_from,
+        "to": date_to,
+        "granularity": granularity,
+        "revenue": series,
+        # Прежнее поле ответа: дни с выручкой за период
+        "daily_revenue_last_30_days": [
+            {"date": item["date"], "revenue": item["revenue"]} for item in series if item["bookings"]
+        ] if granularity == "day" else [],
+        "revenue_by_tariff": revenue_rollup.revenue_by_tariff(db, date_from, date_to),
+        "revenue_by_zone": revenue_rollup.revenue_by_zone(db, date_from, date_to)
     }
+
+
+@router.post("/reconcile")
+def reconcile_counters(fix: bool = True, db: Session = Depends(database.get_db)):
+    """Пересчитать счетчики дашборда по таблицам и показать расхождение (fix=false - только показать)"""
+    result = stats_counters.reconcile(db, fix=fix)
+    if result["fixed"]:
+        dashboard_cache.invalidate("dashboard")
+    return result
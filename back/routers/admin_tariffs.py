@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas import tariff as tariff_schemas
+from services.cache import reference_cache
+from services.versions import collection_versions
 from typing import List
 
 router = APIRouter(prefix="/admin/tariffs", tags=["Админ: Тарифы"])
@@ -22,7 +24,9 @@ def create_tariff(tariff_data: tariff_schemas.TariffCreate, db: Session = Depend
     )
 
     db.add(new_tariff)
+    collection_versions.bump(db, "tariffs")
     db.commit()
+    reference_cache.invalidate("tariffs")
     db.refresh(new_tariff)
 
     return new_tariff
@@ -42,7 +46,9 @@ def update_tariff(tariff_id: int, tariff_data: tariff_schemas.TariffUpdate, db:
     if tariff_data.price_per_hour is not None:
         tariff.price_per_hour = tariff_data.price_per_hour
 
+    collection_versions.bump(db, "tariffs")
     db.commit()
+    reference_cache.invalidate("tariffs")
     db.refresh(tariff)
 
     return tariff
@@ -56,6 +62,8 @@ def delete_tariff(tariff_id: int, db: Session = Depends(database.get_db)):
         raise HTTPException(status_code=404, detail="Тариф не найден")
 
     db.delete(tariff)
+    collection_versions.bump(db, "tariffs")
     db.commit()
+    reference_cache.invalidate("tariffs")
 
     return {"message": "Тариф удален", "tariff_id": tariff_id}
@@ -1,16 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas import user as user_schemas
-from typing import List
+from services.list_query import ListQuery, filter_equal, filter_prefix
+from typing import List, Optional
 
 router = APIRouter(prefix="/admin/users", tags=["Админ: Пользователи"])
 
+users_list = ListQuery(
+    models.User,
+    sort_fields={"last_name": models.User.last_name, "email": models.User.email},
+    counter="users"
+)
+
 @router.get("/", response_model=List[user_schemas.UserResponse])
-def get_all_users(db: Session = Depends(database.get_db)):
-    """Получить всех пользователей"""
-    users = db.query(models.User).all()
-    return users
+def get_all_users(
+    response: Response,
+    email: Optional[str] = Query(None, description="Фильтр по email (точное совпадение)"),
+    phone: Optional[str] = Query(None, description="Фильтр по телефону (точное совпадение)"),
+    name: Optional[str] = Query(None, max_length=50, description="Имя или фамилия начинается с (без учета регистра)"),
+    sort: str = Query("id", description="Поле сортировки: id, last_name, email; -поле - по убыванию"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Размер страницы (без параметра - весь список)"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
+    with_total: bool = Query(False, description="Вернуть общее количество в X-Total-Count"),
+    db: Session = Depends(database.get_db)
+):
+    """Получить пользователей с фильтрами (страницами при указании limit)"""
+    query = db.query(models.User)
+    query = filter_equal(query, models.User.email, email)
+    query = filter_equal(query, models.User.phone, phone)
+    query = filter_prefix(query, [models.User.first_name, models.User.last_name], name)
+
+    filters = {"email": email, "phone": phone, "name": name}
+    return users_list.page(
+        db, query, response, sort=sort, limit=limit, cursor=cursor, with_total=with_total, filters=filters
+    )
 
 @router.get("/{user_id}", response_model=user_schemas.UserResponse)
 def get_user(user_id: int, db: Session = Depends(database.get_db)):
@@ -1,16 +1,210 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
+from pydantic import ValidationError
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas import vehicle as vehicle_schemas
-from typing import List
+from services import stats_counters
+from services.list_query import ListQuery, filter_equal
+from services.vehicle_index import vehicle_index
+from services.versions import collection_versions
+from typing import Iterator, List, Optional, Tuple
+import csv
+import io
+import json
+import time
 
 router = APIRouter(prefix="/admin/vehicles", tags=["Админ: Автомобили"])
 
+vehicles_list = ListQuery(
+    models.Vehicle,
+    sort_fields={
+        "license_plate": models.Vehicle.license_plate,
+        "brand": models.Vehicle.brand,
+        "year": models.Vehicle.year
+    },
+    counter="vehicles"
+)
+
 @router.get("/", response_model=List[vehicle_schemas.VehicleResponse])
-def get_all_vehicles(db: Session = Depends(database.get_db)):
-    """Получить все автомобили"""
-    vehicles = db.query(models.Vehicle).all()
-    return vehicles
+def get_all_vehicles(
+    response: Response,
+    status: Optional[str] = Query(None, description="Фильтр по статусу"),
+    vehicle_type: Optional[str] = Query(None, description="Фильтр по типу"),
+    parking_zone_id: Optional[int] = Query(None, description="Фильтр по парковке"),
+    tariff_id: Optional[int] = Query(None, description="Фильтр по тарифу"),
+    sort: str = Query("id", description="Поле сортировки: id, license_plate, brand, year; -поле - по убыванию"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Размер страницы (без параметра - весь список)"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
+    with_total: bool = Query(False, description="Вернуть общее количество в X-Total-Count"),
+    db: Session = Depends(database.get_db)
+):
+    """Получить автомобили с фильтрами (страницами при указании limit)"""
+    query = db.query(models.Vehicle)
+    query = filter_equal(query, models.Vehicle.status, status)
+    query = filter_equal(query, models.Vehicle.vehicle_type, vehicle_type)
+    query = filter_equal(query, models.Vehicle.parking_zone_id, parking_zone_id)
+    query = filter_equal(query, models.Vehicle.tariff_id, tariff_id)
+
+    filters = {
+        "status": status, "vehicle_type": vehicle_type,
+        "parking_zone_id": parking_zone_id, "tariff_id": tariff_id
+    }
+    return vehicles_list.page(
+        db, query, response, sort=sort, limit=limit, cursor=cursor, with_total=with_total, filters=filters
+    )
+
+@router.get("/index/check")
+def check_vehicle_index(repair: bool = False, db: Session = Depends(database.get_db)):
+    """Сверить индекс автомобилей в памяти с БД (repair=true - перестроить при расхождении)"""
+    return vehicle_index.check(db, repair=repair)
+
+def iter_import_rows(upload: UploadFile, file_format: str) -> Iterator[Tuple[int, object]]:
+    """Построчно читает загруженный файл: (номер строки, словарь или текст ошибки)"""
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+
+    if file_format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Пустые ячейки CSV считаем отсутствующими значениями
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in ("", None)}
+        return
+
+    for line_num, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_num, f"Некорректный JSON: {e.msg}"
+            continue
+        if not isinstance(data, dict):
+            yield line_num, "Ожидался JSON-объект"
+            continue
+        yield line_num, data
+
+
+def format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
+
+
+def insert_vehicle_batch(db: Session, batch: List[dict], report: dict):
+    """Вставить пачку одним executemany; дубликаты номеров отсеиваются одним запросом"""
+    plates = [row["license_plate"] for _, row in batch]
+    existing = {
+        plate for (plate,) in db.query(models.Vehicle.license_plate).filter(
+            models.Vehicle.license_plate.in_(plates)
+        )
+    }
+
+    rows = []
+    for line_num, row in batch:
+        if row["license_plate"] in existing:
+            add_import_error(report, line_num, row["license_plate"], "Автомобиль с таким номером уже существует")
+        else:
+            rows.append((line_num, row))
+
+    if not rows:
+        return
+
+    try:
+        db.execute(insert(models.Vehicle), [row for _, row in rows])
+        stats_counters.apply(db, {"vehicles": len(rows), "vehicles:available": len(rows)})
+        collection_versions.bump(db, "vehicles")
+        db.commit()
+        report["imported"] += len(rows)
+    except IntegrityError:
+        # Номер успели занять параллельно - повторяем пачку построчно, чтобы найти виновника
+        db.rollback()
+        for line_num, row in rows:
+            try:
+                db.execute(insert(models.Vehicle), [row])
+                stats_counters.apply(db, {"vehicles": 1, "vehicles:available": 1})
+                collection_versions.bump(db, "vehicles")
+                db.commit()
+                report["imported"] += 1
+            except IntegrityError as e:
+                db.rollback()
+                add_import_error(report, line_num, row["license_plate"], f"Ошибка вставки: {e.orig}")
+
+
+def add_import_error(report: dict, line_num: int, license_plate: Optional[str], error: str):
+    report["failed"] += 1
+    if len(report["errors"]) < report["max_errors"]:
+        report["errors"].append({"row": line_num, "license_plate": license_plate, "error": error})
+
+@router.post("/import", response_model=vehicle_schemas.VehicleImportReport)
+def import_vehicles(
+    file: UploadFile = File(..., description="CSV с заголовком или NDJSON (по объекту VehicleCreate на строку)"),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Формат файла; по умолчанию - по расширению"),
+    batch_size: int = Query(1000, ge=1, le=10000, description="Размер пачки вставки"),
+    max_errors: int = Query(1000, ge=0, le=100000, description="Максимум ошибок в отчете"),
+    db: Session = Depends(database.get_db)
+):
+    """Массовый импорт автомобилей из CSV/NDJSON пачками"""
+    started = time.perf_counter()
+
+    file_format = format
+    if file_format is None:
+        filename = (file.filename or "").lower()
+        file_format = "csv" if filename.endswith(".csv") or file.content_type == "text/csv" else "ndjson"
+
+    # Справочники маленькие - проверяем внешние ключи по множествам в памяти
+    tariff_ids = {tariff_id for (tariff_id,) in db.query(models.Tariff.id)}
+    zone_ids = {zone_id for (zone_id,) in db.query(models.ParkingZone.id)}
+
+    report = {"total_rows": 0, "imported": 0, "failed": 0, "errors": [], "max_errors": max_errors}
+    seen_plates = set()
+    batch = []
+
+    for line_num, data in iter_import_rows(file, file_format):
+        report["total_rows"] += 1
+
+        if isinstance(data, str):
+            add_import_error(report, line_num, None, data)
+            continue
+
+        try:
+            vehicle_data = vehicle_schemas.VehicleCreate.model_validate(data)
+        except ValidationError as e:
+            add_import_error(report, line_num, data.get("license_plate"), format_validation_error(e))
+            continue
+
+        if vehicle_data.license_plate in seen_plates:
+            add_import_error(report, line_num, vehicle_data.license_plate, "Номер повторяется в файле")
+            continue
+        if vehicle_data.tariff_id is not None and vehicle_data.tariff_id not in tariff_ids:
+            add_import_error(report, line_num, vehicle_data.license_plate, "Тариф не найден")
+            continue
+        if vehicle_data.parking_zone_id is not None and vehicle_data.parking_zone_id not in zone_ids:
+            add_import_error(report, line_num, vehicle_data.license_plate, "Парковка не найдена")
+            continue
+
+        seen_plates.add(vehicle_data.license_plate)
+        batch.append((line_num, {**vehicle_data.model_dump(), "status": "available"}))
+
+        if len(batch) >= batch_size:
+            insert_vehicle_batch(db, batch, report)
+            batch = []
+
+    if batch:
+        insert_vehicle_batch(db, batch, report)
+
+    if report["imported"]:
+        vehicle_index.invalidate()
+
+    return vehicle_schemas.VehicleImportReport(
+        total_rows=report["total_rows"],
+        imported=report["imported"],
+        failed=report["failed"],
+        errors=sorted(report["errors"], key=lambda error: error["row"]),
+        errors_truncated=report["failed"] > len(report["errors"]),
+        elapsed_seconds=round(time.perf_counter() - started, 3)
+    )
 
 @router.post("/", response_model=vehicle_schemas.VehicleResponse)
 def create_vehicle(vehicle_data: vehicle_schemas.VehicleCreate, db: Session = Depends(database.get_db)):
@@ -31,15 +225,77 @@ def create_vehicle(vehicle_data: vehicle_schemas.VehicleCreate, db: Session = De
         description=vehicle_data.description,
         status="available",
         parking_zone_id=vehicle_data.parking_zone_id,
-        tariff_id=vehicle_data.tariff_id
+        tariff_id=vehicle_data.tariff_id,
+        latitude=vehicle_data.latitude,
+        longitude=vehicle_data.longitude
     )
 
     db.add(new_vehicle)
+    db.flush()
+    collection_versions.bump(db, "vehicles", changed=[new_vehicle.id])
     db.commit()
     db.refresh(new_vehicle)
 
+    vehicle_index.upsert(new_vehicle)
+
     return new_vehicle
 
+@router.patch("/bulk", response_model=vehicle_schemas.VehicleBulkUpdateResponse)
+def bulk_update_vehicles(request: vehicle_schemas.VehicleBulkUpdateRequest, db: Session = Depends(database.get_db)):
+    """Массовое изменение автомобилей одним UPDATE ... WHERE (dry_run - только посчитать)"""
+    criteria = request.filter
+    patch = request.patch.model_dump(exclude_none=True)
+
+    if not patch:
+        raise HTTPException(status_code=400, detail="Не указаны поля для изменения")
+
+    query = db.query(models.Vehicle)
+    if criteria.ids is not None:
+        query = query.filter(models.Vehicle.id.in_(criteria.ids))
+    if criteria.parking_zone_id is not None:
+        query = query.filter(models.Vehicle.parking_zone_id == criteria.parking_zone_id)
+    if criteria.tariff_id is not None:
+        query = query.filter(models.Vehicle.tariff_id == criteria.tariff_id)
+    if criteria.vehicle_type:
+        query = query.filter(models.Vehicle.vehicle_type == criteria.vehicle_type)
+    if criteria.status:
+        query = query.filter(models.Vehicle.status == criteria.status)
+
+    has_criteria = criteria.model_dump(exclude_none=True, exclude={"all"})
+    if not has_criteria and not criteria.all:
+        raise HTTPException(status_code=400, detail="Не указан фильтр. Для изменения всех автомобилей передайте all=true")
+
+    if request.dry_run:
+        matched = query.count()
+        return vehicle_schemas.VehicleBulkUpdateResponse(matched=matched, updated=0, dry_run=True)
+
+    # Смена статуса в обход ORM - счетчики дашборда переносим сами
+    counters = {}
+    if "status" in patch:
+        for status, count in query.with_entities(models.Vehicle.status, func.count(models.Vehicle.id)).group_by(models.Vehicle.status):
+            counters[f"vehicles:{status}"] = counters.get(f"vehicles:{status}", 0) - count
+            counters[f"vehicles:{patch['status']}"] = counters.get(f"vehicles:{patch['status']}", 0) + count
+
+    try:
+        # Объекты в сессию не загружаются - память не зависит от размера автопарка
+        updated = query.update(
+            {getattr(models.Vehicle, field): value for field, value in patch.items()},
+            synchronize_session=False
+        )
+        stats_counters.apply(db, counters)
+        if updated:
+            collection_versions.bump(db, "vehicles")
+        db.commit()
+    except IntegrityError as e:
+        # Например, несуществующая парковка или тариф
+        db.rollback()
+        raise HTTPException(status_code=409, detail=f"Изменение нарушает ограничения БД: {e.orig}")
+
+    if updated:
+        vehicle_index.invalidate()
+
+    return vehicle_schemas.VehicleBulkUpdateResponse(matched=updated, updated=updated, dry_run=False)
+
 @router.patch("/{vehicle_id}", response_model=vehicle_schemas.VehicleResponse)
 def update_vehicle(vehicle_id: int, vehicle_data: vehicle_schemas.VehicleUpdate, db: Session = Depends(database.get_db)):
     """Обновить данные автомобиля"""
@@ -68,10 +324,17 @@ def update_vehicle(vehicle_id: int, vehicle_data: vehicle_schemas.VehicleUpdate,
         vehicle.parking_zone_id = vehicle_data.parking_zone_id
     if vehicle_data.tariff_id is not None:
         vehicle.tariff_id = vehicle_data.tariff_id
+    if vehicle_data.latitude is not None:
+        vehicle.latitude = vehicle_data.latitude
+    if vehicle_data.longitude is not None:
+        vehicle.longitude = vehicle_data.longitude
 
+    collection_versions.bump(db, "vehicles", changed=[vehicle.id])
     db.commit()
     db.refresh(vehicle)
 
+    vehicle_index.upsert(vehicle)
+
     return vehicle
 
 @router.delete("/{vehicle_id}")
@@ -83,6 +346,9 @@ def delete_vehicle(vehicle_id: int, db: Session = Depends(database.get_db)):
         raise HTTPException(status_code=404, detail="Автомобиль не найден")
 
     db.delete(vehicle)
+    collection_versions.bump(db, "vehicles", changed=[vehicle_id])
     db.commit()
 
+    vehicle_index.remove(vehicle_id)
+
     return {"message": "Автомобиль удален", "vehicle_id": vehicle_id}
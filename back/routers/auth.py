@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from db import models, database
+from db.async_database import db_endpoint
 from schemas import user as user_schemas
 
 router = APIRouter(prefix="/auth", tags=["Авторизация клиентов"])
 
 @router.post("/register", response_model=user_schemas.UserResponse)
+@db_endpoint
 def register(user_data: user_schemas.UserCreate, db: Session = Depends(database.get_db)):
     """Регистрация нового пользователя"""
     # Проверка email
@@ -26,7 +28,7 @@ def register(user_data: user_schemas.UserCreate, db: Session = Depends(database.
         phone=user_data.phone,
         password=user_data.password,  # БЕЗ хеширования
         drivers_license=user_data.drivers_license,
-        balance=0.0
+        opening_balance=0.0
     )
 
     db.add(new_user)
@@ -36,6 +38,7 @@ def register(user_data: user_schemas.UserCreate, db: Session = Depends(database.
     return new_user
 
 @router.post("/login")
+@db_endpoint
 def login(login_data: user_schemas.UserLogin, db: Session = Depends(database.get_db)):
     """Вход пользователя"""
     user = db.query(models.User).filter(models.User.email == login_data.email).first()
@@ -56,6 +59,7 @@ def login(login_data: user_schemas.UserLogin, db: Session = Depends(database.get
     }
 
 @router.get("/me/{user_id}", response_model=user_schemas.UserResponse)
+@db_endpoint
 def get_current_user(user_id: int, db: Session = Depends(database.get_db)):
     """Получить данные текущего пользователя"""
     user = db.query(models.User).filter(models.User.id == user_id).first()
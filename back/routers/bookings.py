@@ -1,9 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from datetime import date
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from db import models, database
+from db.async_database import db_endpoint
 from schemas import booking as booking_schemas
+from services import ledger, pricing, revenue_rollup, stats_counters
+from services.availability import BLOCKING_STATUSES, availability_index
+from services.list_query import filter_range
+from services.user_history import bookings_history
+from services.vehicle_index import vehicle_index
+from services.versions import collection_versions
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 router = APIRouter(prefix="/bookings", tags=["Бронирования клиента"])
 
@@ -21,7 +30,33 @@ class CostCalculationResponse(BaseModel):
     total_cost: float
     price_per_day: float
 
+
+class QuoteItemRequest(BaseModel):
+    tariff_id: int
+    start_date: date
+    end_date: date
+
+
+class QuotesRequest(BaseModel):
+    items: List[QuoteItemRequest] = Field(..., max_length=5000)
+
+
+class QuoteItemResponse(BaseModel):
+    tariff_id: int
+    start_date: date
+    end_date: date
+    tariff_name: Optional[str] = None
+    days_count: Optional[int] = None
+    price_per_day: Optional[float] = None
+    total_cost: Optional[float] = None
+    error: Optional[str] = None
+
+
+class QuotesResponse(BaseModel):
+    quotes: List[QuoteItemResponse]
+
 @router.post("/", response_model=booking_schemas.BookingResponse)
+@db_endpoint
 def create_booking(booking_data: booking_schemas.BookingCreate, user_id: int, db: Session = Depends(database.get_db)):
     """Создать новое бронирование (только посуточная аренда)"""
     from datetime import datetime
@@ -38,11 +73,27 @@ def create_booking(booking_data: booking_schemas.BookingCreate, user_id: int, db
     if not vehicle:
         raise HTTPException(status_code=404, detail="Автомобиль не найден")
 
-    if vehicle.status != "available":
+    # На обслуживании и т.п. - бронировать нельзя; занятость по датам проверяется ниже
+    if vehicle.status not in ("available", "in_use"):
         raise HTTPException(status_code=400, detail="Автомобиль недоступен")
 
-    # Получение тарифа
-    tariff = db.query(models.Tariff).filter(models.Tariff.id == booking_data.tariff_id).first()
+    # Бронирование на сегодня забирает машину сразу, будущее - ждет своей даты
+    starts_now = booking_data.start_date <= date.today()
+    if starts_now and vehicle.status != "available":
+        raise HTTPException(status_code=400, detail="Автомобиль недоступен")
+
+    # Полуинтервал [начало start_date, начало end_date): аренда 5 -> 6 занимает
+    # одни сутки, и бронирование 6 -> 7 с ней не пересекается
+    start_datetime = datetime.combine(booking_data.start_date, datetime.min.time())
+    end_datetime = datetime.combine(booking_data.end_date, datetime.min.time())
+
+    # Быстрый отказ по индексу интервалов (O(log n)); окончательная проверка - в транзакции ниже
+    availability_index.ensure_loaded(db)
+    if availability_index.find_overlap(vehicle.id, start_datetime, end_datetime):
+        raise HTTPException(status_code=400, detail="Автомобиль уже забронирован на выбранные даты")
+
+    # Получение тарифа (цены за сутки кэшируются в модуле pricing)
+    tariff = pricing.get_tariff_prices(db).get(booking_data.tariff_id)
 
     if not tariff:
         raise HTTPException(status_code=404, detail="Тариф не найден")
@@ -53,20 +104,10 @@ def create_booking(booking_data: booking_schemas.BookingCreate, user_id: int, db
     if days_count <= 0:
         raise HTTPException(status_code=400, detail="Дата окончания должна быть позже даты начала")
 
-    # Расчет стоимости (за день = 24 часа по почасовому тарифу)
-    if tariff.price_per_hour:
-        # Цена за день = цена за час * 24 часа
-        price_per_day = tariff.price_per_hour * 24
-        total_cost = price_per_day * days_count
-    elif tariff.price_per_minute:
-        # Цена за день = цена за минуту * 1440 минут (24 часа)
-        price_per_day = tariff.price_per_minute * 1440
-        total_cost = price_per_day * days_count
-    else:
+    if tariff["price_per_day"] is None:
         raise HTTPException(status_code=400, detail="У тарифа не указана цена")
 
-    # Округляем до 2 знаков после запятой
-    total_cost = round(total_cost, 2)
+    total_cost = pricing.total_cost(tariff["price_per_day"], days_count)
 
     # Проверка баланса пользователя
     user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -77,12 +118,23 @@ def create_booking(booking_data: booking_schemas.BookingCreate, user_id: int, db
     if user.balance < total_cost:
         raise HTTPException(status_code=400, detail=f"Недостаточно средств. Требуется: {total_cost:.2f} ₽, доступно: {user.balance:.2f} ₽")
 
-    # Списание с баланса
-    user.balance -= total_cost
+    # Дальше - одна транзакция. Все проверки выше повторяются условными UPDATE:
+    # параллельный запрос мог успеть занять машину или потратить баланс.
+    try:
+        _claim_vehicle(db, vehicle.id, starts_now)
 
-    # Конвертируем даты в datetime (начало дня для start_date, конец дня для end_date)
-    start_datetime = datetime.combine(booking_data.start_date, datetime.min.time())
-    end_datetime = datetime.combine(booking_data.end_date, datetime.max.time())
+        # Строка автомобиля заблокирована до commit (PostgreSQL - блокировка строки,
+        # SQLite - блокировка записи БД), пересечения проверяем уже под ней
+        if _has_overlap(db, vehicle.id, start_datetime, end_datetime):
+            raise HTTPException(status_code=400, detail="Автомобиль уже забронирован на выбранные даты")
+
+        # Счет заблокирован до commit: параллельное списание не прочитает тот же баланс
+        ledger.lock_account(db, user_id)
+        if ledger.balance(db, user_id) < total_cost:
+            raise HTTPException(status_code=400, detail=f"Недостаточно средств. Требуется: {total_cost:.2f} ₽")
+    except Exception:
+        db.rollback()
+        raise
 
     # Создание бронирования
     new_booking = models.Booking(
@@ -93,40 +145,93 @@ def create_booking(booking_data: booking_schemas.BookingCreate, user_id: int, db
         end_time=end_datetime,
         duration_hours=None,  # Не используем для посуточной аренды
         total_cost=total_cost,
-        status="active"
+        status="active" if starts_now else "pending"
     )
 
-    # Обновление статуса автомобиля
-    vehicle.status = "in_use"
-
-    # Создание транзакции
-    transaction = models.Transaction(
-        user_id=user_id,
-        booking_id=None,  # Будет обновлено после коммита
-        transaction_type="payment",
-        amount=total_cost,
-        description=f"Оплата бронирования автомобиля {vehicle.brand} {vehicle.model} на {days_count} дн.",
-        status="completed"
-    )
+    try:
+        db.add(new_booking)
+        # flush выдает id бронирования без commit - транзакция оплаты ссылается на него сразу
+        db.flush()
+
+        # Создание транзакции
+        db.add(models.Transaction(
+            user_id=user_id,
+            booking_id=new_booking.id,
+            transaction_type="payment",
+            amount=total_cost,
+            balance_delta=-total_cost,
+            description=f"Оплата бронирования автомобиля {vehicle.brand} {vehicle.model} на {days_count} дн.",
+            status="completed"
+        ))
+        # Календарь занятости автомобиля; каталог - только если сменился статус машины
+        if starts_now:
+            collection_versions.bump(db, "bookings", "vehicles", changed=[vehicle.id])
+        else:
+            collection_versions.bump(db, "bookings", changed=[vehicle.id])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
-    db.add(new_booking)
-    db.commit()
     db.refresh(new_booking)
+    availability_index.add(new_booking.vehicle_id, start_datetime, end_datetime, new_booking.id)
 
-    # Обновляем booking_id в транзакции
-    transaction.booking_id = new_booking.id
-    db.add(transaction)
-    db.commit()
+    if starts_now:
+        db.refresh(vehicle)
+        vehicle_index.upsert(vehicle)
 
     return new_booking
 
+
+def _claim_vehicle(db: Session, vehicle_id: int, starts_now: bool):
+    """Условный UPDATE строки автомобиля: занимает ее до конца транзакции.
+
+    Бронирование с сегодняшнего дня переводит машину available -> in_use,
+    будущее бронирование только блокирует строку (статус не меняется).
+    Если машину успели занять или снять с линии - 400.
+    """
+    query = db.query(models.Vehicle).filter(models.Vehicle.id == vehicle_id)
+    if starts_now:
+        claimed = query.filter(models.Vehicle.status == "available").update(
+            {models.Vehicle.status: "in_use"}, synchronize_session=False
+        )
+    else:
+        claimed = query.filter(models.Vehicle.status.in_(("available", "in_use"))).update(
+            {models.Vehicle.status: models.Vehicle.status}, synchronize_session=False
+        )
+    if not claimed:
+        raise HTTPException(status_code=400, detail="Автомобиль недоступен")
+    if starts_now:
+        stats_counters.apply(db, {"vehicles:available": -1, "vehicles:in_use": 1})
+
+
+def _has_overlap(db: Session, vehicle_id: int, start_time, end_time) -> bool:
+    """Есть ли у машины активное или ожидающее бронирование, пересекающее [start_time, end_time)"""
+    return db.query(models.Booking.id).filter(
+        models.Booking.vehicle_id == vehicle_id,
+        models.Booking.status.in_(BLOCKING_STATUSES),
+        models.Booking.start_time < end_time,
+        or_(models.Booking.end_time.is_(None), models.Booking.end_time > start_time)
+    ).first() is not None
+
 @router.get("/user/{user_id}", response_model=List[booking_schemas.BookingResponse])
-def get_user_bookings(user_id: int, db: Session = Depends(database.get_db)):
-    """Получить все бронирования пользователя"""
-    bookings = db.query(models.Booking).filter(models.Booking.user_id == user_id).all()
-    return bookings
+@db_endpoint
+def get_user_bookings(
+    user_id: int,
+    response: Response,
+    date_from: Optional[date] = Query(None, alias="from", description="Начало не раньше даты"),
+    date_to: Optional[date] = Query(None, alias="to", description="Начало не позже даты (включительно)"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Размер страницы (без параметра - вся история)"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
+    db: Session = Depends(database.get_db)
+):
+    """Получить бронирования пользователя, новые первыми"""
+    query = db.query(models.Booking).filter(models.Booking.user_id == user_id)
+    query = filter_range(query, models.Booking.start_time, date_from, date_to)
+    return bookings_history.page(db, query, response, sort="-start_time", limit=limit, cursor=cursor)
 
 @router.patch("/{booking_id}/complete", response_model=booking_schemas.BookingResponse)
+@db_endpoint
 def complete_booking(booking_id: int, complete_data: booking_schemas.BookingComplete, db: Session = Depends(database.get_db)):
     """Завершить бронирование"""
     booking = db.query(models.Booking).filter(models.Booking.id == booking_id).first()
@@ -137,44 +242,64 @@ def complete_booking(booking_id: int, complete_data: booking_schemas.BookingComp
     if booking.status != "active":
         raise HTTPException(status_code=400, detail="Бронирование уже завершено")
 
-    # Обновление бронирования
-    booking.end_time = complete_data.end_time
-    booking.total_cost = complete_data.total_cost
-    booking.status = "completed"
+    vehicle = db.query(models.Vehicle).filter(models.Vehicle.id == booking.vehicle_id).first()
+    # Выручка остается за парковкой, где автомобиль был при завершении
+    zone_id = vehicle.parking_zone_id if vehicle else None
+
+    # Обновление бронирования: условный UPDATE, чтобы параллельное завершение не списало дважды
+    completed = db.query(models.Booking).filter(
+        models.Booking.id == booking_id,
+        models.Booking.status == "active"
+    ).update({
+        models.Booking.end_time: complete_data.end_time,
+        models.Booking.total_cost: complete_data.total_cost,
+        models.Booking.parking_zone_id: zone_id,
+        models.Booking.status: "completed"
+    }, synchronize_session=False)
+    if not completed:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Бронирование уже завершено")
+    stats_counters.apply(db, {"bookings:active": -1, "bookings:completed": 1})
+    revenue_rollup.record(db, [(complete_data.end_time, booking.tariff_id, zone_id, complete_data.total_cost)])
 
     # Освобождение автомобиля
-    vehicle = db.query(models.Vehicle).filter(models.Vehicle.id == booking.vehicle_id).first()
     if vehicle:
         vehicle.status = "available"
 
-    # Списание с баланса
-    user = db.query(models.User).filter(models.User.id == booking.user_id).first()
-    if user:
-        user.balance -= complete_data.total_cost
-
-    # Создание транзакции
+    # Списание с баланса - запись в журнале
     transaction = models.Transaction(
         user_id=booking.user_id,
         booking_id=booking.id,
         transaction_type="payment",
         amount=complete_data.total_cost,
+        balance_delta=-complete_data.total_cost,
         status="completed"
     )
     db.add(transaction)
+    if vehicle:
+        collection_versions.bump(db, "bookings", "vehicles", changed=[vehicle.id])
+    else:
+        collection_versions.bump(db, "bookings", changed=[booking.vehicle_id])
 
     db.commit()
     db.refresh(booking)
 
+    availability_index.release(booking.vehicle_id, booking.start_time, booking.id)
+
+    if vehicle:
+        vehicle_index.upsert(vehicle)
+
     return booking
 
 
 @router.post("/calculate-cost", response_model=CostCalculationResponse)
+@db_endpoint
 def calculate_booking_cost(request: CostCalculationRequest, db: Session = Depends(database.get_db)):
     """Рассчитать стоимость бронирования (только посуточная аренда)"""
     from datetime import datetime
 
     # Получение тарифа
-    tariff = db.query(models.Tariff).filter(models.Tariff.id == request.tariff_id).first()
+    tariff = pricing.get_tariff_prices(db).get(request.tariff_id)
 
     if not tariff:
         raise HTTPException(status_code=404, detail="Тариф не найден")
@@ -192,23 +317,26 @@ def calculate_booking_cost(request: CostCalculationRequest, db: Session = Depend
     if days_count <= 0:
         raise HTTPException(status_code=400, detail="Дата окончания должна быть позже даты начала")
 
-    # Расчет стоимости (за день = 24 часа по почасовому тарифу)
-    if tariff.price_per_hour:
-        price_per_day = tariff.price_per_hour * 24
-        total_cost = price_per_day * days_count
-    elif tariff.price_per_minute:
-        price_per_day = tariff.price_per_minute * 1440
-        total_cost = price_per_day * days_count
-    else:
+    if tariff["price_per_day"] is None:
         raise HTTPException(status_code=400, detail="У тарифа не указана цена")
 
-    total_cost = round(total_cost, 2)
-    price_per_day = round(price_per_day, 2)
-
     return CostCalculationResponse(
-        tariff_id=tariff.id,
-        tariff_name=tariff.name,
+        tariff_id=tariff["id"],
+        tariff_name=tariff["name"],
         days_count=days_count,
-        total_cost=total_cost,
-        price_per_day=price_per_day
+        total_cost=pricing.total_cost(tariff["price_per_day"], days_count),
+        price_per_day=round(tariff["price_per_day"], 2)
     )
+
+
+@router.post("/quotes", response_model=QuotesResponse)
+@db_endpoint
+def calculate_quotes(request: QuotesRequest, db: Session = Depends(database.get_db)):
+    """Рассчитать стоимость для множества (тариф, даты) за один запрос - например, матрица цен для календаря"""
+    prices = pricing.get_tariff_prices(db)
+    items = [(item.tariff_id, item.start_date, item.end_date) for item in request.items]
+
+    return QuotesResponse(quotes=[
+        QuoteItemResponse(tariff_id=tariff_id, start_date=start_date, end_date=end_date, **result)
+        for (tariff_id, start_date, end_date), result in zip(items, pricing.quote_many(prices, items))
+    ])
@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas import employee as employee_schemas
+from services.cache import reference_cache
+from services.versions import collection_versions
 
 router = APIRouter(prefix="/admin/auth", tags=["Авторизация сотрудников"])
 
@@ -13,8 +15,12 @@ def employee_login(login_data: employee_schemas.EmployeeLogin, db: Session = Dep
     if not employee or employee.password != login_data.password:
         raise HTTPException(status_code=401, detail="Неверный email или пароль")
 
-    # Получаем роль
-    role = db.query(models.Role).filter(models.Role.id == employee.role_id).first()
+    # Получаем роль (справочник ролей кэшируется целиком; версию "roles" увеличивает запись ролей)
+    roles = reference_cache.get_or_set(
+        collection_versions.cache_key(db, "roles", "roles:all"),
+        lambda: {r.id: r.name for r in db.query(models.Role).all()},
+        tags=("roles",)
+    )
 
     return {
         "message": "Вход выполнен успешно",
@@ -23,7 +29,7 @@ def employee_login(login_data: employee_schemas.EmployeeLogin, db: Session = Dep
             "first_name": employee.first_name,
             "last_name": employee.last_name,
             "email": employee.email,
-            "role": role.name if role else None,
+            "role": roles.get(employee.role_id),
             "role_id": employee.role_id,
             "branch_id": employee.branch_id
         }
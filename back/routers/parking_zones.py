@@ -1,21 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas import parking_zone as parking_schemas
+from services.cache import reference_cache
+from services.versions import collection_versions, not_modified
 from typing import List
 
 router = APIRouter(prefix="/parking-zones", tags=["Парковочные зоны"])
 
+
+def load_parking_zones(db: Session) -> List[dict]:
+    """Все парковки из кэша справочников (при промахе - из БД)"""
+    return reference_cache.get_or_set(
+        collection_versions.cache_key(db, "parking_zones", "parking_zones:all"),
+        lambda: [
+            parking_schemas.ParkingZoneResponse.model_validate(z).model_dump()
+            for z in db.query(models.ParkingZone).all()
+        ],
+        tags=("parking_zones",)
+    )
+
 @router.get("/", response_model=List[parking_schemas.ParkingZoneResponse])
-def get_all_parking_zones(db: Session = Depends(database.get_db)):
+def get_all_parking_zones(request: Request, response: Response, db: Session = Depends(database.get_db)):
     """Получить все парковочные зоны"""
-    zones = db.query(models.ParkingZone).all()
-    return zones
+    cached = not_modified(db, request, response, "parking_zones")
+    if cached:
+        return cached
+
+    return load_parking_zones(db)
 
 @router.get("/{zone_id}", response_model=parking_schemas.ParkingZoneResponse)
-def get_parking_zone(zone_id: int, db: Session = Depends(database.get_db)):
+def get_parking_zone(zone_id: int, request: Request, response: Response, db: Session = Depends(database.get_db)):
     """Получить информацию о парковочной зоне"""
-    zone = db.query(models.ParkingZone).filter(models.ParkingZone.id == zone_id).first()
+    cached = not_modified(db, request, response, "parking_zones")
+    if cached:
+        return cached
+
+    zone = next((z for z in load_parking_zones(db) if z["id"] == zone_id), None)
 
     if not zone:
         raise HTTPException(status_code=404, detail="Парковочная зона не найдена")
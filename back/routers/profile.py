@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from db import models, database
+from db.async_database import db_endpoint
 from schemas import user as user_schemas
 from pydantic import BaseModel
 
@@ -11,6 +12,7 @@ class TopUpBalanceRequest(BaseModel):
     amount: float
 
 @router.get("/{user_id}", response_model=user_schemas.UserResponse)
+@db_endpoint
 def get_profile(user_id: int, db: Session = Depends(database.get_db)):
     """Получить профиль пользователя"""
     user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -21,6 +23,7 @@ def get_profile(user_id: int, db: Session = Depends(database.get_db)):
     return user
 
 @router.patch("/{user_id}", response_model=user_schemas.UserResponse)
+@db_endpoint
 def update_profile(user_id: int, user_data: user_schemas.UserUpdate, db: Session = Depends(database.get_db)):
     """Обновить профиль пользователя"""
     user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -44,6 +47,7 @@ def update_profile(user_id: int, user_data: user_schemas.UserUpdate, db: Session
 
 
 @router.get("/{user_id}/balance")
+@db_endpoint
 def get_balance(user_id: int, db: Session = Depends(database.get_db)):
     """Получить баланс пользователя"""
     user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -55,6 +59,7 @@ def get_balance(user_id: int, db: Session = Depends(database.get_db)):
 
 
 @router.post("/{user_id}/top-up", response_model=user_schemas.UserResponse)
+@db_endpoint
 def top_up_balance(user_id: int, request: TopUpBalanceRequest, db: Session = Depends(database.get_db)):
     """Пополнить баланс пользователя"""
     user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -65,15 +70,13 @@ def top_up_balance(user_id: int, request: TopUpBalanceRequest, db: Session = Dep
     if request.amount <= 0:
         raise HTTPException(status_code=400, detail="Сумма пополнения должна быть больше 0")
 
-    # Обновляем баланс
-    user.balance += request.amount
-
-    # Создаем транзакцию
+    # Баланс пополняется записью в журнале транзакций
     transaction = models.Transaction(
         user_id=user_id,
         booking_id=None,
         transaction_type="deposit",
         amount=request.amount,
+        balance_delta=request.amount,
         description=f"Пополнение баланса на {request.amount:.2f} ₽",
         status="completed"
     )
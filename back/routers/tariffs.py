@@ -1,21 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas import tariff as tariff_schemas
+from services.cache import reference_cache
+from services.versions import collection_versions, not_modified
 from typing import List
 
 router = APIRouter(prefix="/tariffs", tags=["Тарифы"])
 
+
+def load_tariffs(db: Session) -> List[dict]:
+    """Все тарифы из кэша справочников (при промахе - из БД)"""
+    return reference_cache.get_or_set(
+        collection_versions.cache_key(db, "tariffs", "tariffs:all"),
+        lambda: [tariff_schemas.TariffResponse.model_validate(t).model_dump() for t in db.query(models.Tariff).all()],
+        tags=("tariffs",)
+    )
+
 @router.get("/", response_model=List[tariff_schemas.TariffResponse])
-def get_all_tariffs(db: Session = Depends(database.get_db)):
+def get_all_tariffs(request: Request, response: Response, db: Session = Depends(database.get_db)):
     """Получить все доступные тарифы"""
-    tariffs = db.query(models.Tariff).all()
-    return tariffs
+    cached = not_modified(db, request, response, "tariffs")
+    if cached:
+        return cached
+
+    return load_tariffs(db)
 
 @router.get("/{tariff_id}", response_model=tariff_schemas.TariffResponse)
-def get_tariff(tariff_id: int, db: Session = Depends(database.get_db)):
+def get_tariff(tariff_id: int, request: Request, response: Response, db: Session = Depends(database.get_db)):
     """Получить информацию о тарифе"""
-    tariff = db.query(models.Tariff).filter(models.Tariff.id == tariff_id).first()
+    cached = not_modified(db, request, response, "tariffs")
+    if cached:
+        return cached
+
+    tariff = next((t for t in load_tariffs(db) if t["id"] == tariff_id), None)
 
     if not tariff:
         raise HTTPException(status_code=404, detail="Тариф не найден")
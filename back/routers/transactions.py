@@ -1,18 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from db import models, database
+from db.async_database import db_endpoint
 from schemas import transaction as transaction_schemas
-from typing import List
+from services.list_query import filter_range
+from services.user_history import monthly_summary, transactions_history
+from datetime import date
+from typing import List, Optional
 
 router = APIRouter(prefix="/transactions", tags=["Транзакции клиента"])
 
 @router.get("/user/{user_id}", response_model=List[transaction_schemas.TransactionResponse])
-def get_user_transactions(user_id: int, db: Session = Depends(database.get_db)):
-    """Получить все транзакции пользователя"""
-    transactions = db.query(models.Transaction).filter(models.Transaction.user_id == user_id).all()
-    return transactions
+@db_endpoint
+def get_user_transactions(
+    user_id: int,
+    response: Response,
+    date_from: Optional[date] = Query(None, alias="from", description="Созданные не раньше даты"),
+    date_to: Optional[date] = Query(None, alias="to", description="Созданные не позже даты (включительно)"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Размер страницы (без параметра - вся история)"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
+    db: Session = Depends(database.get_db)
+):
+    """Получить транзакции пользователя, новые первыми"""
+    query = db.query(models.Transaction).filter(models.Transaction.user_id == user_id)
+    query = filter_range(query, models.Transaction.created_at, date_from, date_to)
+    return transactions_history.page(db, query, response, sort="-created_at", limit=limit, cursor=cursor)
+
+@router.get("/user/{user_id}/summary", response_model=List[transaction_schemas.MonthlySummary])
+@db_endpoint
+def get_user_summary(
+    user_id: int,
+    date_from: Optional[date] = Query(None, alias="from", description="С даты"),
+    date_to: Optional[date] = Query(None, alias="to", description="По дату включительно"),
+    db: Session = Depends(database.get_db)
+):
+    """Итоги пользователя по месяцам: поездки (по началу) и транзакции (по созданию)"""
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="Начало периода позже конца")
+    return monthly_summary(db, user_id, date_from, date_to)
 
 @router.post("/", response_model=transaction_schemas.TransactionResponse)
+@db_endpoint
 def create_transaction(user_id: int, transaction_data: transaction_schemas.TransactionCreate, db: Session = Depends(database.get_db)):
     """Создать новую транзакцию"""
     user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -23,15 +51,12 @@ def create_transaction(user_id: int, transaction_data: transaction_schemas.Trans
     if transaction_data.amount <= 0:
         raise HTTPException(status_code=400, detail="Сумма должна быть положительной")
 
-    # Обновление баланса для депозита
-    if transaction_data.transaction_type == "deposit":
-        user.balance += transaction_data.amount
-
-    # Создание транзакции
+    # Создание транзакции; баланс меняет только депозит
     transaction = models.Transaction(
         user_id=user_id,
         transaction_type=transaction_data.transaction_type,
         amount=transaction_data.amount,
+        balance_delta=transaction_data.amount if transaction_data.transaction_type == "deposit" else 0.0,
         description=transaction_data.description,
         booking_id=transaction_data.booking_id,
         status="completed"
@@ -44,6 +69,7 @@ def create_transaction(user_id: int, transaction_data: transaction_schemas.Trans
     return transaction
 
 @router.post("/deposit", response_model=transaction_schemas.TransactionResponse)
+@db_endpoint
 def deposit_balance(user_id: int, amount: float, description: str = "Пополнение баланса", db: Session = Depends(database.get_db)):
     """Пополнить баланс пользователя (устаревший метод, используйте POST /)"""
     user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -54,14 +80,12 @@ def deposit_balance(user_id: int, amount: float, description: str = "Попол
     if amount <= 0:
         raise HTTPException(status_code=400, detail="Сумма должна быть положительной")
 
-    # Пополнение баланса
-    user.balance += amount
-
-    # Создание транзакции
+    # Пополнение баланса - запись в журнале
     transaction = models.Transaction(
         user_id=user_id,
         transaction_type="deposit",
         amount=amount,
+        balance_delta=amount,
         description=description,
         status="completed"
     )
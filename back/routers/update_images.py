@@ -1,23 +1,29 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from db import models, database
+from services.vehicle_index import vehicle_index
+from services.versions import collection_versions
 
 router = APIRouter(tags=["Утилиты"])
 
-@router.post("/admin/update-car-images")
-def update_car_images(db: Session = Depends(database.get_db)):
-    """Обновить все картинки автомобилей"""
-
-    car_image_url = "/car.png"
+CAR_IMAGE_URL = "/car.png"
 
-    vehicles = db.query(models.Vehicle).all()
-    updated_count = 0
-
-    for vehicle in vehicles:
-        vehicle.image_url = car_image_url
-        updated_count += 1
 
+def set_all_car_images(db: Session) -> int:
+    """Один UPDATE по всей таблице вместо загрузки каждой машины в сессию"""
+    updated_count = db.query(models.Vehicle).update(
+        {models.Vehicle.image_url: CAR_IMAGE_URL},
+        synchronize_session=False
+    )
+    collection_versions.bump(db, "vehicles")
     db.commit()
+    vehicle_index.invalidate()
+    return updated_count
+
+@router.post("/admin/update-car-images")
+def update_car_images(db: Session = Depends(database.get_db)):
+    """Обновить все картинки автомобилей"""
+    updated_count = set_all_car_images(db)
 
     return {
         "message": f"Обновлено {updated_count} автомобилей",
@@ -27,17 +33,7 @@ def update_car_images(db: Session = Depends(database.get_db)):
 @router.get("/update-images")
 def update_car_images_public(db: Session = Depends(database.get_db)):
     """Публичный эндпоинт для обновления картинок"""
-
-    car_image_url = "/car.png"
-
-    vehicles = db.query(models.Vehicle).all()
-    updated_count = 0
-
-    for vehicle in vehicles:
-        vehicle.image_url = car_image_url
-        updated_count += 1
-
-    db.commit()
+    updated_count = set_all_car_images(db)
 
     return {
         "message": f"Обновлено {updated_count} автомобилей",
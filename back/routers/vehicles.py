@@ -1,21 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+import math
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas import vehicle as vehicle_schemas
+from services.availability import OPEN_END, availability_index
+from services.geo_index import METERS_PER_DEGREE, haversine_m
+from services.vehicle_index import vehicle_index
+from services.versions import not_modified
 from typing import List, Optional
 
+# Обработчики каталога - обычные def и в режиме DB_MODE=async (без db_endpoint):
+# поиск и перестроение индексов в памяти берут блокировки и занимают CPU,
+# и это должно идти в пуле потоков, а не в цикле событий
 router = APIRouter(prefix="/vehicles", tags=["Автомобили для клиентов"])
 
-@router.get("/", response_model=List[vehicle_schemas.VehicleResponse])
-def get_available_vehicles(
-    vehicle_type: Optional[str] = Query(None, description="Фильтр по типу: sedan, suv, electric, hybrid"),
-    tariff_id: Optional[int] = Query(None, description="Фильтр по тарифу"),
-    parking_zone_id: Optional[int] = Query(None, description="Фильтр по парковочной зоне"),
-    brand: Optional[str] = Query(None, description="Фильтр по марке"),
-    status: Optional[str] = Query("available", description="Фильтр по статусу"),
-    db: Session = Depends(database.get_db)
+# Размер пачки строк, которую курсор БД отдает за один раз в потоковом режиме
+STREAM_BATCH_SIZE = 500
+
+
+def escape_like(value: str) -> str:
+    """Экранировать % и _ пользовательского ввода для LIKE ... ESCAPE '\\'"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_vehicles_query(
+    db: Session,
+    status: Optional[str] = None,
+    vehicle_type: Optional[str] = None,
+    tariff_id: Optional[int] = None,
+    parking_zone_id: Optional[int] = None,
+    brand: Optional[str] = None,
+    after: Optional[int] = None
 ):
-    """Получить список автомобилей с фильтрацией"""
+    """Запрос автомобилей с фильтрами, отсортированный по id (стабильный порядок для курсора)"""
     query = db.query(models.Vehicle)
 
     # Применяем фильтры
@@ -28,17 +48,298 @@ def get_available_vehicles(
     if parking_zone_id:
         query = query.filter(models.Vehicle.parking_zone_id == parking_zone_id)
     if brand:
-        query = query.filter(models.Vehicle.brand.ilike(f"%{brand}%"))
+        query = query.filter(models.Vehicle.brand.ilike(f"%{escape_like(brand)}%", escape="\\"))
+
+    # Keyset-пагинация: продолжаем строго после последнего отданного id
+    if after is not None:
+        query = query.filter(models.Vehicle.id > after)
+
+    return query.order_by(models.Vehicle.id)
+
+
+def stream_index_ndjson(rows: List[dict]):
+    """Генератор NDJSON по строкам из индекса в памяти"""
+    for row in rows:
+        yield vehicle_schemas.VehicleResponse(**row).model_dump_json() + "\n"
+
+
+def stream_vehicles_ndjson(filters: dict, limit: Optional[int]):
+    """Генератор NDJSON: по строке JSON на автомобиль, прямо из курсора БД"""
+    # Сессия из Depends закрывается до начала отправки ответа,
+    # поэтому для потока открываем собственную
+    db = database.SessionLocal()
+    try:
+        query = build_vehicles_query(db, **filters)
+        if limit is not None:
+            query = query.limit(limit)
+
+        for vehicle in query.yield_per(STREAM_BATCH_SIZE):
+            row = vehicle_schemas.VehicleResponse.model_validate(vehicle)
+            yield row.model_dump_json() + "\n"
+    finally:
+        db.close()
+
+
+@router.get("/", response_model=List[vehicle_schemas.VehicleResponse])
+def get_available_vehicles(
+    request: Request,
+    response: Response,
+    vehicle_type: Optional[str] = Query(None, description="Фильтр по типу: sedan, suv, electric, hybrid"),
+    tariff_id: Optional[int] = Query(None, description="Фильтр по тарифу"),
+    parking_zone_id: Optional[int] = Query(None, description="Фильтр по парковочной зоне"),
+    brand: Optional[str] = Query(None, description="Фильтр по марке"),
+    status: Optional[str] = Query("available", description="Фильтр по статусу"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Размер страницы (без параметра - весь список)"),
+    after: Optional[int] = Query(None, ge=0, description="Курсор: id последнего автомобиля предыдущей страницы"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="Формат ответа: json или ndjson (потоковый)"),
+    db: Session = Depends(database.get_db)
+):
+    """Получить список автомобилей с фильтрацией и курсорной пагинацией.
+
+    Следующая страница запрашивается с after = значению заголовка X-Next-Cursor.
+    Если заголовка нет - страница последняя.
+    """
+    cached = not_modified(db, request, response, "vehicles")
+    if cached:
+        return cached
+
+    filters = {
+        "status": status,
+        "vehicle_type": vehicle_type,
+        "tariff_id": tariff_id,
+        "parking_zone_id": parking_zone_id,
+        "brand": brand,
+        "after": after
+    }
+
+    # Быстрый путь: ответ из индекса в памяти без обращения к SQL
+    if vehicle_index.enabled:
+        vehicle_index.ensure_loaded(db)
+        vehicles, next_cursor = vehicle_index.query(limit=limit, **filters)
+
+        if format == "ndjson":
+            return StreamingResponse(
+                stream_index_ndjson(vehicles),
+                media_type="application/x-ndjson",
+                headers=dict(response.headers)
+            )
+
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = str(next_cursor)
+        return vehicles
+
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_vehicles_ndjson(filters, limit),
+            media_type="application/x-ndjson",
+            headers=dict(response.headers)
+        )
+
+    query = build_vehicles_query(db, **filters)
+
+    if limit is None:
+        return query.all()
+
+    # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+    vehicles = query.limit(limit + 1).all()
+    if len(vehicles) > limit:
+        vehicles = vehicles[:limit]
+        response.headers["X-Next-Cursor"] = str(vehicles[-1].id)
 
-    vehicles = query.all()
     return vehicles
 
+@router.get("/search", response_model=vehicle_schemas.VehicleSearchResponse)
+def search_vehicles(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=100, description="Марка и/или модель, можно начало слова"),
+    status: Optional[str] = Query("available", description="Фильтр по статусу"),
+    limit: int = Query(20, ge=1, le=100, description="Максимум автомобилей в ответе"),
+    db: Session = Depends(database.get_db)
+):
+    """Поиск автомобилей по марке/модели с ранжированием и подсказками для автодополнения"""
+    cached = not_modified(db, request, response, "vehicles")
+    if cached:
+        return cached
+
+    if vehicle_index.enabled:
+        vehicle_index.ensure_loaded(db)
+        search = vehicle_index.search
+        # Фильтр по статусу применяется внутри индекса: каждая пара в выдаче
+        # содержит хотя бы одну подходящую машину, поэтому limit пар дают
+        # не меньше limit машин, если столько вообще найдется
+        found = vehicle_index.find(q, limit=limit, status=status)
+
+        matches = []
+        vehicles = []
+        for match in found:
+            rows = [vehicle_index.get(vehicle_id) for vehicle_id in match["ids"]]
+            rows = [row for row in rows if row]
+            if not rows:
+                continue
+            matches.append(vehicle_schemas.VehicleSearchMatch(
+                brand=match["brand"],
+                model=match["model"],
+                score=match["score"],
+                vehicles_count=len(rows)
+            ))
+            vehicles.extend(rows[:limit - len(vehicles)])
+
+        return vehicle_schemas.VehicleSearchResponse(
+            query=q,
+            suggestions=search.suggest(q),
+            matches=matches,
+            vehicles=vehicles
+        )
+
+    # Запасной путь без индекса: поиск по префиксу. ILIKE читает таблицу целиком:
+    # ix_vehicle_brand_model обычный, а для индексного поиска без учета регистра
+    # нужен индекс по lower() (text_pattern_ops на PostgreSQL, NOCASE на SQLite)
+    pattern = f"{escape_like(q.strip())}%"
+    query = build_vehicles_query(db, status=status).filter(
+        or_(models.Vehicle.brand.ilike(pattern, escape="\\"), models.Vehicle.model.ilike(pattern, escape="\\"))
+    )
+    vehicles = query.limit(limit).all()
+
+    counts = {}
+    for vehicle in vehicles:
+        counts[(vehicle.brand, vehicle.model)] = counts.get((vehicle.brand, vehicle.model), 0) + 1
+
+    return vehicle_schemas.VehicleSearchResponse(
+        query=q,
+        suggestions=sorted({f"{brand} {model}" for brand, model in counts}),
+        matches=[
+            vehicle_schemas.VehicleSearchMatch(brand=brand, model=model, score=1.0, vehicles_count=count)
+            for (brand, model), count in counts.items()
+        ],
+        vehicles=vehicles
+    )
+
+@router.get("/nearby", response_model=List[vehicle_schemas.VehicleNearbyResponse])
+def get_nearby_vehicles(
+    lat: float = Query(..., ge=-90, le=90, description="Широта клиента"),
+    lon: float = Query(..., ge=-180, le=180, description="Долгота клиента"),
+    radius: float = Query(3000, gt=0, le=50000, description="Радиус поиска в метрах"),
+    limit: int = Query(20, ge=1, le=100, description="Сколько ближайших автомобилей вернуть"),
+    vehicle_type: Optional[str] = Query(None, description="Фильтр по типу: sedan, suv, electric, hybrid"),
+    tariff_id: Optional[int] = Query(None, description="Фильтр по тарифу"),
+    parking_zone_id: Optional[int] = Query(None, description="Фильтр по парковочной зоне"),
+    brand: Optional[str] = Query(None, description="Фильтр по марке"),
+    status: Optional[str] = Query("available", description="Фильтр по статусу"),
+    db: Session = Depends(database.get_db)
+):
+    """Ближайшие автомобили в радиусе, отсортированные по расстоянию"""
+    filters = {
+        "status": status,
+        "vehicle_type": vehicle_type,
+        "tariff_id": tariff_id,
+        "parking_zone_id": parking_zone_id,
+        "brand": brand
+    }
+
+    if vehicle_index.enabled:
+        vehicle_index.ensure_loaded(db)
+        found = vehicle_index.nearby(lat, lon, radius, limit, **filters)
+        return [{**row, "distance_m": round(distance, 1)} for row, distance in found]
+
+    # Запасной путь без индекса: ограничивающий прямоугольник в SQL, точное расстояние в Python
+    d_lat = radius / METERS_PER_DEGREE
+    d_lon = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    latitude = func.coalesce(models.Vehicle.latitude, models.ParkingZone.latitude)
+    longitude = func.coalesce(models.Vehicle.longitude, models.ParkingZone.longitude)
+
+    rows = build_vehicles_query(db, **filters).outerjoin(
+        models.ParkingZone, models.Vehicle.parking_zone_id == models.ParkingZone.id
+    ).add_columns(latitude, longitude).filter(
+        latitude.between(lat - d_lat, lat + d_lat),
+        longitude.between(lon - d_lon, lon + d_lon)
+    ).all()
+
+    found = []
+    for vehicle, vehicle_lat, vehicle_lon in rows:
+        distance = haversine_m(lat, lon, vehicle_lat, vehicle_lon)
+        if distance <= radius:
+            found.append((distance, vehicle.id, vehicle))
+    found.sort(key=lambda item: (item[0], item[1]))
+
+    return [
+        {
+            **vehicle_schemas.VehicleResponse.model_validate(vehicle).model_dump(),
+            "distance_m": round(distance, 1)
+        }
+        for distance, _, vehicle in found[:limit]
+    ]
+
 @router.get("/{vehicle_id}", response_model=vehicle_schemas.VehicleResponse)
-def get_vehicle(vehicle_id: int, db: Session = Depends(database.get_db)):
+def get_vehicle(vehicle_id: int, request: Request, response: Response, db: Session = Depends(database.get_db)):
     """Получить информацию об автомобиле"""
+    cached = not_modified(db, request, response, "vehicles")
+    if cached:
+        return cached
+
+    if vehicle_index.enabled:
+        vehicle_index.ensure_loaded(db)
+        vehicle = vehicle_index.get(vehicle_id)
+        if not vehicle:
+            raise HTTPException(status_code=404, detail="Автомобиль не найден")
+        return vehicle
+
     vehicle = db.query(models.Vehicle).filter(models.Vehicle.id == vehicle_id).first()
 
     if not vehicle:
         raise HTTPException(status_code=404, detail="Автомобиль не найден")
 
     return vehicle
+
+@router.get("/{vehicle_id}/availability", response_model=vehicle_schemas.VehicleAvailabilityResponse)
+def get_vehicle_availability(
+    vehicle_id: int,
+    request: Request,
+    response: Response,
+    date_from: Optional[date] = Query(None, alias="from", description="Начало периода (по умолчанию сегодня)"),
+    date_to: Optional[date] = Query(None, alias="to", description="Конец периода включительно (по умолчанию +30 дней)"),
+    db: Session = Depends(database.get_db)
+):
+    """Календарь занятости автомобиля: занятые и свободные интервалы за период"""
+    cached = not_modified(db, request, response, "vehicles", "bookings")
+    if cached:
+        return cached
+
+    date_from = date_from or date.today()
+    date_to = date_to or date_from + timedelta(days=30)
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="Дата окончания должна быть не раньше даты начала")
+    if (date_to - date_from).days > 366:
+        raise HTTPException(status_code=400, detail="Период не может быть больше года")
+
+    if vehicle_index.enabled:
+        vehicle_index.ensure_loaded(db)
+        exists = vehicle_index.get(vehicle_id) is not None
+    else:
+        exists = db.query(models.Vehicle.id).filter(models.Vehicle.id == vehicle_id).first() is not None
+    if not exists:
+        raise HTTPException(status_code=404, detail="Автомобиль не найден")
+
+    period_start = datetime.combine(date_from, datetime.min.time())
+    period_end = datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+
+    availability_index.ensure_loaded(db)
+    busy = availability_index.busy(vehicle_id, period_start, period_end)
+
+    # Свободные окна - промежутки между занятыми интервалами внутри периода
+    free = []
+    cursor = period_start
+    for start, end, _ in busy:
+        if start > cursor:
+            free.append({"start_time": cursor, "end_time": start})
+        cursor = max(cursor, end)
+    if cursor < period_end:
+        free.append({"start_time": cursor, "end_time": period_end})
+
+    return vehicle_schemas.VehicleAvailabilityResponse(
+        vehicle_id=vehicle_id,
+        date_from=date_from,
+        date_to=date_to,
+        busy=[{"start_time": start, "end_time": None if end == OPEN_END else end} for start, end, _ in busy],
+        free=free
+    )
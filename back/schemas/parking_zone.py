@@ -5,17 +5,23 @@ class ParkingZoneCreate(BaseModel):
     name: str
     address: str
     capacity: int = 10
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 class ParkingZoneUpdate(BaseModel):
     name: Optional[str] = None
     address: Optional[str] = None
     capacity: Optional[int] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 class ParkingZoneResponse(BaseModel):
     id: int
     name: str
     address: str
     capacity: int
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
     class Config:
         from_attributes = True
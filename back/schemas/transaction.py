@@ -20,3 +20,12 @@ class TransactionResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+class MonthlySummary(BaseModel):
+    month: str  # YYYY-MM
+    trips: int
+    trip_hours: float
+    trip_cost: float
+    transactions: int
+    deposits: float
+    payments: float
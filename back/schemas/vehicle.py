@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional
+from datetime import date, datetime
+from typing import List, Optional
 
 class VehicleCreate(BaseModel):
     license_plate: str
@@ -12,6 +13,8 @@ class VehicleCreate(BaseModel):
     description: Optional[str] = None
     parking_zone_id: Optional[int] = None
     tariff_id: Optional[int] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 class VehicleUpdate(BaseModel):
     brand: Optional[str] = None
@@ -24,6 +27,8 @@ class VehicleUpdate(BaseModel):
     status: Optional[str] = None
     parking_zone_id: Optional[int] = None
     tariff_id: Optional[int] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 class VehicleResponse(BaseModel):
     id: int
@@ -38,6 +43,82 @@ class VehicleResponse(BaseModel):
     status: str
     parking_zone_id: Optional[int]
     tariff_id: Optional[int]
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
     class Config:
         from_attributes = True
+
+class VehicleSearchMatch(BaseModel):
+    brand: str
+    model: str
+    score: float
+    vehicles_count: int
+
+class VehicleSearchResponse(BaseModel):
+    query: str
+    suggestions: List[str]
+    matches: List[VehicleSearchMatch]
+    vehicles: List[VehicleResponse]
+
+class VehicleNearbyResponse(VehicleResponse):
+    distance_m: float
+
+class VehicleImportError(BaseModel):
+    row: int
+    license_plate: Optional[str] = None
+    error: str
+
+class VehicleImportReport(BaseModel):
+    total_rows: int
+    imported: int
+    failed: int
+    errors: List[VehicleImportError]
+    errors_truncated: bool
+    elapsed_seconds: float
+
+class VehicleBulkFilter(BaseModel):
+    ids: Optional[List[int]] = None
+    parking_zone_id: Optional[int] = None
+    tariff_id: Optional[int] = None
+    vehicle_type: Optional[str] = None
+    status: Optional[str] = None
+    all: bool = False  # Явное согласие на изменение всего автопарка
+
+class VehicleBulkPatch(BaseModel):
+    """Поля, которые имеет смысл задать сразу группе автомобилей.
+
+    Номер, марка, модель, год и координаты у каждой машины свои и
+    меняются только через PATCH /admin/vehicles/{id}.
+    """
+    vehicle_type: Optional[str] = None
+    color: Optional[str] = None
+    image_url: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[str] = None
+    parking_zone_id: Optional[int] = None
+    tariff_id: Optional[int] = None
+
+    class Config:
+        extra = "forbid"
+
+class VehicleBulkUpdateRequest(BaseModel):
+    filter: VehicleBulkFilter
+    patch: VehicleBulkPatch
+    dry_run: bool = False
+
+class VehicleBulkUpdateResponse(BaseModel):
+    matched: int
+    updated: int
+    dry_run: bool
+
+class AvailabilityInterval(BaseModel):
+    start_time: datetime
+    end_time: Optional[datetime]  # None - без даты окончания
+
+class VehicleAvailabilityResponse(BaseModel):
+    vehicle_id: int
+    date_from: date
+    date_to: date
+    busy: List[AvailabilityInterval]
+    free: List[AvailabilityInterval]
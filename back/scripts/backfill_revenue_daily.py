@@ -0,0 +1,64 @@
+"""
+Пересчет сводки выручки revenue_daily по завершенным бронированиям.
+
+Нужен после ручных правок бронирований в БД или для восстановления
+сводки. Период пересчитывается кусками по --chunk-days дней, каждый
+кусок - отдельная транзакция.
+
+    python scripts/backfill_revenue_daily.py                       # вся история
+    python scripts/backfill_revenue_daily.py --from 2025-01-01 --to 2025-03-31
+"""
+import argparse
+import os
+import sys
+from datetime import date, timedelta
+
+# Добавляем родительскую директорию в путь для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func
+
+from db import models
+from db.database import SessionLocal, engine
+from services import revenue_rollup
+
+
+def backfill(date_from: date = None, date_to: date = None, chunk_days: int = 31):
+    models.RevenueDaily.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        if date_from is None or date_to is None:
+            first, last = db.query(func.min(models.Booking.end_time), func.max(models.Booking.end_time)).filter(
+                models.Booking.status == "completed"
+            ).one()
+            if first is None:
+                print("Завершенных бронирований нет")
+                return
+            date_from = date_from or revenue_rollup.as_date(first)
+            date_to = date_to or revenue_rollup.as_date(last)
+
+        inserted = 0
+        start = date_from
+        while start <= date_to:
+            end = min(start + timedelta(days=chunk_days - 1), date_to)
+            result = revenue_rollup.rebuild(db, start, end)
+            inserted += result["inserted"]
+            print(f"{start} - {end}: строк сводки {result['inserted']} (удалено {result['deleted']})")
+            start = end + timedelta(days=1)
+
+        print(f"✅ Сводка пересчитана: {date_from} - {date_to}, строк {inserted}")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пересчет сводки revenue_daily")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="Начало периода (по умолчанию - первое бронирование)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="Конец периода включительно")
+    parser.add_argument("--chunk-days", type=int, default=31)
+    args = parser.parse_args()
+    backfill(args.date_from, args.date_to, args.chunk_days)
+
+
+if __name__ == "__main__":
+    main()
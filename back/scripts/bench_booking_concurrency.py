@@ -0,0 +1,155 @@
+"""
+Нагрузочный тест создания бронирований: много параллельных запросов на одну машину.
+
+Сценарий vehicle: N пользователей одновременно бронируют один автомобиль
+на одни и те же даты - успешным должно быть ровно одно бронирование.
+Сценарий balance: один пользователь с деньгами ровно на K бронирований
+одновременно бронирует N разных машин - успешных ровно K, баланс >= 0.
+
+По умолчанию запросы идут в приложение в том же процессе (TestClient),
+с --url - в запущенный сервер (база должна быть та же, DATABASE_URL).
+
+    python scripts/bench_booking_concurrency.py --requests 300 --workers 32
+    python scripts/bench_booking_concurrency.py --scenario balance --url http://localhost:8000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+# Добавляем родительскую директорию в путь для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import models
+from db.database import SessionLocal
+from services import pricing
+
+
+def create_users(db, count: int, balance: float):
+    run_id = uuid.uuid4().hex[:8]
+    users = [
+        models.User(
+            first_name="Bench",
+            last_name=f"User{i}",
+            email=f"bench-{run_id}-{i}@example.com",
+            phone=f"+7bench{run_id}{i}",
+            password="bench",
+            opening_balance=balance
+        )
+        for i in range(count)
+    ]
+    db.add_all(users)
+    db.commit()
+    return [user.id for user in users]
+
+
+def make_sender(url):
+    if url is None:
+        from fastapi.testclient import TestClient
+        import main
+
+        client = TestClient(main.app)
+
+        def send(path, payload):
+            return client.post(path, json=payload).status_code
+        return send
+
+    def send(path, payload):
+        request = urllib.request.Request(
+            url.rstrip("/") + path,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    return send
+
+
+def run(args):
+    # В режиме без --url импорт main создает схему и начальные данные
+    send = make_sender(args.url)
+
+    db = SessionLocal()
+    try:
+        tariff_id = args.tariff_id or db.query(models.Tariff.id).order_by(models.Tariff.id).first()[0]
+        price = pricing.get_tariff_prices(db)[tariff_id]["price_per_day"]
+        # Даты в будущем и без пересечения с прошлыми прогонами
+        start = date.today() + timedelta(days=args.offset_days)
+        end = start + timedelta(days=1)
+        cost = pricing.total_cost(price, 1)
+
+        vehicles = db.query(models.Vehicle.id).filter(models.Vehicle.status == "available").order_by(models.Vehicle.id)
+        if args.scenario == "vehicle":
+            vehicle_ids = [vehicles.first()[0]] * args.requests
+            user_ids = create_users(db, args.requests, balance=cost * 10)
+            expected = 1
+        else:
+            vehicle_ids = [row[0] for row in vehicles.limit(args.requests).all()]
+            expected = min(args.affordable, len(vehicle_ids))
+            user_ids = create_users(db, 1, balance=cost * args.affordable) * len(vehicle_ids)
+    finally:
+        db.close()
+
+    jobs = [
+        (f"/bookings/?user_id={user_id}", {
+            "vehicle_id": vehicle_id,
+            "tariff_id": tariff_id,
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat()
+        })
+        for user_id, vehicle_id in zip(user_ids, vehicle_ids)
+    ]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        statuses = Counter(pool.map(lambda job: send(*job), jobs))
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    try:
+        min_balance = db.query(models.User.balance).filter(models.User.id.in_(set(user_ids))).order_by(models.User.balance).first()[0]
+        if args.scenario == "vehicle":
+            booked = db.query(models.Booking).filter(
+                models.Booking.vehicle_id == vehicle_ids[0],
+                models.Booking.start_time >= start,
+                models.Booking.start_time < end
+            ).count()
+        else:
+            booked = db.query(models.Booking).filter(models.Booking.user_id == user_ids[0]).count()
+    finally:
+        db.close()
+
+    print(f"Сценарий: {args.scenario}, запросов: {len(jobs)}, потоков: {args.workers}")
+    print(f"Время: {elapsed:.2f} с, пропускная способность: {len(jobs) / elapsed:.1f} запр/с")
+    print(f"Ответы: {dict(sorted(statuses.items()))}")
+    print(f"Конфликтов (400): {statuses.get(400, 0)}")
+    print(f"Создано бронирований: {booked}, ожидалось: {expected}")
+    print(f"Минимальный баланс участников: {min_balance:.2f} ₽")
+
+    ok = booked == expected and min_balance >= 0
+    print("✅ Инварианты соблюдены" if ok else "❌ Нарушены инварианты")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Параллельное создание бронирований")
+    parser.add_argument("--scenario", choices=("vehicle", "balance"), default="vehicle")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--affordable", type=int, default=3, help="balance: на сколько бронирований хватает денег")
+    parser.add_argument("--tariff-id", type=int, default=None)
+    parser.add_argument("--offset-days", type=int, default=int(time.time()) % 3000 + 400,
+                        help="Через сколько дней начинается бронирование")
+    parser.add_argument("--url", default=None, help="Адрес запущенного API; по умолчанию - приложение в процессе")
+    sys.exit(run(parser.parse_args()))
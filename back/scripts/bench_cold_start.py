@@ -0,0 +1,64 @@
+"""
+Холодный старт воркера API: время импорта main (создание приложения и
+все, что выполняется при импорте) в отдельном процессе.
+
+Первый запуск готовит БД (схема и начальные данные), затем main
+импортируется --runs раз в новых процессах. Выводятся медиана, минимум
+и максимум.
+
+    python scripts/bench_cold_start.py --runs 20
+    DATABASE_URL=postgresql://... python scripts/bench_cold_start.py
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Время только импорта main, без запуска интерпретатора
+MEASURE = (
+    "import time; started = time.perf_counter(); import main; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def import_main(env: dict) -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE], cwd=BACK_DIR, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время холодного старта воркера API")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    temp_dir = None
+    if "DATABASE_URL" not in env:
+        temp_dir = tempfile.TemporaryDirectory()
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(temp_dir.name, 'cold_start.db')}"
+
+    try:
+        started = time.perf_counter()
+        import_main(env)
+        print(f"Подготовка БД (первый запуск): {time.perf_counter() - started:.2f} с")
+
+        timings = [import_main(env) for _ in range(args.runs)]
+        print(
+            f"Импорт main, {args.runs} запусков: медиана {statistics.median(timings) * 1000:.0f} мс, "
+            f"мин {min(timings) * 1000:.0f} мс, макс {max(timings) * 1000:.0f} мс"
+        )
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
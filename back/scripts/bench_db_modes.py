@@ -0,0 +1,113 @@
+"""
+Сравнение режимов БД: синхронные обработчики (DB_MODE=sync) и async (DB_MODE=async).
+
+Для каждого режима поднимается uvicorn на отдельном порту с той же
+базой, затем N запросов с заданной параллельностью идут по смеси
+эндпоинтов, читающих БД. Выводятся p50/p99 задержки и запросов в секунду.
+
+    python scripts/bench_db_modes.py --requests 3000 --concurrency 64
+    python scripts/bench_db_modes.py --modes async --path /transactions/user/1
+"""
+import argparse
+import http.client
+import itertools
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_PATHS = (
+    "/profile/1",
+    "/bookings/user/1",
+    "/transactions/user/1",
+    "/profile/1/balance",
+)
+
+
+def start_server(mode: str, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, DB_MODE=mode)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACK_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/health")
+            if connection.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"Сервер {mode} не запустился")
+
+
+def run_load(port: int, paths, requests: int, concurrency: int):
+    local = threading.local()
+    counter = itertools.count()
+
+    def call(_):
+        # Одно keep-alive соединение на поток, как у реального клиента
+        connection = getattr(local, "connection", None)
+        if connection is None:
+            connection = local.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        path = paths[next(counter) % len(paths)]
+        started = time.perf_counter()
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        return time.perf_counter() - started, response.status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status >= 500)
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "errors": errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение DB_MODE=sync и DB_MODE=async")
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"], choices=("sync", "async"))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1, help="Процессов uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", action="append", dest="paths", help="Эндпоинт (можно несколько)")
+    args = parser.parse_args()
+    paths = args.paths or list(DEFAULT_PATHS)
+
+    print(f"Запросов: {args.requests}, параллельно: {args.concurrency}, эндпоинты: {', '.join(paths)}")
+    print(f"{'режим':<8}{'запр/с':>10}{'p50, мс':>10}{'p99, мс':>10}{'5xx':>6}")
+    for offset, mode in enumerate(args.modes):
+        port = args.port + offset
+        server = start_server(mode, port, args.workers)
+        try:
+            run_load(port, paths, args.warmup, args.concurrency)
+            result = run_load(port, paths, args.requests, args.concurrency)
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{mode:<8}{result['rps']:>10.1f}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Смешанная нагрузка чтение/запись на SQLite: стандартные настройки против SQLITE_PROFILE=performance.
+
+Для каждого профиля создается свежая БД во временной папке с N
+бронированиями. Затем потоки-читатели выбирают бронирования
+пользователя, а потоки-писатели создают бронирования и меняют баланс
+в транзакциях. Выводятся операции в секунду и число ошибок
+"database is locked".
+
+    python scripts/bench_sqlite_profile.py --seconds 10 --readers 8 --writers 4
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Добавляем родительскую директорию в путь для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from db import models
+from db.database import Base, install_sqlite_profile, sqlite_maintenance
+
+
+def make_engine(path: str, profile: str, pool_size: int):
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=0
+    )
+    if profile == "performance":
+        install_sqlite_profile(engine)
+    return engine
+
+
+def seed(Session, users: int, bookings: int):
+    db = Session()
+    try:
+        db.add_all([
+            models.User(first_name="U", last_name=str(i), email=f"u{i}@bench", phone=f"+7{i:010d}", password="x", opening_balance=1e9)
+            for i in range(users)
+        ])
+        db.add(models.Tariff(name="bench", price_per_minute=1.0))
+        db.flush()
+        start = datetime(2025, 1, 1)
+        db.bulk_insert_mappings(models.Booking, [
+            {
+                "user_id": random.randint(1, users),
+                "vehicle_id": 1,
+                "tariff_id": 1,
+                "start_time": start + timedelta(hours=i),
+                "end_time": start + timedelta(hours=i + 1),
+                "total_cost": 100.0,
+                "status": "completed"
+            }
+            for i in range(bookings)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_profile(profile: str, args) -> dict:
+    directory = tempfile.mkdtemp(prefix=f"bench-sqlite-{profile}-")
+    path = os.path.join(directory, "bench.db")
+    engine = make_engine(path, profile, args.readers + args.writers)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    seed(Session, args.users, args.bookings)
+
+    counters = {"reads": 0, "writes": 0, "locked": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def count(name):
+        with lock:
+            counters[name] += 1
+
+    def reader():
+        db = Session()
+        while not stop.is_set():
+            try:
+                db.query(models.Booking).filter(
+                    models.Booking.user_id == random.randint(1, args.users)
+                ).order_by(models.Booking.start_time.desc()).limit(20).all()
+                db.rollback()
+                count("reads")
+            except exc.OperationalError as e:
+                db.rollback()
+                count("locked" if "locked" in str(e) else "errors")
+        db.close()
+
+    def writer():
+        db = Session()
+        while not stop.is_set():
+            user_id = random.randint(1, args.users)
+            try:
+                db.add(models.Booking(
+                    user_id=user_id, vehicle_id=1, tariff_id=1,
+                    start_time=datetime.utcnow(), total_cost=10.0, status="active"
+                ))
+                db.add(models.Transaction(
+                    user_id=user_id, transaction_type="payment", amount=10.0, balance_delta=-10.0
+                ))
+                db.commit()
+                count("writes")
+            except exc.OperationalError as e:
+                db.rollback()
+                count("locked" if "locked" in str(e) else "errors")
+        db.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    maintenance = sqlite_maintenance(engine) if profile == "performance" else None
+    engine.dispose()
+    return {
+        "reads_per_s": counters["reads"] / elapsed,
+        "writes_per_s": counters["writes"] / elapsed,
+        "locked": counters["locked"],
+        "errors": counters["errors"],
+        "maintenance": maintenance
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение профилей SQLite")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--bookings", type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"Читателей: {args.readers}, писателей: {args.writers}, {args.seconds:.0f} с, бронирований: {args.bookings}")
+    print(f"{'профиль':<13}{'чтений/с':>10}{'записей/с':>11}{'locked':>8}{'ошибок':>8}")
+    for profile in ("off", "performance"):
+        result = run_profile(profile, args)
+        print(f"{profile:<13}{result['reads_per_s']:>10.1f}{result['writes_per_s']:>11.1f}{result['locked']:>8}{result['errors']:>8}")
+        if result["maintenance"]:
+            print(f"  wal_checkpoint после прогона: {result['maintenance']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Обработчик просроченных бронирований отдельным процессом.
+
+Для развертываний, где в воркерах API он выключен (BOOKING_EXPIRY_ENABLED=0).
+Лидерство берется через ту же аренду, что и внутри приложения, поэтому
+одновременно можно запускать несколько экземпляров.
+
+    python scripts/booking_expiry_worker.py          # работать до Ctrl+C
+    python scripts/booking_expiry_worker.py --once   # один запуск и выход
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+
+# Добавляем родительскую директорию в путь для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.booking_expiry import EXPIRY_INTERVAL, booking_expiry_worker
+from services.scheduler import PeriodicTask, Scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Завершение просроченных бронирований")
+    parser.add_argument("--once", action="store_true", help="Один запуск без аренды лидерства")
+    parser.add_argument("--interval", type=float, default=EXPIRY_INTERVAL)
+    args = parser.parse_args()
+
+    if args.once:
+        print(booking_expiry_worker.run())
+        return
+
+    scheduler = Scheduler()
+    scheduler.add(PeriodicTask("booking_expiry", args.interval, booking_expiry_worker.run, leader=True))
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    scheduler.start()
+    print(f"✅ Обработчик запущен, интервал {args.interval:.0f} с")
+    try:
+        while not stop.wait(args.interval):
+            print(scheduler.stats()[0])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
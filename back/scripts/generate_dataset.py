@@ -0,0 +1,420 @@
+"""
+Синтетический набор данных для нагрузочных тестов и профилирования:
+N пользователей, M автомобилей в K парковках и годы истории бронирований,
+транзакций и инцидентов.
+
+Данные правдоподобные: у пользователей и автомобилей неравномерная
+активность (немного постоянных клиентов и популярных машин дают большую
+часть поездок), поездки чаще в утренний и вечерний пики, длительность -
+логнормальная с редкими многодневными арендами, число поездок растет к
+концу периода. Перед поездкой, на которую не хватает баланса, идет
+пополнение; каждая поездка оплачивается записью в журнале.
+
+Строки пишутся пакетными INSERT по --batch-size, в обход ORM, а индексы
+таблиц истории строятся после загрузки. Снимки баланса пишутся по итогам
+генерации (как после компакции журнала), сводка выручки и счетчики
+дашборда пересчитываются, версии каталога (ETag) увеличиваются.
+Генератор случайных чисел инициализируется --seed: при тех же
+параметрах и --end набор получается тем же.
+
+Схема и начальные данные создаются миграциями, если их еще нет.
+
+    python scripts/generate_dataset.py --users 100000 --vehicles 5000 --zones 200 --years 3 --bookings 2000000
+    DATABASE_URL=sqlite:///./load.db python scripts/generate_dataset.py --seed 7 --end 2025-06-30
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+# Добавляем родительскую директорию в путь для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, inspect, text
+
+from db import models
+from db.database import SessionLocal, engine
+from db.migrations import upgrade
+from services import pricing, revenue_rollup, stats_counters
+from services.versions import collection_versions
+
+FIRST_NAMES = [
+    "Иван", "Елена", "Михаил", "Ольга", "Александр", "Анна", "Дмитрий", "Мария", "Сергей", "Наталья",
+    "Андрей", "Татьяна", "Алексей", "Ирина", "Павел", "Светлана", "Николай", "Екатерина", "Артем", "Юлия"
+]
+LAST_NAMES = [
+    "Морозов", "Васильев", "Новиков", "Козлов", "Лебедев", "Смирнов", "Попов", "Соколов", "Волков", "Федоров",
+    "Михайлов", "Беляев", "Тарасов", "Белов", "Комаров", "Орлов", "Киселев", "Макаров", "Андреев", "Ковалев"
+]
+# (тип, марка, модель, вес в парке)
+VEHICLE_CATALOG = [
+    ("sedan", "Kia", "Rio", 10), ("sedan", "Hyundai", "Solaris", 10), ("sedan", "Volkswagen", "Polo", 6),
+    ("sedan", "Skoda", "Rapid", 5), ("sedan", "Renault", "Logan", 4), ("sedan", "Toyota", "Camry", 2),
+    ("suv", "Renault", "Duster", 4), ("suv", "Nissan", "Qashqai", 3), ("suv", "Kia", "Sportage", 3),
+    ("suv", "Toyota", "RAV4", 2), ("electric", "Tesla", "Model 3", 1), ("electric", "Nissan", "Leaf", 1),
+    ("compact", "Kia", "Picanto", 3), ("compact", "Smart", "Fortwo", 2), ("premium", "BMW", "5 Series", 1),
+    ("premium", "Mercedes-Benz", "E-Class", 1)
+]
+COLORS = ["Белый", "Черный", "Серый", "Серебристый", "Синий", "Красный", "Зеленый"]
+PLATE_LETTERS = "АВЕКМНОРСТУХ"
+# (тип, вес, описание)
+INCIDENT_TYPES = [
+    ("damage", 5, "Повреждение кузова"),
+    ("violation", 4, "Штраф за нарушение ПДД"),
+    ("technical_issue", 3, "Техническая неисправность"),
+    ("accident", 1, "ДТП"),
+]
+DEPOSIT_AMOUNTS = [500.0, 1000.0, 2000.0, 3000.0, 5000.0, 10000.0]
+# Относительная частота начала поездок по часам суток: утренний и вечерний пики
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 8, 10, 8, 6, 6, 6, 6, 6, 7, 8, 10, 10, 8, 6, 4, 3, 2]
+CENTER = (55.7558, 37.6173)
+
+
+class BatchWriter:
+    """Копит строки по таблицам и пишет их пакетными INSERT с коммитом на пакет"""
+
+    def __init__(self, connection, batch_size: int):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.rows = {}
+        self.written = {}
+
+    def add(self, model, row: dict):
+        rows = self.rows.setdefault(model, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model=None):
+        for current in [model] if model is not None else list(self.rows):
+            rows = self.rows.get(current)
+            if not rows:
+                continue
+            self.connection.execute(current.__table__.insert(), rows)
+            self.connection.commit()
+            self.written[current.__tablename__] = self.written.get(current.__tablename__, 0) + len(rows)
+            self.rows[current] = []
+
+
+def next_id(connection, model) -> int:
+    return (connection.execute(func.max(model.id).select()).scalar() or 0) + 1
+
+
+@contextmanager
+def deferred_indexes(connection, tables):
+    """Снять вторичные индексы таблиц на время загрузки и построить их заново в конце.
+
+    Построить индекс по готовой таблице быстрее, чем обновлять десяток
+    индексов на каждую вставленную строку.
+    """
+    indexes = []
+    for model in tables:
+        existing = {index["name"] for index in inspect(connection).get_indexes(model.__tablename__)}
+        indexes += [index for index in model.__table__.indexes if index.name in existing]
+    for index in indexes:
+        index.drop(connection)
+    connection.commit()
+    try:
+        yield
+    finally:
+        started = time.perf_counter()
+        for index in indexes:
+            index.create(connection)
+        connection.commit()
+        print(f"Индексы построены: {len(indexes)}, {time.perf_counter() - started:.1f} с")
+
+
+def license_plate(index: int) -> str:
+    """Номер из индекса автомобиля: разные индексы - разные номера"""
+    letters = len(PLATE_LETTERS)
+    index, first = divmod(index, letters)
+    index, digits = divmod(index, 1000)
+    index, second = divmod(index, letters)
+    region, third = divmod(index, letters)
+    return f"{PLATE_LETTERS[first]}{digits:03d}{PLATE_LETTERS[second]}{PLATE_LETTERS[third]}{50 + region}"
+
+
+def month_starts(start: date, end: date):
+    current = start.replace(day=1)
+    while current <= end:
+        yield current
+        current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def generate(args):
+    rng = random.Random(args.seed)
+    end = args.end
+    start = end - timedelta(days=round(365.25 * args.years))
+    started = time.perf_counter()
+
+    upgrade()
+    with engine.connect() as connection:
+        if connection.dialect.name == "sqlite":
+            # Пакетная загрузка: индексы обновляются в большом кэше страниц, без fsync на коммит
+            for pragma in ("cache_size=-524288", "synchronous=OFF", "temp_store=MEMORY"):
+                connection.exec_driver_sql(f"PRAGMA {pragma}")
+        writer = BatchWriter(connection, args.batch_size)
+
+        tariffs = [
+            (tariff_id, pricing.price_per_day(price_per_hour, price_per_minute) or 0.0)
+            for tariff_id, price_per_hour, price_per_minute in connection.execute(
+                models.Tariff.__table__.select().with_only_columns(
+                    models.Tariff.id, models.Tariff.price_per_hour, models.Tariff.price_per_minute
+                )
+            )
+        ]
+        if not tariffs:
+            raise SystemExit("В БД нет тарифов")
+        price_per_day = dict(tariffs)
+
+        # Парковки
+        first_zone = next_id(connection, models.ParkingZone)
+        for index in range(args.zones):
+            writer.add(models.ParkingZone, {
+                "id": first_zone + index,
+                "name": f"Парковка {first_zone + index}",
+                "address": f"Москва, зона {first_zone + index}",
+                "capacity": rng.randint(10, 60),
+                "latitude": round(rng.gauss(CENTER[0], 0.08), 6),
+                "longitude": round(rng.gauss(CENTER[1], 0.12), 6),
+            })
+        zone_ids = list(range(first_zone, first_zone + args.zones))
+        # Центральные парковки загружены сильнее окраинных
+        zone_cum = list(accumulate(rng.paretovariate(2.0) for _ in zone_ids))
+
+        # Автомобили
+        first_vehicle = next_id(connection, models.Vehicle)
+        vehicle_tariff = {}
+        vehicle_zone = {}
+        catalog_weights = list(accumulate(weight for _, _, _, weight in VEHICLE_CATALOG))
+        for index in range(args.vehicles):
+            vehicle_id = first_vehicle + index
+            vehicle_type, brand, model, _ = rng.choices(VEHICLE_CATALOG, cum_weights=catalog_weights)[0]
+            tariff_id = rng.choice(tariffs)[0]
+            vehicle_tariff[vehicle_id] = tariff_id
+            vehicle = {
+                "id": vehicle_id,
+                "license_plate": license_plate(vehicle_id),
+                "brand": brand,
+                "model": model,
+                "vehicle_type": vehicle_type,
+                "year": rng.randint(2018, end.year),
+                "color": rng.choice(COLORS),
+                "image_url": "/car.png",
+                "description": f"{brand} {model}",
+                "status": "maintenance" if rng.random() < 0.04 else "available",
+                "parking_zone_id": rng.choices(zone_ids, cum_weights=zone_cum)[0] if zone_ids else None,
+                "tariff_id": tariff_id,
+            }
+            writer.add(models.Vehicle, vehicle)
+            vehicle_zone[vehicle_id] = vehicle["parking_zone_id"]
+        vehicle_ids = list(vehicle_tariff)
+        vehicle_cum = list(accumulate(rng.lognormvariate(0, 0.8) for _ in vehicle_ids))
+
+        # Пользователи: у немногих постоянных клиентов большая часть поездок
+        first_user = next_id(connection, models.User)
+        for index in range(args.users):
+            user_id = first_user + index
+            writer.add(models.User, {
+                "id": user_id,
+                "first_name": rng.choice(FIRST_NAMES),
+                "last_name": rng.choice(LAST_NAMES),
+                "email": f"user{user_id}@load.test",
+                "phone": f"+7900{user_id:07d}",
+                "password": "user123",
+                "drivers_license": f"99 {user_id:08d}",
+                "opening_balance": 0.0,
+            })
+        user_ids = list(range(first_user, first_user + args.users))
+        user_cum = list(accumulate(rng.paretovariate(1.2) for _ in user_ids))
+        balances = dict.fromkeys(user_ids, 0.0)
+        last_transaction = {}
+        writer.flush()
+        print(f"Парковок {args.zones}, автомобилей {args.vehicles}, пользователей {args.users}")
+
+        if not vehicle_ids or not user_ids:
+            args.bookings = 0
+
+        # Поездки, транзакции и инциденты - основной объем; индексы строятся после загрузки
+        with deferred_indexes(connection, (models.Booking, models.Transaction, models.Incident)):
+            # Поездки по месяцам; число поездок растет к концу периода
+            months = list(month_starts(start, end))
+            growth = [1.0 + index / max(len(months) - 1, 1) for index in range(len(months))]
+            remaining = args.bookings
+            weight_left = sum(growth)
+
+            booking_id = next_id(connection, models.Booking)
+            transaction_id = next_id(connection, models.Transaction)
+            incident_id = next_id(connection, models.Incident)
+            hour_cum = list(accumulate(HOUR_WEIGHTS))
+            incident_cum = list(accumulate(weight for _, weight, _ in INCIDENT_TYPES))
+
+            for month, weight in zip(months, growth):
+                count = round(remaining * weight / weight_left)
+                remaining -= count
+                weight_left -= weight
+                first_day = max(month, start)
+                last_day = min((month.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1), end - timedelta(days=1))
+                span = (last_day - first_day).days + 1
+                if count <= 0 or span <= 0:
+                    continue
+
+                starts = sorted(
+                    datetime.combine(first_day + timedelta(days=rng.randrange(span)), datetime.min.time())
+                    + timedelta(hours=hour, minutes=rng.randrange(60))
+                    for hour in rng.choices(range(24), cum_weights=hour_cum, k=count)
+                )
+                users = rng.choices(user_ids, cum_weights=user_cum, k=count)
+                vehicles = rng.choices(vehicle_ids, cum_weights=vehicle_cum, k=count)
+
+                for start_time, user_id, vehicle_id in zip(starts, users, vehicles):
+                    tariff_id = vehicle_tariff[vehicle_id]
+                    if rng.random() < 0.05:
+                        # Аренда на несколько суток
+                        hours = 24.0 * rng.randint(1, 7)
+                    else:
+                        hours = min(max(round(rng.lognormvariate(math.log(1.5), 0.8) * 4) / 4, 0.25), 23.75)
+                    end_time = start_time + timedelta(hours=hours)
+                    cost = round(price_per_day[tariff_id] / 24 * hours, 2)
+
+                    # Пополнение перед поездкой, на которую не хватает баланса
+                    while balances[user_id] < cost:
+                        # Крупную аренду пополняют сразу на недостающую сумму, округленную до тысяч
+                        amount = max(rng.choice(DEPOSIT_AMOUNTS), math.ceil((cost - balances[user_id]) / 1000) * 1000.0)
+                        failed = rng.random() < 0.02
+                        writer.add(models.Transaction, {
+                            "id": transaction_id,
+                            "user_id": user_id,
+                            "booking_id": None,
+                            "transaction_type": "deposit",
+                            "amount": amount,
+                            "balance_delta": 0.0 if failed else amount,
+                            "description": f"Пополнение баланса на {amount:.2f} ₽",
+                            "created_at": start_time - timedelta(minutes=rng.randint(1, 120)),
+                            "status": "failed" if failed else "completed",
+                            "folded": args.snapshots,
+                        })
+                        last_transaction[user_id] = transaction_id
+                        transaction_id += 1
+                        if not failed:
+                            balances[user_id] += amount
+
+                    writer.add(models.Booking, {
+                        "id": booking_id,
+                        "user_id": user_id,
+                        "vehicle_id": vehicle_id,
+                        "tariff_id": tariff_id,
+                        "parking_zone_id": vehicle_zone[vehicle_id],
+                        "start_time": start_time,
+                        "end_time": end_time,
+                        "duration_hours": hours,
+                        "total_cost": cost,
+                        "status": "completed",
+                    })
+                    writer.add(models.Transaction, {
+                        "id": transaction_id,
+                        "user_id": user_id,
+                        "booking_id": booking_id,
+                        "transaction_type": "payment",
+                        "amount": cost,
+                        "balance_delta": -cost,
+                        "description": f"Оплата бронирования #{booking_id}",
+                        "created_at": end_time,
+                        "status": "completed",
+                        "folded": args.snapshots,
+                    })
+                    last_transaction[user_id] = transaction_id
+                    transaction_id += 1
+                    balances[user_id] -= cost
+
+                    if rng.random() < args.incident_rate:
+                        incident_type, _, description = rng.choices(INCIDENT_TYPES, cum_weights=incident_cum)[0]
+                        # Старые инциденты почти все закрыты
+                        age_days = (end - start_time.date()).days
+                        writer.add(models.Incident, {
+                            "id": incident_id,
+                            "booking_id": booking_id,
+                            "vehicle_id": vehicle_id,
+                            "user_id": user_id,
+                            "incident_type": incident_type,
+                            "description": description,
+                            "status": "resolved" if age_days > 30 or rng.random() < 0.5 else rng.choice(["reported", "in_progress"]),
+                        })
+                        incident_id += 1
+                    booking_id += 1
+
+                writer.flush()
+                print(f"{month:%Y-%m}: поездок {count}")
+
+            writer.flush()
+
+        if args.snapshots:
+            # Снимки баланса сразу по итогам генерации - как после фоновой компакции журнала
+            now = datetime.utcnow()
+            for user_id, transaction in last_transaction.items():
+                writer.add(models.BalanceSnapshot, {
+                    "user_id": user_id,
+                    "balance": round(balances[user_id], 2),
+                    "last_transaction_id": transaction,
+                    "updated_at": now,
+                })
+            writer.flush()
+        written = writer.written
+
+        if connection.dialect.name == "postgresql":
+            # Идентификаторы заданы явно - сдвигаем последовательности
+            for model in (models.ParkingZone, models.Vehicle, models.User, models.Booking, models.Transaction, models.Incident):
+                table = model.__tablename__
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+                ))
+            connection.commit()
+
+    print(f"Записано: {', '.join(f'{table} {count}' for table, count in written.items())}")
+    print(f"Генерация: {time.perf_counter() - started:.1f} с")
+
+    refresh_derived()
+    print(f"✅ Готово за {time.perf_counter() - started:.1f} с")
+
+
+def refresh_derived():
+    """Производные таблицы: сводка выручки, счетчики дашборда, версии коллекций, статистика планировщика"""
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        revenue_rollup.rebuild(db)
+        stats_counters.reconcile(db)
+        # Закешированные клиентами ETag каталога больше не совпадут
+        collection_versions.bump(db, "bookings", "parking_zones", "vehicles")
+        db.commit()
+    finally:
+        db.close()
+
+    with engine.connect() as connection:
+        connection.execute(text("ANALYZE"))
+        connection.commit()
+    print(f"Производные таблицы: {time.perf_counter() - started:.1f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетический набор данных для нагрузочных тестов")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--vehicles", type=int, default=1000)
+    parser.add_argument("--zones", type=int, default=50)
+    parser.add_argument("--years", type=float, default=2.0, help="Глубина истории")
+    parser.add_argument("--bookings", type=int, default=200000, help="Всего поездок за период")
+    parser.add_argument("--incident-rate", type=float, default=0.01, help="Доля поездок с инцидентом")
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today(), help="Последний день истории (не включая)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--no-snapshots", dest="snapshots", action="store_false", help="Без снимков баланса: баланс читается по всему журналу")
+    generate(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
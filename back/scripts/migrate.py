@@ -0,0 +1,67 @@
+"""
+Миграции схемы БД (db/migrations.py). Запускается один раз на деплой,
+до старта воркеров API.
+
+    python scripts/migrate.py              # применить все новые шаги
+    python scripts/migrate.py --status     # текущая версия и шаги, ожидающие применения
+    python scripts/migrate.py --to 7       # применить шаги до 7 включительно
+
+После примененных шагов заполняются производные таблицы сервисов
+(initialize_derived): счетчики дашборда и сводка выручки.
+"""
+import argparse
+import os
+import sys
+from typing import List
+
+# Добавляем родительскую директорию в путь для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.database import SessionLocal
+from db.migrations import LATEST_VERSION, MIGRATIONS, Migration, current_version, upgrade
+from services import revenue_rollup, stats_counters
+
+
+def status():
+    version = current_version()
+    print(f"Версия схемы: {version} из {LATEST_VERSION}")
+    for migration in MIGRATIONS:
+        if migration.version > version:
+            print(f"  ожидает: {migration.version} {migration.name}")
+
+
+def initialize_derived(applied: List[Migration]):
+    """Первое заполнение производных таблиц на существующей БД"""
+    names = {migration.name for migration in applied}
+    db = SessionLocal()
+    try:
+        stats_counters.ensure_initialized(db)
+        if "bookings_parking_zone" in names:
+            # Ключ сводки сменился на bookings.parking_zone_id - пересчитать целиком
+            revenue_rollup.rebuild(db)
+        else:
+            revenue_rollup.ensure_initialized(db)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument("--status", action="store_true", help="Показать версию схемы и не применять шаги")
+    parser.add_argument("--to", dest="target", type=int, default=LATEST_VERSION, help="Применить шаги до этой версии")
+    args = parser.parse_args()
+
+    if args.status:
+        status()
+        return
+
+    applied = upgrade(args.target)
+    if applied:
+        initialize_derived(applied)
+        print(f"✅ Схема обновлена до версии {applied[-1].version}")
+    else:
+        print(f"ℹ️  Схема актуальна (версия {current_version()})")
+
+
+if __name__ == "__main__":
+    main()
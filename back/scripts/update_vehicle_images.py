@@ -7,10 +7,11 @@ import os
 # Добавляем родительскую директорию в путь для импорта модулей
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, or_
 from sqlalchemy.orm import sessionmaker
 from db import models
 from db.database import DATABASE_URL
+from services.versions import collection_versions
 
 def update_vehicle_images():
     """Обновить все картинки автомобилей на /car.png"""
@@ -19,22 +20,22 @@ def update_vehicle_images():
     db = SessionLocal()
 
     try:
-        # Получаем все машины
-        vehicles = db.query(models.Vehicle).all()
+        total_count = db.query(models.Vehicle).count()
 
-        print(f"Найдено машин: {len(vehicles)}")
+        print(f"Найдено машин: {total_count}")
 
-        # Обновляем image_url для каждой машины
-        updated_count = 0
-        for vehicle in vehicles:
-            if vehicle.image_url != "/car.png":
-                vehicle.image_url = "/car.png"
-                updated_count += 1
+        # Один UPDATE только для машин с другой картинкой, без загрузки объектов в память
+        updated_count = db.query(models.Vehicle).filter(
+            or_(models.Vehicle.image_url.is_(None), models.Vehicle.image_url != "/car.png")
+        ).update({models.Vehicle.image_url: "/car.png"}, synchronize_session=False)
+        if updated_count:
+            # Индексы воркеров API перестроятся, ETag каталога сменится
+            collection_versions.bump(db, "vehicles")
 
         db.commit()
 
         print(f"✅ Обновлено {updated_count} машин")
-        print(f"Всех машин в базе: {len(vehicles)}")
+        print(f"Всех машин в базе: {total_count}")
 
     except Exception as e:
         print(f"❌ Ошибка: {e}")
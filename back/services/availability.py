@@ -0,0 +1,175 @@
+"""
+Календарь занятости автомобилей: индекс интервалов бронирований.
+
+Для каждого автомобиля хранится отсортированный по началу список
+непересекающихся интервалов [start, end) активных и ожидающих
+бронирований. Проверка пересечения - бинарный поиск и сравнение
+с соседями, O(log n).
+
+Интервалы полуоткрытые: бронирование на даты 5 -> 6 - это
+[5-е 00:00, 6-е 00:00), и следующее с 6-го с ним не пересекается;
+_has_overlap в routers/bookings.py сравнивает так же. create_booking
+всегда задает end_time, бронирования без него из старых данных
+получили конец миграцией 12; на случай, если такая строка появится,
+она занимает машину без ограничения по времени (OPEN_END).
+
+Индекс процесса - быстрый предварительный отказ и данные для
+календаря. Окончательную проверку create_booking делает в БД под
+блокировкой строки автомобиля, после commit интервал добавляется
+сюда через add(). Бронирования, созданные или завершенные другим
+процессом, видны по версии коллекции bookings: из БД перечитываются
+интервалы только тех автомобилей, которые она изменила.
+"""
+import bisect
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from db import models
+from services.versions import VersionWatch
+
+# Больше стольких автомобилей с изменениями - перестроить календарь целиком
+MAX_DELTA = 1000
+
+# Статусы бронирований, которые занимают автомобиль
+BLOCKING_STATUSES = ("active", "pending")
+OPEN_END = datetime.max
+
+Interval = Tuple[datetime, datetime, Optional[int]]
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+        # Растет при каждом точечном изменении: rebuild, прочитавший БД до него, повторяет чтение
+        self._generation = 0
+        self._watch = VersionWatch("bookings")
+        # vehicle_id -> [(start, end, booking_id)], отсортировано по start
+        self._by_vehicle: Dict[int, List[Interval]] = {}
+
+    # Сколько раз rebuild перечитывает БД, если во время чтения пришли add/release
+    REBUILD_ATTEMPTS = 3
+
+    def rebuild(self, db: Session):
+        for attempt in range(self.REBUILD_ATTEMPTS):
+            with self._lock:
+                generation = self._generation
+            version = self._watch.current(db)
+            by_vehicle = self._build(db)
+            with self._lock:
+                if self._generation == generation or attempt == self.REBUILD_ATTEMPTS - 1:
+                    self._by_vehicle = by_vehicle
+                    self.loaded = self._generation == generation
+                    if self.loaded:
+                        self._watch.synced(version)
+                    return
+
+    def _build(self, db: Session, vehicle_ids=None) -> Dict[int, List[Interval]]:
+        by_vehicle: Dict[int, List[Interval]] = {}
+        query = db.query(
+            models.Booking.id,
+            models.Booking.vehicle_id,
+            models.Booking.start_time,
+            models.Booking.end_time
+        ).filter(models.Booking.status.in_(BLOCKING_STATUSES))
+        if vehicle_ids is not None:
+            query = query.filter(models.Booking.vehicle_id.in_(vehicle_ids))
+
+        for booking_id, vehicle_id, start_time, end_time in query.yield_per(1000):
+            by_vehicle.setdefault(vehicle_id, []).append((start_time, end_time or OPEN_END, booking_id))
+        for intervals in by_vehicle.values():
+            intervals.sort(key=lambda interval: interval[0])
+        return by_vehicle
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.rebuild(db)
+            return
+        changes = self._watch.changes(db)
+        if changes is None:
+            return
+        version, vehicle_ids = changes
+        if vehicle_ids is None or len(vehicle_ids) > MAX_DELTA:
+            self.rebuild(db)
+        elif self._apply_changes(db, vehicle_ids):
+            self._watch.advance(version)
+        else:
+            self._watch.retry()
+
+    def _apply_changes(self, db: Session, vehicle_ids) -> bool:
+        """Перечитать интервалы автомобилей, измененные другим процессом. False - мешали add/release"""
+        with self._lock:
+            generation = self._generation
+        by_vehicle = self._build(db, vehicle_ids)
+        with self._lock:
+            if self._generation != generation or not self.loaded:
+                return False
+            for vehicle_id in vehicle_ids:
+                if vehicle_id in by_vehicle:
+                    self._by_vehicle[vehicle_id] = by_vehicle[vehicle_id]
+                else:
+                    self._by_vehicle.pop(vehicle_id, None)
+        return True
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self.loaded = False
+
+    def _overlap(self, intervals: List[Interval], start: datetime, end: datetime) -> Optional[Interval]:
+        i = bisect.bisect_left(intervals, start, key=lambda interval: interval[0])
+        # Предыдущий интервал может заканчиваться после нашего начала
+        if i > 0 and intervals[i - 1][1] > start:
+            return intervals[i - 1]
+        # Следующий интервал может начинаться до нашего конца
+        if i < len(intervals) and intervals[i][0] < end:
+            return intervals[i]
+        return None
+
+    def find_overlap(self, vehicle_id: int, start: datetime, end: Optional[datetime]) -> Optional[Interval]:
+        with self._lock:
+            return self._overlap(self._by_vehicle.get(vehicle_id, []), start, end or OPEN_END)
+
+    def add(self, vehicle_id: int, start: datetime, end: Optional[datetime], booking_id: int):
+        """Добавить интервал созданного бронирования (вызывать после commit)"""
+        with self._lock:
+            self._generation += 1
+            intervals = self._by_vehicle.setdefault(vehicle_id, [])
+            if self._position(intervals, start, booking_id) is None:
+                bisect.insort(intervals, (start, end or OPEN_END, booking_id), key=lambda interval: interval[0])
+
+    def _position(self, intervals: List[Interval], start: datetime, booking_id: Optional[int]) -> Optional[int]:
+        i = bisect.bisect_left(intervals, start, key=lambda interval: interval[0])
+        while i < len(intervals) and intervals[i][0] == start:
+            if intervals[i][2] == booking_id:
+                return i
+            i += 1
+        return None
+
+    def release(self, vehicle_id: int, start: datetime, booking_id: Optional[int] = None):
+        """Освободить интервал завершенного или отмененного бронирования"""
+        with self._lock:
+            self._generation += 1
+            intervals = self._by_vehicle.get(vehicle_id, [])
+            i = self._position(intervals, start, booking_id)
+            if i is not None:
+                intervals.pop(i)
+
+    def busy(self, vehicle_id: int, start: datetime, end: datetime) -> List[Interval]:
+        """Интервалы занятости, пересекающие [start, end)"""
+        with self._lock:
+            intervals = self._by_vehicle.get(vehicle_id, [])
+            i = bisect.bisect_left(intervals, start, key=lambda interval: interval[0])
+            if i > 0 and intervals[i - 1][1] > start:
+                i -= 1
+            result = []
+            while i < len(intervals) and intervals[i][0] < end:
+                result.append(intervals[i])
+                i += 1
+            return result
+
+
+availability_index = AvailabilityIndex()
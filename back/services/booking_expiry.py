@@ -0,0 +1,198 @@
+"""
+Фоновое завершение просроченных и активация наступивших бронирований.
+
+За один запуск обработчик:
+1. завершает active/pending бронирования, у которых end_time в прошлом
+   (индекс ix_booking_status_end), и освобождает их автомобили;
+2. переводит pending бронирования с наступившим start_time и еще не
+   прошедшим end_time в active и занимает автомобиль, если он свободен.
+
+Работа идет пакетами по BATCH_SIZE бронирований: один SELECT id и два
+UPDATE ... WHERE id IN (...) на пакет, commit после каждого пакета.
+Число пакетов за запуск ограничено, остаток обработает следующий запуск.
+В многопроцессном развертывании выполняется только лидером (scheduler)
+или отдельным процессом scripts/booking_expiry_worker.py. Остальные
+процессы узнают об изменениях по версиям коллекций bookings и vehicles
+в БД (services/versions.py) и перечитывают затронутые автомобили.
+"""
+import os
+from datetime import datetime
+from typing import Optional, Set
+
+from sqlalchemy import exists, func, update
+from sqlalchemy.orm import Session
+
+from db import models
+from db.database import SessionLocal
+from services import revenue_rollup, stats_counters
+from services.availability import BLOCKING_STATUSES, availability_index
+from services.vehicle_index import vehicle_index
+from services.versions import collection_versions
+
+EXPIRY_ENABLED = os.getenv("BOOKING_EXPIRY_ENABLED", "1") != "0"
+EXPIRY_INTERVAL = float(os.getenv("BOOKING_EXPIRY_INTERVAL", "60"))
+BATCH_SIZE = int(os.getenv("BOOKING_EXPIRY_BATCH_SIZE", "500"))
+MAX_BATCHES = int(os.getenv("BOOKING_EXPIRY_MAX_BATCHES", "20"))
+
+
+class BookingExpiryWorker:
+    def __init__(self, batch_size: int = BATCH_SIZE, max_batches: int = MAX_BATCHES):
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.completed_total = 0
+        self.activated_total = 0
+        self.batches_total = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        # Насколько самое старое просроченное бронирование опоздало к началу запуска
+        self.last_lag_seconds: Optional[float] = None
+        self.max_lag_seconds = 0.0
+        # Запуск уперся в MAX_BATCHES - очередь не разобрана
+        self.backlog = False
+
+    def run(self, now: Optional[datetime] = None) -> dict:
+        # Даты бронирований хранятся в местном времени (date + время суток)
+        now = now or datetime.now()
+        db = SessionLocal()
+        try:
+            oldest_end = db.query(func.min(models.Booking.end_time)).filter(
+                models.Booking.status.in_(BLOCKING_STATUSES),
+                models.Booking.end_time < now
+            ).scalar()
+            lag = (now - oldest_end).total_seconds() if oldest_end is not None else 0.0
+            self.last_lag_seconds = lag
+            self.max_lag_seconds = max(self.max_lag_seconds, lag)
+
+            completed, complete_backlog = self._run_batches(db, self._complete_batch, now)
+            activated, activate_backlog = self._run_batches(db, self._activate_batch, now)
+        finally:
+            db.close()
+
+        self.completed_total += completed
+        self.activated_total += activated
+        self.backlog = complete_backlog or activate_backlog
+        return {"completed": completed, "activated": activated, "lag_seconds": round(lag, 3), "backlog": self.backlog}
+
+    def _run_batches(self, db: Session, batch, now: datetime):
+        processed = 0
+        for _ in range(self.max_batches):
+            size = batch(db, now)
+            if not size:
+                return processed, False
+            processed += size
+            self.batches_total += 1
+            self.last_batch_size = size
+            self.max_batch_size = max(self.max_batch_size, size)
+            if size < self.batch_size:
+                return processed, False
+        return processed, True
+
+    def _complete_batch(self, db: Session, now: datetime) -> int:
+        rows = db.query(models.Booking.id, models.Booking.vehicle_id, models.Booking.start_time).filter(
+            models.Booking.status.in_(BLOCKING_STATUSES),
+            models.Booking.end_time < now
+        ).order_by(models.Booking.end_time).limit(self.batch_size).all()
+        if not rows:
+            return 0
+
+        ids = [row.id for row in rows]
+        vehicle_ids = {row.vehicle_id for row in rows}
+        # Условие по статусу: бронирование могли завершить вручную между SELECT и UPDATE.
+        # UPDATE по каждому статусу отдельно - число строк идет в счетчики дашборда,
+        # RETURNING - только действительно завершенные этим запуском строки идут в сводку выручки
+        counters = {"bookings:completed": 0}
+        completed = []
+        for status in BLOCKING_STATUSES:
+            rows_done = db.execute(
+                update(models.Booking).where(
+                    models.Booking.id.in_(ids),
+                    models.Booking.status == status
+                ).values(status="completed", parking_zone_id=revenue_rollup.vehicle_zone()).returning(
+                    models.Booking.end_time, models.Booking.tariff_id, models.Booking.parking_zone_id, models.Booking.total_cost
+                ).execution_options(synchronize_session=False)
+            ).all()
+            counters[f"bookings:{status}"] = -len(rows_done)
+            counters["bookings:completed"] += len(rows_done)
+            completed.extend(tuple(row) for row in rows_done)
+        revenue_rollup.record(db, completed)
+
+        # Машина освобождается, только если у нее не осталось активных бронирований
+        still_active = exists().where(
+            models.Booking.vehicle_id == models.Vehicle.id,
+            models.Booking.status == "active"
+        )
+        released = [vehicle_id for (vehicle_id,) in db.execute(
+            update(models.Vehicle).where(
+                models.Vehicle.id.in_(vehicle_ids),
+                models.Vehicle.status == "in_use",
+                ~still_active
+            ).values(status="available").returning(models.Vehicle.id).execution_options(synchronize_session=False)
+        )]
+        counters.update({"vehicles:in_use": -len(released), "vehicles:available": len(released)})
+        stats_counters.apply(db, counters)
+        collection_versions.bump(db, "bookings", changed=vehicle_ids)
+        # Каталог меняется, только если машина освободилась
+        collection_versions.bump(db, "vehicles", changed=released)
+        db.commit()
+
+        for row in rows:
+            availability_index.release(row.vehicle_id, row.start_time, row.id)
+        self._refresh_vehicles(db, vehicle_ids)
+        return len(rows)
+
+    def _activate_batch(self, db: Session, now: datetime) -> int:
+        # Без end_time бронирование никогда не завершилось бы - такие не активируем
+        rows = db.query(models.Booking.id, models.Booking.vehicle_id).filter(
+            models.Booking.status == "pending",
+            models.Booking.start_time <= now,
+            models.Booking.end_time > now
+        ).order_by(models.Booking.start_time).limit(self.batch_size).all()
+        if not rows:
+            return 0
+
+        ids = [row.id for row in rows]
+        vehicle_ids = {row.vehicle_id for row in rows}
+        activated = db.query(models.Booking).filter(
+            models.Booking.id.in_(ids),
+            models.Booking.status == "pending"
+        ).update({models.Booking.status: "active"}, synchronize_session=False)
+        # Машину на обслуживании не трогаем - бронирование активно, но выдать ее нельзя
+        claimed = [vehicle_id for (vehicle_id,) in db.execute(
+            update(models.Vehicle).where(
+                models.Vehicle.id.in_(vehicle_ids),
+                models.Vehicle.status == "available"
+            ).values(status="in_use").returning(models.Vehicle.id).execution_options(synchronize_session=False)
+        )]
+        stats_counters.apply(db, {
+            "bookings:pending": -activated,
+            "bookings:active": activated,
+            "vehicles:available": -len(claimed),
+            "vehicles:in_use": len(claimed)
+        })
+        # Интервалы занятости не меняются (pending и active занимают машину одинаково) - только статус машин
+        collection_versions.bump(db, "vehicles", changed=claimed)
+        db.commit()
+
+        self._refresh_vehicles(db, vehicle_ids)
+        return len(rows)
+
+    def _refresh_vehicles(self, db: Session, vehicle_ids: Set[int]):
+        for vehicle in db.query(models.Vehicle).filter(models.Vehicle.id.in_(vehicle_ids)):
+            vehicle_index.upsert(vehicle)
+
+    def stats(self) -> dict:
+        return {
+            "batch_size": self.batch_size,
+            "max_batches": self.max_batches,
+            "completed_total": self.completed_total,
+            "activated_total": self.activated_total,
+            "batches_total": self.batches_total,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "last_lag_seconds": self.last_lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+            "backlog": self.backlog
+        }
+
+
+booking_expiry_worker = BookingExpiryWorker()
@@ -0,0 +1,178 @@
+"""
+Кэш в памяти процесса с TTL и тегами инвалидации.
+
+Значение кладется в кэш вместе с набором тегов (например "tariffs").
+Админские эндпоинты после изменения данных вызывают invalidate(тег) -
+все записи с этим тегом удаляются. TTL ограничивает устаревание данных
+на других воркерах, до которых инвалидация не доходит.
+
+В кэше с single_flight=True загрузка через get_or_set выполняется одна
+на ключ: параллельные промахи по тому же ключу ждут первую загрузку и
+берут ее результат, а не повторяют запрос к БД. Ожидание - блокировка
+threading на время loader(), поэтому single-flight включается только
+для кэшей, которые читают из пула потоков (дашборд). Справочники
+читаются и из обработчиков db_endpoint в цикле событий (DB_MODE=async):
+там второй промах встал бы на блокировке в потоке цикла, пока первый
+ждет БД в том же потоке, - и цикл остановился бы навсегда. Без
+single-flight параллельные промахи просто загружают значение каждый сам.
+
+Счетчики попаданий/промахов всех кэшей отдаются через /admin/metrics/cache.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, name: str, ttl: float, maxsize: int = 1024, single_flight: bool = False):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.single_flight = single_flight
+        self._lock = threading.Lock()
+        # ключ -> (значение, момент истечения, теги); порядок = порядок использования (LRU)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        # Растет при каждой инвалидации: загрузка, начатая до нее, не попадет в кэш
+        self._generation = 0
+        # ключ -> [блокировка загрузки, число ожидающих]
+        self._flights: Dict[str, list] = {}
+        self.hits = 0
+        self.misses = 0
+        # Промахи, дождавшиеся чужой загрузки вместо своей
+        self.coalesced = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def _lookup(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                self._drop(key)
+            return _MISSING
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: str, value, tags: Iterable[str] = (), ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, expires_at, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def get_or_set(self, key: str, loader: Callable[[], object], tags: Iterable[str] = (), ttl: Optional[float] = None):
+        """Вернуть значение из кэша или загрузить через loader() и сохранить"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if not self.single_flight:
+            return self._load(key, loader, tags, ttl)
+
+        with self._lock:
+            flight = self._flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+        try:
+            with flight[0]:
+                # Пока ждали блокировку, значение мог загрузить другой поток
+                with self._lock:
+                    value = self._lookup(key)
+                    if value is not _MISSING:
+                        self.coalesced += 1
+                        return value
+                return self._load(key, loader, tags, ttl)
+        finally:
+            with self._lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self._flights[key]
+
+    def _load(self, key: str, loader: Callable[[], object], tags: Iterable[str], ttl: Optional[float]):
+        generation = self._generation
+        value = loader()
+        if generation == self._generation:
+            self.set(key, value, tags=tags, ttl=ttl)
+        return value
+
+    def invalidate(self, *tags: str):
+        """Удалить все записи с любым из тегов (вызывать после commit)"""
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "single_flight": self.single_flight,
+                "coalesced": self.coalesced,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions
+            }
+
+
+_registry: List[TTLCache] = []
+
+
+def create_cache(name: str, ttl: float, maxsize: int = 1024, single_flight: bool = False) -> TTLCache:
+    cache = TTLCache(name, ttl, maxsize, single_flight)
+    _registry.append(cache)
+    return cache
+
+
+def all_cache_stats() -> List[dict]:
+    return [cache.stats() for cache in _registry]
+
+
+# Справочники: тарифы, парковки, офисы, роли - меняются несколько раз в месяц
+reference_cache = create_cache(
+    "reference",
+    ttl=float(os.getenv("REFERENCE_CACHE_TTL", "300")),
+    maxsize=256
+)
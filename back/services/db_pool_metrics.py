@@ -0,0 +1,116 @@
+"""
+Метрики пула соединений SQLAlchemy.
+
+Для каждого engine создается свой подкласс пула (instrumented_pool_class):
+он замеряет время ожидания соединения в _do_get и считает таймауты,
+а события пула (connect / checkout / checkin / invalidate) ведут счетчики.
+Подкласс и слушатели переходят к пересозданному пулу (dispose), поэтому
+метрики не теряются. Снимок отдается через /admin/metrics/db-pool.
+"""
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy import event, exc
+
+# Верхние границы корзин гистограммы ожидания, миллисекунды
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class PoolMetrics:
+    def __init__(self, name: str, pool_class: str):
+        self.name = name
+        self.pool_class = pool_class
+        self.pool = None
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def observe_wait(self, seconds: float):
+        milliseconds = seconds * 1000
+        bucket = len(WAIT_BUCKETS_MS)
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if milliseconds <= bound:
+                bucket = i
+                break
+        with self._lock:
+            self.wait_count += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.wait_buckets[bucket] += 1
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> dict:
+        pool = self.pool
+        with self._lock:
+            histogram = {
+                f"le_{bound}ms": count for bound, count in zip(WAIT_BUCKETS_MS, self.wait_buckets)
+            }
+            histogram["inf"] = self.wait_buckets[-1]
+            return {
+                "name": self.name,
+                "pool_class": self.pool_class,
+                "size": pool.size() if hasattr(pool, "size") else None,
+                "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+                "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+                "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+                "timeout_seconds": pool.timeout() if hasattr(pool, "timeout") else None,
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "checkout_timeouts": self.timeouts,
+                "wait": {
+                    "count": self.wait_count,
+                    "avg_ms": round(self.wait_total / self.wait_count * 1000, 3) if self.wait_count else None,
+                    "max_ms": round(self.wait_max * 1000, 3),
+                    "histogram": histogram
+                }
+            }
+
+
+_registry: Dict[str, PoolMetrics] = {}
+
+
+def instrumented_pool_class(base, name: str):
+    """Подкласс пула base с метриками под именем name"""
+    metrics = PoolMetrics(name, base.__name__)
+    _registry[name] = metrics
+
+    class InstrumentedPool(base):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            metrics.pool = self
+            # При пересоздании (dispose) слушатели копируются из старого пула через _dispatch
+            if kwargs.get("_dispatch") is None:
+                event.listen(self, "connect", lambda *args: metrics._count("connects"))
+                event.listen(self, "checkout", lambda *args: metrics._count("checkouts"))
+                event.listen(self, "checkin", lambda *args: metrics._count("checkins"))
+                event.listen(self, "invalidate", lambda *args: metrics._count("invalidations"))
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                metrics._count("timeouts")
+                raise
+            finally:
+                metrics.observe_wait(time.perf_counter() - started)
+
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
+
+
+def all_pool_stats() -> List[dict]:
+    return [metrics.stats() for metrics in _registry.values()]
@@ -0,0 +1,132 @@
+"""
+Пространственный индекс на равномерной сетке для поиска ближайших автомобилей.
+
+Точки раскладываются по ячейкам фиксированного размера в градусах.
+Поиск k ближайших обходит кольца ячеек от центра наружу и
+останавливается, как только следующее кольцо заведомо дальше
+k-го найденного соседа или радиуса поиска.
+"""
+import heapq
+import math
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+EARTH_RADIUS_M = 6371000.0
+# Метров в одном градусе широты
+METERS_PER_DEGREE = 111320.0
+# Размер ячейки по умолчанию: ~1.1 км по широте
+DEFAULT_CELL_DEG = 0.01
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между двумя точками в метрах"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _ring_cells(center_i: int, center_j: int, ring: int):
+    """Ячейки на границе квадрата радиуса ring вокруг центральной"""
+    if ring == 0:
+        yield center_i, center_j
+        return
+    for j in range(center_j - ring, center_j + ring + 1):
+        yield center_i - ring, j
+        yield center_i + ring, j
+    for i in range(center_i - ring + 1, center_i + ring):
+        yield i, center_j - ring
+        yield i, center_j + ring
+
+
+class GridIndex:
+    def __init__(self, cell_deg: float = DEFAULT_CELL_DEG):
+        self.cell_deg = cell_deg
+        self._lock = threading.RLock()
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        self._points: Dict[int, Tuple[float, float]] = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def add(self, point_id: int, lat: float, lon: float):
+        with self._lock:
+            self.discard(point_id)
+            self._points[point_id] = (lat, lon)
+            self._cells.setdefault(self._cell(lat, lon), set()).add(point_id)
+
+    def discard(self, point_id: int):
+        with self._lock:
+            point = self._points.pop(point_id, None)
+            if point is None:
+                return
+            cell = self._cell(*point)
+            ids = self._cells.get(cell)
+            if ids is not None:
+                ids.discard(point_id)
+                if not ids:
+                    del self._cells[cell]
+
+    def position(self, point_id: int) -> Optional[Tuple[float, float]]:
+        return self._points.get(point_id)
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        radius_m: float,
+        limit: int,
+        allowed: Optional[Set[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """k ближайших точек в радиусе: [(id, расстояние в метрах)] по возрастанию расстояния.
+
+        allowed - множество допустимых id (фильтры каталога); None - все точки.
+        """
+        with self._lock:
+            cell_lat_m = self.cell_deg * METERS_PER_DEGREE
+            cell_lon_m = cell_lat_m * max(math.cos(math.radians(lat)), 0.01)
+            min_cell_m = min(cell_lat_m, cell_lon_m)
+            max_ring = int(radius_m // min_cell_m) + 1
+
+            # Если после фильтров кандидатов меньше, чем ячеек для обхода, проще перебрать их
+            if allowed is not None and len(allowed) < (2 * max_ring + 1) ** 2:
+                found = []
+                for point_id in allowed:
+                    point = self._points.get(point_id)
+                    if point is None:
+                        continue
+                    distance = haversine_m(lat, lon, *point)
+                    if distance <= radius_m:
+                        found.append((distance, point_id))
+                return [(point_id, distance) for distance, point_id in heapq.nsmallest(limit, found)]
+
+            center_i, center_j = self._cell(lat, lon)
+            # Макс-куча по расстоянию из limit лучших кандидатов
+            best: List[Tuple[float, int]] = []
+
+            for ring in range(max_ring + 1):
+                # Все точки кольца ring не ближе (ring - 1) ячеек от запроса
+                ring_min_m = max(ring - 1, 0) * min_cell_m
+                if ring_min_m > radius_m:
+                    break
+                if len(best) == limit and ring_min_m > -best[0][0]:
+                    break
+
+                for cell in _ring_cells(center_i, center_j, ring):
+                    for point_id in self._cells.get(cell, ()):
+                        if allowed is not None and point_id not in allowed:
+                            continue
+                        distance = haversine_m(lat, lon, *self._points[point_id])
+                        if distance > radius_m:
+                            continue
+                        if len(best) < limit:
+                            heapq.heappush(best, (-distance, point_id))
+                        elif distance < -best[0][0]:
+                            heapq.heapreplace(best, (-distance, point_id))
+
+            return sorted(((point_id, -neg) for neg, point_id in best), key=lambda item: item[1])
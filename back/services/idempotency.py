@@ -0,0 +1,283 @@
+"""
+Идемпотентность платежных запросов по заголовку Idempotency-Key.
+
+Мобильный клиент при обрыве связи повторяет запрос. Если у запроса
+есть Idempotency-Key, первый вызов выполняется как обычно, а его ответ
+сохраняется в таблицу idempotency_keys (и в LRU-кэш процесса). Повтор
+с тем же ключом получает сохраненный ответ без выполнения обработчика.
+
+Пока первый запрос выполняется, в таблице лежит запись-заглушка без
+status_code: параллельные дубликаты (в том числе на других воркерах)
+ждут ее завершения. Тот же ключ с другим телом запроса - ошибка 422.
+Ответы 5xx не сохраняются: повтор выполнится заново.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from db import models
+from db.database import SessionLocal
+from services.cache import create_cache
+
+# Эндпоинты, для которых учитывается заголовок
+IDEMPOTENT_ROUTES = (
+    ("POST", re.compile(r"^/bookings/?$")),
+    ("POST", re.compile(r"^/transactions/?$")),
+    ("POST", re.compile(r"^/transactions/deposit/?$")),
+    ("POST", re.compile(r"^/profile/\d+/top-up/?$")),
+)
+
+HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 100
+# Сколько хранится ответ, секунды
+KEY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# Сколько дубликат ждет завершения первого запроса; столько же живет заглушка упавшего запроса
+WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "30"))
+POLL_INTERVAL = 0.05
+# Раз в столько новых ключей удаляются просроченные записи
+PURGE_EVERY = 500
+
+NEW, DONE, BUSY, MISMATCH = "new", "done", "busy", "mismatch"
+
+# Последние завершенные ответы: повтор не ходит в БД
+_responses = create_cache("idempotency", ttl=KEY_TTL, maxsize=2048)
+
+Stored = Tuple[str, int, Optional[str], str]  # (request_hash, status_code, content_type, body)
+
+
+def is_idempotent_route(method: str, path: str) -> bool:
+    return any(method == route_method and pattern.match(path) for route_method, pattern in IDEMPOTENT_ROUTES)
+
+
+class IdempotencyStore:
+    def __init__(self):
+        self._reservations = 0
+
+    def _find(self, db, scope: str, key: str):
+        return db.query(models.IdempotencyKey).filter(
+            models.IdempotencyKey.key == key,
+            models.IdempotencyKey.scope == scope
+        ).first()
+
+    def reserve(self, scope: str, key: str, request_hash: str) -> Tuple[str, Optional[Stored]]:
+        """Занять ключ. NEW - выполнять запрос; DONE - вернуть сохраненный ответ;
+        BUSY - запрос с этим ключом еще выполняется; MISMATCH - ключ занят другим запросом."""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            row = self._find(db, scope, key)
+            if row is not None and row.expires_at <= now:
+                # Просроченный ответ или заглушка упавшего запроса
+                db.delete(row)
+                db.commit()
+                row = None
+
+            if row is None:
+                db.add(models.IdempotencyKey(
+                    key=key,
+                    scope=scope,
+                    request_hash=request_hash,
+                    expires_at=now + timedelta(seconds=WAIT_TIMEOUT)
+                ))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Параллельный запрос занял ключ раньше
+                    db.rollback()
+                    row = self._find(db, scope, key)
+                else:
+                    self._reservations += 1
+                    if self._reservations % PURGE_EVERY == 0:
+                        self.purge_expired(db)
+                    return NEW, None
+
+            if row is None:
+                return BUSY, None
+            if row.request_hash != request_hash:
+                return MISMATCH, None
+            if row.status_code is None:
+                return BUSY, None
+            return DONE, (row.request_hash, row.status_code, row.content_type, row.response_body)
+        finally:
+            db.close()
+
+    def complete(self, scope: str, key: str, status_code: int, content_type: Optional[str], body: str):
+        db = SessionLocal()
+        try:
+            db.query(models.IdempotencyKey).filter(
+                models.IdempotencyKey.key == key,
+                models.IdempotencyKey.scope == scope
+            ).update({
+                models.IdempotencyKey.status_code: status_code,
+                models.IdempotencyKey.content_type: content_type,
+                models.IdempotencyKey.response_body: body,
+                models.IdempotencyKey.expires_at: datetime.utcnow() + timedelta(seconds=KEY_TTL)
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def release(self, scope: str, key: str):
+        """Снять заглушку: запрос не удался, повтор выполнится заново"""
+        db = SessionLocal()
+        try:
+            db.query(models.IdempotencyKey).filter(
+                models.IdempotencyKey.key == key,
+                models.IdempotencyKey.scope == scope,
+                models.IdempotencyKey.status_code.is_(None)
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def purge_expired(self, db) -> int:
+        deleted = db.query(models.IdempotencyKey).filter(
+            models.IdempotencyKey.expires_at <= datetime.utcnow()
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+
+idempotency_store = IdempotencyStore()
+
+
+async def _send_response(send, status_code: int, content_type: Optional[str], body: bytes, replayed: bool = False):
+    headers = [(b"content-length", str(len(body)).encode())]
+    if content_type:
+        headers.append((b"content-type", content_type.encode()))
+    if replayed:
+        headers.append((b"idempotency-replayed", b"true"))
+    await send({"type": "http.response.start", "status": status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_error(send, status_code: int, detail: str):
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode()
+    await _send_response(send, status_code, "application/json", body)
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware: повтор запроса с тем же Idempotency-Key отдает сохраненный ответ"""
+
+    def __init__(self, app):
+        self.app = app
+        # Запросы, выполняющиеся в этом процессе: дубликаты ждут событие, а не опрашивают БД
+        self._inflight: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not is_idempotent_route(scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        key = None
+        for name, value in scope["headers"]:
+            if name == HEADER.encode():
+                key = value.decode("latin-1").strip()
+                break
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await _send_error(send, 400, f"Idempotency-Key длиннее {MAX_KEY_LENGTH} символов")
+            return
+
+        # Тело читаем целиком: оно нужно для отпечатка и затем передается обработчику
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+
+        route_scope = f"{scope['method']} {scope['path']}"
+        request_hash = hashlib.sha256(
+            route_scope.encode() + b"?" + scope.get("query_string", b"") + b"\n" + body
+        ).hexdigest()
+        cache_key = f"{route_scope}\n{key}"
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + WAIT_TIMEOUT
+        while True:
+            stored = _responses.get(cache_key)
+            if stored is None:
+                state, stored = await run_in_threadpool(idempotency_store.reserve, route_scope, key, request_hash)
+                if state == NEW:
+                    break
+                if state == MISMATCH:
+                    await _send_error(send, 422, "Idempotency-Key уже использован с другим запросом")
+                    return
+                if state == DONE:
+                    _responses.set(cache_key, stored)
+
+            if stored is not None:
+                if stored[0] != request_hash:
+                    await _send_error(send, 422, "Idempotency-Key уже использован с другим запросом")
+                    return
+                await _send_response(send, stored[1], stored[2], stored[3].encode(), replayed=True)
+                return
+
+            # Первый запрос еще выполняется - ждем его
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                await _send_error(send, 409, "Запрос с этим Idempotency-Key еще выполняется")
+                return
+            inflight = self._inflight.get(cache_key)
+            try:
+                if inflight is not None and inflight[0] is loop:
+                    await asyncio.wait_for(inflight[1].wait(), remaining)
+                else:
+                    await asyncio.sleep(min(POLL_INTERVAL, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+        event = asyncio.Event()
+        self._inflight[cache_key] = (loop, event)
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status_code = 500
+        content_type = None
+        response_chunks = []
+
+        async def capture_send(message):
+            nonlocal status_code, content_type
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-type":
+                        content_type = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        finally:
+            try:
+                if status_code < 500:
+                    response_body = b"".join(response_chunks).decode()
+                    await run_in_threadpool(
+                        idempotency_store.complete, route_scope, key, status_code, content_type, response_body
+                    )
+                    _responses.set(cache_key, (request_hash, status_code, content_type, response_body))
+                else:
+                    await run_in_threadpool(idempotency_store.release, route_scope, key)
+            finally:
+                self._inflight.pop(cache_key, None)
+                event.set()
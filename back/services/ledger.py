@@ -0,0 +1,132 @@
+"""
+Журнал баланса: транзакции - источник истины, баланс пользователя не хранится.
+
+Каждая транзакция несет balance_delta (+пополнение, -оплата). Баланс =
+снимок из balance_snapshots (или начальный баланс пользователя) + сумма
+balance_delta записей, еще не свернутых в снимок; это выражение -
+User.balance (column_property в db/models.py), оно читается одним SELECT.
+
+Запись - только INSERT в transactions, строка пользователя не меняется.
+Пополнения и записи с нулевым balance_delta пишутся без блокировок.
+Списание, которое не должно уводить баланс в минус, сначала берет
+блокировку счета (lock_account) и только потом проверяет баланс, чтобы
+параллельные списания не прочитали один и тот же баланс; параллельное
+пополнение баланс только увеличивает и ждать его не нужно.
+
+Фоновая компакция переносит хвост журнала в снимок, поэтому хвост
+остается коротким и чтение баланса не растет с историей. Граница
+свертки - не id: на PostgreSQL id из последовательности выдается при
+INSERT, и запись с меньшим id может закоммититься позже записи с
+большим. Поэтому компакция одним UPDATE ... RETURNING отмечает folded
+ровно те записи, которые видит закоммиченными, и прибавляет к снимку
+именно их сумму; запись, закоммиченная позже, остается в хвосте.
+"""
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import false, func, text, update
+from sqlalchemy.orm import Session
+
+from db import models
+from db.database import SessionLocal
+
+COMPACTION_ENABLED = os.getenv("LEDGER_COMPACTION_ENABLED", "1") != "0"
+COMPACTION_INTERVAL = float(os.getenv("LEDGER_COMPACTION_INTERVAL", "300"))
+COMPACTION_BATCH_SIZE = int(os.getenv("LEDGER_COMPACTION_BATCH_SIZE", "1000"))
+
+# Пространство ключей pg_advisory_xact_lock(класс, объект) для счетов пользователей
+ACCOUNT_LOCK_CLASS = 0x6c6564
+
+
+def lock_account(db: Session, user_id: int):
+    """Сериализовать списания со счета пользователя до конца транзакции.
+
+    PostgreSQL - pg_advisory_xact_lock по id пользователя, строка users
+    не меняется. SQLite - блокировка записи БД (BEGIN IMMEDIATE), если
+    транзакция еще не начала писать; иначе она уже держит эту блокировку.
+    """
+    connection = db.connection()
+    if connection.dialect.name == "postgresql":
+        connection.execute(
+            text("SELECT pg_advisory_xact_lock(:lock_class, :user_id)"),
+            {"lock_class": ACCOUNT_LOCK_CLASS, "user_id": user_id}
+        )
+    elif connection.dialect.name == "sqlite":
+        if not connection.connection.driver_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def balance(db: Session, user_id: int) -> Optional[float]:
+    return db.query(models.User.balance).filter(models.User.id == user_id).scalar()
+
+
+def compact(db: Session, batch_size: int = COMPACTION_BATCH_SIZE) -> dict:
+    """Перенести хвост журнала в снимки для пачки пользователей"""
+    transaction = models.Transaction
+    candidates = [user_id for (user_id,) in db.query(transaction.user_id).filter(
+        transaction.folded == false(),
+        transaction.balance_delta.isnot(None),
+        transaction.user_id.isnot(None)
+    ).group_by(transaction.user_id).order_by(transaction.user_id).limit(batch_size)]
+    if not candidates:
+        db.rollback()
+        return {"users": 0, "entries": 0}
+
+    # Отмечаются и суммируются одни и те же строки: незакоммиченные записи
+    # UPDATE не видит, они останутся в хвосте до следующей компакции
+    folded = db.execute(
+        update(transaction).where(
+            transaction.user_id.in_(candidates),
+            transaction.folded == false(),
+            transaction.balance_delta.isnot(None)
+        ).values(folded=True).returning(
+            transaction.user_id, transaction.id, transaction.balance_delta
+        ).execution_options(synchronize_session=False)
+    ).all()
+
+    tails = {}
+    for user_id, transaction_id, delta in folded:
+        total, last_id, count = tails.get(user_id, (0.0, 0, 0))
+        tails[user_id] = (total + delta, max(last_id, transaction_id), count + 1)
+
+    snapshot = models.BalanceSnapshot
+    user_ids = sorted(tails)
+    snapshots = {row.user_id: row for row in db.query(snapshot).filter(snapshot.user_id.in_(user_ids))}
+    opening = dict(db.query(models.User.id, models.User.opening_balance).filter(models.User.id.in_(user_ids)))
+
+    now = datetime.utcnow()
+    entries = 0
+    for user_id in user_ids:
+        delta, last_id, count = tails[user_id]
+        entries += count
+        current = snapshots.get(user_id)
+        if current is not None:
+            current.balance += delta
+            current.last_transaction_id = max(current.last_transaction_id, last_id)
+            current.updated_at = now
+        elif user_id in opening:
+            db.add(snapshot(
+                user_id=user_id,
+                balance=(opening[user_id] or 0.0) + delta,
+                last_transaction_id=last_id,
+                updated_at=now
+            ))
+    db.commit()
+    # Пачка считается по кандидатам: run_compaction продолжает, пока пачки полные
+    return {"users": len(candidates), "entries": entries}
+
+
+def run_compaction() -> dict:
+    """Задача планировщика: сворачивать пачки, пока есть хвосты"""
+    db = SessionLocal()
+    try:
+        total = {"users": 0, "entries": 0}
+        while True:
+            result = compact(db)
+            total["users"] += result["users"]
+            total["entries"] += result["entries"]
+            if result["users"] < COMPACTION_BATCH_SIZE:
+                return total
+    finally:
+        db.close()
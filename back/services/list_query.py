@@ -0,0 +1,181 @@
+"""
+Общие списки админки: сортировка по белому списку, keyset-курсор и
+дешевое общее количество.
+
+Роутер описывает список через ListQuery (модель, допустимые поля
+сортировки, счетчик из stats_counters) и сам применяет типизированные
+фильтры (filter_equal, filter_range, filter_prefix). ListQuery.page() сортирует,
+продолжает с курсора и отдает страницу; курсор следующей страницы -
+в заголовке X-Next-Cursor.
+
+Курсор непрозрачный: значение поля сортировки и id последней строки.
+Следующая страница читается индексом от этой точки, без OFFSET.
+
+Общее количество (with_total=true, заголовок X-Total-Count) берется:
+  counter  - из stats_counters, если фильтр - только статус или его нет;
+  estimate - из оценки планировщика PostgreSQL для больших выборок;
+  exact    - COUNT(*) (SQLite и небольшие выборки).
+Источник - в заголовке X-Total-Count-Source.
+"""
+import base64
+import json
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query, Session
+
+from services import stats_counters
+
+# Оценка планировщика меньше этого - считаем точно, COUNT(*) все равно дешевый
+EXACT_COUNT_BELOW = 10000
+
+
+def encode_cursor(value, row_id: int) -> str:
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    raw = json.dumps([value, row_id], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, column):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, row_id = json.loads(raw)
+        if value is not None:
+            python_type = column.type.python_type
+            if python_type in (datetime, date):
+                value = python_type.fromisoformat(value)
+            else:
+                value = python_type(value)
+        return value, int(row_id)
+    except (ValueError, TypeError, NotImplementedError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def filter_equal(query: Query, column, value) -> Query:
+    return query if value is None else query.filter(column == value)
+
+
+def filter_prefix(query: Query, columns: list, value: Optional[str]) -> Query:
+    """Строка в любом из столбцов начинается с value (без учета регистра; SQLite - только для латиницы)"""
+    if not value:
+        return query
+    # % и _ в значении - обычные символы, а не шаблон LIKE
+    pattern = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return query.filter(or_(*(column.ilike(pattern, escape="\\") for column in columns)))
+
+
+def filter_range(query: Query, column, date_from: Optional[date] = None, date_to: Optional[date] = None) -> Query:
+    """Фильтр по дате: from и to включительно"""
+    if date_from is not None:
+        query = query.filter(column >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        query = query.filter(column < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return query
+
+
+class ListQuery:
+    def __init__(self, model, sort_fields: Dict[str, object], counter: Optional[str] = None):
+        self.model = model
+        # Имя в параметре sort -> столбец; "-имя" - по убыванию
+        self.sort_fields = {"id": model.id, **sort_fields}
+        # Префикс счетчиков stats_counters ("bookings" -> bookings, bookings:<статус>)
+        self.counter = counter
+
+    def sort_column(self, sort: str):
+        descending = sort.startswith("-")
+        name = sort[1:] if descending else sort
+        column = self.sort_fields.get(name)
+        if column is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Сортировка по {name} недоступна. Доступны: {', '.join(self.sort_fields)}"
+            )
+        return column, descending
+
+    def page(
+        self,
+        db: Session,
+        query: Query,
+        response: Response,
+        sort: str = "id",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        with_total: bool = False,
+        filters: Optional[dict] = None
+    ) -> List:
+        """Отсортировать, продолжить с курсора и вернуть страницу (без limit - все строки)"""
+        column, descending = self.sort_column(sort)
+        id_column = self.model.id
+        # NULL всегда в конце, в обоих направлениях
+        nullable = column is not id_column and column.expression.nullable
+
+        if with_total:
+            total, source = self.total(db, query, filters or {})
+            response.headers["X-Total-Count"] = str(total)
+            response.headers["X-Total-Count-Source"] = source
+
+        if cursor is not None:
+            value, last_id = decode_cursor(cursor, column)
+            query = query.filter(self._after(column, id_column, value, last_id, descending, nullable))
+
+        if column is id_column:
+            order = [column.desc() if descending else column.asc()]
+        else:
+            # NULLS LAST, а не CASE: по убыванию это порядок индекса SQLite,
+            # и первая страница читается индексом без сортировки
+            first = column.desc() if descending else column.asc()
+            order = [first.nulls_last() if nullable else first, id_column.desc() if descending else id_column.asc()]
+        query = query.order_by(*order)
+
+        if limit is None:
+            return query.all()
+
+        # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+        rows = query.limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            response.headers["X-Next-Cursor"] = encode_cursor(getattr(last, column.key), last.id)
+        return rows
+
+    @staticmethod
+    def _after(column, id_column, value, last_id: int, descending: bool, nullable: bool):
+        """Условие "строго после (value, last_id)" в порядке сортировки"""
+        if column is id_column:
+            return id_column < last_id if descending else id_column > last_id
+        if value is None:
+            # Курсор уже в хвосте из NULL - дальше только по id
+            return and_(column.is_(None), id_column < last_id if descending else id_column > last_id)
+
+        if descending:
+            condition = or_(column < value, and_(column == value, id_column < last_id))
+        else:
+            condition = or_(column > value, and_(column == value, id_column > last_id))
+        return or_(condition, column.is_(None)) if nullable else condition
+
+    def total(self, db: Session, query: Query, filters: dict):
+        active = {name for name, value in filters.items() if value is not None}
+        if self.counter is not None and active <= {"status"}:
+            name = f"{self.counter}:{filters['status']}" if active else self.counter
+            return stats_counters.value(db, name), "counter"
+
+        if db.get_bind().dialect.name == "postgresql":
+            estimate = self._planner_estimate(db, query)
+            if estimate >= EXACT_COUNT_BELOW:
+                return estimate, "estimate"
+
+        return query.order_by(None).count(), "exact"
+
+    @staticmethod
+    def _planner_estimate(db: Session, query: Query) -> int:
+        """Оценка числа строк из EXPLAIN без выполнения запроса"""
+        compiled = query.statement.compile(dialect=db.get_bind().dialect)
+        plan = db.connection().exec_driver_sql(
+            "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,78 @@
+"""
+Расчет стоимости посуточной аренды.
+
+Цена за сутки по каждому тарифу считается один раз и хранится в кэше
+справочников под ключом с версией коллекции tariffs: изменение тарифа в
+любом воркере увеличивает версию, и новые цены действуют везде сразу
+после commit. Все места, где нужна цена (создание бронирования, расчет
+стоимости, пакетные котировки), используют этот модуль.
+"""
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from db import models
+from services.cache import reference_cache
+from services.versions import collection_versions
+
+HOURS_PER_DAY = 24
+MINUTES_PER_DAY = 1440
+
+
+def price_per_day(price_per_hour: Optional[float], price_per_minute: Optional[float]) -> Optional[float]:
+    """Цена за сутки: почасовой тариф * 24, иначе поминутный * 1440; None - цена не указана"""
+    if price_per_hour:
+        return price_per_hour * HOURS_PER_DAY
+    if price_per_minute:
+        return price_per_minute * MINUTES_PER_DAY
+    return None
+
+
+def get_tariff_prices(db: Session) -> Dict[int, dict]:
+    """{tariff_id: {"id", "name", "price_per_day"}} из кэша (при промахе - из БД)"""
+    def load():
+        return {
+            tariff.id: {
+                "id": tariff.id,
+                "name": tariff.name,
+                "price_per_day": price_per_day(tariff.price_per_hour, tariff.price_per_minute)
+            }
+            for tariff in db.query(models.Tariff).all()
+        }
+
+    key = collection_versions.cache_key(db, "tariffs", "tariffs:prices")
+    return reference_cache.get_or_set(key, load, tags=("tariffs",))
+
+
+def total_cost(price: float, days_count: int) -> float:
+    return round(price * days_count, 2)
+
+
+def quote_many(
+    prices: Dict[int, dict],
+    items: Sequence[Tuple[int, date, date]]
+) -> List[dict]:
+    """Котировки для набора (tariff_id, start_date, end_date) за один проход.
+
+    Для каждого элемента возвращается либо расчет, либо поле error.
+    """
+    results = []
+    for tariff_id, start_date, end_date in items:
+        tariff = prices.get(tariff_id)
+        days_count = end_date.toordinal() - start_date.toordinal()
+
+        if tariff is None:
+            results.append({"error": "Тариф не найден"})
+        elif days_count <= 0:
+            results.append({"error": "Дата окончания должна быть позже даты начала"})
+        elif tariff["price_per_day"] is None:
+            results.append({"error": "У тарифа не указана цена"})
+        else:
+            results.append({
+                "tariff_name": tariff["name"],
+                "days_count": days_count,
+                "price_per_day": round(tariff["price_per_day"], 2),
+                "total_cost": total_cost(tariff["price_per_day"], days_count)
+            })
+    return results
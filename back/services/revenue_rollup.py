@@ -0,0 +1,238 @@
+"""
+Сводная таблица выручки revenue_daily: день окончания x тариф x парковка.
+
+Строка пополняется в той же транзакции, где бронирование становится
+completed, поэтому отчет по выручке читает только сводку: число строк
+зависит от длины периода, а не от истории бронирований.
+
+Парковка в ключе - bookings.parking_zone_id, парковка автомобиля на
+момент завершения. Она записывается в бронирование тем же UPDATE,
+который его завершает, и дальше не меняется: переезд или удаление
+автомобиля не переносит выручку, и rebuild() дает те же строки, что
+накопленные по одной.
+
+Как и счетчики дашборда (stats_counters), изменения через ORM
+учитываются в before_flush, а массовые UPDATE в обход ORM вызывают
+record() сами. rebuild() пересчитывает сводку по бронированиям
+(scripts/backfill_revenue_daily.py).
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from db import models
+from db.database import dialect_insert
+from services.stats_counters import previous_status
+
+GRANULARITIES = ("day", "week", "month")
+MAX_BUCKETS = 1000
+
+# (время окончания, тариф, парковка, сумма)
+Entry = Tuple[datetime, Optional[int], Optional[int], float]
+
+
+def vehicle_zone():
+    """Парковка автомобиля бронирования - значение bookings.parking_zone_id в UPDATE завершения"""
+    return select(models.Vehicle.parking_zone_id).where(
+        models.Vehicle.id == models.Booking.vehicle_id
+    ).scalar_subquery()
+
+
+def as_date(value) -> date:
+    # func.date() на SQLite возвращает строку
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _upsert(connection, deltas: Dict[tuple, list]):
+    table = models.RevenueDaily.__table__
+    insert = dialect_insert(connection)
+    # Один порядок ключей во всех транзакциях - без взаимных блокировок
+    for key in sorted(deltas):
+        day, tariff_id, zone_id = key
+        revenue, count = deltas[key]
+        statement = insert(table).values(
+            day=day, tariff_id=tariff_id, parking_zone_id=zone_id, revenue=revenue, bookings_count=count
+        )
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.tariff_id, table.c.parking_zone_id],
+            set_={
+                "revenue": table.c.revenue + statement.excluded.revenue,
+                "bookings_count": table.c.bookings_count + statement.excluded.bookings_count
+            }
+        ))
+
+
+def _deltas(entries: Iterable[Entry], sign: int) -> Dict[tuple, list]:
+    deltas = defaultdict(lambda: [0.0, 0])
+    for end_time, tariff_id, zone_id, amount in entries:
+        if end_time is None:
+            continue
+        key = (as_date(end_time), tariff_id or 0, zone_id or 0)
+        deltas[key][0] += sign * (amount or 0.0)
+        deltas[key][1] += sign
+    return deltas
+
+
+def record(db: Session, entries: Iterable[Entry], sign: int = 1):
+    """Учесть завершенные бронирования в текущей транзакции (sign=-1 - отменить учет)"""
+    deltas = _deltas(entries, sign)
+    if deltas:
+        _upsert(db.connection(), deltas)
+
+
+def _zone_at_completion(session: Session, booking: models.Booking) -> Optional[int]:
+    if booking.parking_zone_id is None and booking.vehicle_id is not None:
+        vehicle = session.get(models.Vehicle, booking.vehicle_id)
+        if vehicle is not None:
+            booking.parking_zone_id = vehicle.parking_zone_id
+    return booking.parking_zone_id
+
+
+@event.listens_for(Session, "before_flush")
+def _track_completions(session: Session, flush_context, instances):
+    added, removed = [], []
+    for obj in session.new:
+        if isinstance(obj, models.Booking) and obj.status == "completed":
+            added.append((obj.end_time, obj.tariff_id, _zone_at_completion(session, obj), obj.total_cost))
+
+    for obj in session.dirty:
+        if not isinstance(obj, models.Booking):
+            continue
+        history = inspect(obj).attrs.status.history
+        if not history.added:
+            continue
+        was_completed = previous_status(session, obj) == "completed"
+        if history.added[0] == "completed" and not was_completed:
+            added.append((obj.end_time, obj.tariff_id, _zone_at_completion(session, obj), obj.total_cost))
+        elif was_completed and history.added[0] != "completed":
+            removed.append((obj.end_time, obj.tariff_id, obj.parking_zone_id, obj.total_cost))
+
+    for entries, sign in ((added, 1), (removed, -1)):
+        deltas = _deltas(entries, sign)
+        if deltas:
+            _upsert(session.connection(), deltas)
+
+
+def rebuild(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> dict:
+    """Пересчитать сводку по бронированиям за [start, end] (без границ - целиком)"""
+    rollup = models.RevenueDaily
+    delete = db.query(rollup)
+    if start is not None:
+        delete = delete.filter(rollup.day >= start)
+    if end is not None:
+        delete = delete.filter(rollup.day <= end)
+    deleted = delete.delete(synchronize_session=False)
+
+    day = func.date(models.Booking.end_time)
+    query = db.query(
+        day,
+        models.Booking.tariff_id,
+        models.Booking.parking_zone_id,
+        func.sum(models.Booking.total_cost),
+        func.count(models.Booking.id)
+    ).filter(
+        models.Booking.status == "completed",
+        models.Booking.end_time.isnot(None)
+    )
+    if start is not None:
+        query = query.filter(models.Booking.end_time >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        query = query.filter(models.Booking.end_time < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+
+    rows = defaultdict(lambda: [0.0, 0])
+    for booking_day, tariff_id, zone_id, revenue, count in query.group_by(
+        day, models.Booking.tariff_id, models.Booking.parking_zone_id
+    ):
+        key = (as_date(booking_day), tariff_id or 0, zone_id or 0)
+        rows[key][0] += revenue or 0.0
+        rows[key][1] += count
+
+    db.bulk_insert_mappings(rollup, [
+        {"day": key[0], "tariff_id": key[1], "parking_zone_id": key[2], "revenue": revenue, "bookings_count": count}
+        for key, (revenue, count) in rows.items()
+    ])
+    db.commit()
+    return {"deleted": deleted, "inserted": len(rows)}
+
+
+def ensure_initialized(db: Session):
+    """Первое заполнение на существующей БД (scripts/migrate.py): сводка пуста, а завершенные бронирования есть"""
+    if db.query(models.RevenueDaily.id).first() is None and db.query(models.Booking.id).filter(
+        models.Booking.status == "completed"
+    ).first() is not None:
+        rebuild(db)
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start: date, granularity: str) -> date:
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def revenue_series(db: Session, start: date, end: date, granularity: str) -> List[dict]:
+    """Выручка по периодам за [start, end]; периоды без выручки - с нулями"""
+    rollup = models.RevenueDaily
+    totals = defaultdict(lambda: [0.0, 0])
+    for day, revenue, count in db.query(
+        rollup.day, func.sum(rollup.revenue), func.sum(rollup.bookings_count)
+    ).filter(rollup.day >= start, rollup.day <= end).group_by(rollup.day):
+        bucket = totals[bucket_start(as_date(day), granularity)]
+        bucket[0] += revenue or 0.0
+        bucket[1] += count or 0
+
+    series = []
+    current = bucket_start(start, granularity)
+    while current <= end:
+        revenue, count = totals.get(current, (0.0, 0))
+        series.append({"date": current.isoformat(), "revenue": round(revenue, 2), "bookings": count})
+        current = next_bucket(current, granularity)
+    return series
+
+
+def revenue_by_tariff(db: Session, start: date, end: date) -> List[dict]:
+    rollup = models.RevenueDaily
+    rows = db.query(
+        models.Tariff.name,
+        func.sum(rollup.revenue),
+        func.sum(rollup.bookings_count)
+    ).join(
+        models.Tariff, models.Tariff.id == rollup.tariff_id
+    ).filter(
+        rollup.day >= start, rollup.day <= end
+    ).group_by(models.Tariff.name).all()
+    return [{"tariff": name, "revenue": float(revenue or 0), "bookings": count or 0} for name, revenue, count in rows]
+
+
+def revenue_by_zone(db: Session, start: date, end: date) -> List[dict]:
+    rollup = models.RevenueDaily
+    rows = db.query(
+        rollup.parking_zone_id,
+        models.ParkingZone.name,
+        func.sum(rollup.revenue),
+        func.sum(rollup.bookings_count)
+    ).outerjoin(
+        models.ParkingZone, models.ParkingZone.id == rollup.parking_zone_id
+    ).filter(
+        rollup.day >= start, rollup.day <= end
+    ).group_by(rollup.parking_zone_id, models.ParkingZone.name).all()
+    return [
+        {"parking_zone_id": zone_id or None, "parking_zone": name, "revenue": float(revenue or 0), "bookings": count or 0}
+        for zone_id, name, revenue, count in rows
+    ]
@@ -0,0 +1,197 @@
+"""
+Периодические фоновые задачи внутри процесса приложения.
+
+Каждая задача выполняется в своем daemon-потоке с интервалом и
+случайным разбросом (jitter), чтобы воркеры не просыпались одновременно.
+Планировщик запускается и останавливается в lifespan приложения (main.py).
+
+Задачи, которые должны выполняться одним процессом на все воркеры,
+берут аренду лидерства (LeaderLease) - запись в таблице scheduler_leases
+с владельцем и сроком. Работает одинаково на SQLite и PostgreSQL.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from db import models
+from db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+# Идентификатор процесса для аренды лидерства
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaderLease:
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self.held = False
+
+    def acquire(self) -> bool:
+        """Взять или продлить аренду. False - задачу выполняет другой процесс"""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            expires_at = now + timedelta(seconds=self.ttl)
+            lease = models.SchedulerLease
+            # Продлить свою аренду или забрать просроченную чужую
+            updated = db.query(lease).filter(
+                lease.name == self.name,
+                (lease.owner == OWNER_ID) | (lease.expires_at < now)
+            ).update({lease.owner: OWNER_ID, lease.expires_at: expires_at}, synchronize_session=False)
+            if not updated:
+                db.add(lease(name=self.name, owner=OWNER_ID, expires_at=expires_at))
+                try:
+                    db.flush()
+                except IntegrityError:
+                    # Запись есть и принадлежит другому живому процессу
+                    db.rollback()
+                    self.held = False
+                    return False
+            db.commit()
+            self.held = True
+            return True
+        finally:
+            db.close()
+
+    def release(self):
+        if not self.held:
+            return
+        db = SessionLocal()
+        try:
+            db.query(models.SchedulerLease).filter(
+                models.SchedulerLease.name == self.name,
+                models.SchedulerLease.owner == OWNER_ID
+            ).delete(synchronize_session=False)
+            db.commit()
+            self.held = False
+        finally:
+            db.close()
+
+
+class PeriodicTask:
+    def __init__(
+        self,
+        name: str,
+        interval: float,
+        func: Callable[[], object],
+        jitter: float = 0.1,
+        leader: bool = False,
+        metrics: Optional[Callable[[], dict]] = None
+    ):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        # Доля интервала, на которую случайно сдвигается каждый запуск
+        self.jitter = jitter
+        # Аренда живет три интервала: лидер, переживший сбой, теряет ее не сразу
+        self.lease = LeaderLease(name, ttl=interval * 3) if leader else None
+        # Дополнительные метрики задачи для /admin/metrics/tasks
+        self.metrics = metrics
+        self.skipped = 0
+        self.runs = 0
+        self.failures = 0
+        self.last_started: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.last_result = None
+        self.last_error: Optional[str] = None
+
+    def next_delay(self) -> float:
+        spread = self.interval * self.jitter
+        return max(0.0, self.interval + random.uniform(-spread, spread))
+
+    def run_once(self):
+        if self.lease is not None:
+            try:
+                leader = self.lease.acquire()
+            except Exception:
+                logger.exception("Не удалось взять аренду задачи %s", self.name)
+                leader = False
+            if not leader:
+                self.skipped += 1
+                return
+
+        self.last_started = datetime.utcnow()
+        started = time.perf_counter()
+        try:
+            self.last_result = self.func()
+            self.last_error = None
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.exception("Фоновая задача %s завершилась ошибкой", self.name)
+        finally:
+            self.runs += 1
+            self.last_duration = time.perf_counter() - started
+
+    def stats(self) -> dict:
+        stats = {
+            "name": self.name,
+            "interval_seconds": self.interval,
+            "leader": self.lease.held if self.lease is not None else None,
+            "runs": self.runs,
+            "skipped_not_leader": self.skipped,
+            "failures": self.failures,
+            "last_started": self.last_started,
+            "last_duration_ms": round(self.last_duration * 1000, 3) if self.last_duration is not None else None,
+            "last_result": self.last_result,
+            "last_error": self.last_error
+        }
+        if self.metrics is not None:
+            stats["metrics"] = self.metrics()
+        return stats
+
+
+class Scheduler:
+    def __init__(self):
+        self._tasks: Dict[str, PeriodicTask] = {}
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+
+    def add(self, task: PeriodicTask) -> PeriodicTask:
+        self._tasks[task.name] = task
+        return task
+
+    def get(self, name: str) -> Optional[PeriodicTask]:
+        return self._tasks.get(name)
+
+    def _loop(self, task: PeriodicTask):
+        # Первый запуск тоже со сдвигом: после деплоя воркеры стартуют одновременно
+        while not self._stop.wait(task.next_delay()):
+            task.run_once()
+
+    def start(self):
+        self._stop.clear()
+        for task in self._tasks.values():
+            thread = threading.Thread(target=self._loop, args=(task,), name=f"task-{task.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+        # Отдаем лидерство сразу, не дожидаясь истечения аренды
+        for task in self._tasks.values():
+            if task.lease is not None:
+                try:
+                    task.lease.release()
+                except Exception:
+                    logger.exception("Не удалось освободить аренду задачи %s", task.name)
+
+    def stats(self) -> List[dict]:
+        return [task.stats() for task in self._tasks.values()]
+
+
+scheduler = Scheduler()
@@ -0,0 +1,182 @@
+"""
+Счетчики пользователей, автомобилей, бронирований и инцидентов для дашборда.
+
+Счетчики хранятся в таблице stats_counters (имя -> значение) и меняются
+в той же транзакции, что и сами строки, поэтому дашборд читает их одним
+SELECT независимо от размера таблиц.
+
+Имена: "users", "vehicles", "vehicles:<статус>", "bookings",
+"bookings:<статус>", "incidents", "incidents:<статус>".
+
+Изменения через ORM (db.add, db.delete, obj.status = ...) учитываются
+автоматически в before_flush. Массовые UPDATE в обход ORM
+(synchronize_session=False) должны сами вызвать apply() с изменениями.
+Периодическая сверка (reconcile) пересчитывает все заново и исправляет
+расхождение.
+"""
+import os
+from collections import Counter
+from typing import Dict
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from db import models
+from db.database import SessionLocal, dialect_insert
+
+RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "3600"))
+
+# Модель -> префикс имени счетчика; у моделей со статусом считаются и статусы
+TRACKED = {
+    models.User: "users",
+    models.Vehicle: "vehicles",
+    models.Booking: "bookings",
+    models.Incident: "incidents",
+}
+
+
+def _has_status(model) -> bool:
+    return "status" in model.__table__.c
+
+
+def _new_status(obj):
+    # Значение по умолчанию столбца подставляется только при INSERT
+    if obj.status is not None:
+        return obj.status
+    default = type(obj).__table__.c.status.default
+    return default.arg if default is not None and default.is_scalar else None
+
+
+def previous_status(session: Session, obj):
+    """Статус строки в БД до этого flush"""
+    history = inspect(obj).attrs.status.history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    # Старое значение не загружено (истекло после commit) - читаем из БД
+    table = type(obj).__table__
+    return session.connection().execute(select(table.c.status).where(table.c.id == obj.id)).scalar()
+
+
+def _flush_deltas(session: Session) -> Counter:
+    deltas = Counter()
+    for obj in session.new:
+        prefix = TRACKED.get(type(obj))
+        if prefix is None:
+            continue
+        deltas[prefix] += 1
+        if _has_status(type(obj)):
+            deltas[f"{prefix}:{_new_status(obj)}"] += 1
+
+    for obj in session.deleted:
+        prefix = TRACKED.get(type(obj))
+        if prefix is None:
+            continue
+        deltas[prefix] -= 1
+        if _has_status(type(obj)):
+            deltas[f"{prefix}:{previous_status(session, obj)}"] -= 1
+
+    for obj in session.dirty:
+        prefix = TRACKED.get(type(obj))
+        if prefix is None or not _has_status(type(obj)):
+            continue
+        added = inspect(obj).attrs.status.history.added
+        if not added:
+            continue
+        old = previous_status(session, obj)
+        if old != added[0]:
+            deltas[f"{prefix}:{old}"] -= 1
+            deltas[f"{prefix}:{added[0]}"] += 1
+    return deltas
+
+
+def _upsert(connection, deltas: Dict[str, int]):
+    table = models.StatsCounter.__table__
+    insert = dialect_insert(connection)
+
+    # Один порядок имен во всех транзакциях - без взаимных блокировок на строках счетчиков
+    for name in sorted(deltas):
+        statement = insert(table).values(name=name, value=deltas[name])
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={"value": table.c.value + statement.excluded.value}
+        ))
+
+
+def apply(db: Session, deltas: Dict[str, int]):
+    """Изменить счетчики в текущей транзакции (для массовых UPDATE в обход ORM)"""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if deltas:
+        _upsert(db.connection(), deltas)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_changes(session: Session, flush_context, instances):
+    deltas = {name: delta for name, delta in _flush_deltas(session).items() if delta}
+    if deltas:
+        _upsert(session.connection(), deltas)
+
+
+def read(db: Session) -> Dict[str, int]:
+    return dict(db.query(models.StatsCounter.name, models.StatsCounter.value).all())
+
+
+def value(db: Session, name: str) -> int:
+    return db.query(models.StatsCounter.value).filter(models.StatsCounter.name == name).scalar() or 0
+
+
+def recount(db: Session) -> Dict[str, int]:
+    """Посчитать все счетчики заново по таблицам"""
+    actual = {}
+    for model, prefix in TRACKED.items():
+        if not _has_status(model):
+            actual[prefix] = db.query(func.count(model.id)).scalar()
+            continue
+        total = 0
+        for status, count in db.query(model.status, func.count(model.id)).group_by(model.status):
+            actual[f"{prefix}:{status}"] = count
+            total += count
+        actual[prefix] = total
+    return actual
+
+
+def reconcile(db: Session, fix: bool = True) -> dict:
+    """Сравнить счетчики с пересчетом; при fix=True записать пересчитанные значения"""
+    # Блокируем строки счетчиков до пересчета: транзакции, уже изменившие
+    # счетчики, успеют закоммититься, новые дождутся конца сверки
+    db.query(models.StatsCounter).update(
+        {models.StatsCounter.value: models.StatsCounter.value}, synchronize_session=False
+    )
+    stored = read(db)
+    actual = recount(db)
+
+    drift = {}
+    for name in sorted(set(stored) | set(actual)):
+        expected = actual.get(name, 0)
+        value = stored.get(name, 0)
+        if value != expected:
+            drift[name] = {"stored": value, "actual": expected, "diff": expected - value}
+
+    if fix and drift:
+        apply(db, {name: item["diff"] for name, item in drift.items()})
+        db.commit()
+    else:
+        db.rollback()
+    return {"checked": len(actual), "drift": drift, "fixed": bool(fix and drift)}
+
+
+def ensure_initialized(db: Session):
+    """Первое заполнение на существующей БД (scripts/migrate.py): таблица счетчиков пуста - заполнить пересчетом"""
+    if db.query(models.StatsCounter.name).first() is None:
+        reconcile(db)
+
+
+def run_reconcile() -> dict:
+    """Задача планировщика"""
+    db = SessionLocal()
+    try:
+        result = reconcile(db)
+        return {"checked": result["checked"], "drifted": len(result["drift"]), "fixed": result["fixed"]}
+    finally:
+        db.close()
@@ -0,0 +1,81 @@
+"""
+История клиента: поездки и платежи страницами от новых к старым и
+помесячная сводка.
+
+Списки сортируются по start_time / created_at по убыванию и читаются
+индексами (user_id, start_time) и (user_id, created_at): первая страница -
+обход диапазона индекса одного пользователя, следующие - продолжение
+с курсора (services/list_query.py).
+
+Сводка группирует строки пользователя по месяцам на стороне БД и
+отдает одну строку на месяц, а не всю историю.
+"""
+from collections import defaultdict
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from db import models
+from services.list_query import ListQuery, filter_range
+
+bookings_history = ListQuery(models.Booking, sort_fields={"start_time": models.Booking.start_time})
+transactions_history = ListQuery(models.Transaction, sort_fields={"created_at": models.Transaction.created_at})
+
+
+def month_of(db: Session, column):
+    """Месяц даты строкой YYYY-MM на стороне БД"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+
+def hours_between(db: Session, start, end):
+    """Длительность end - start в часах на стороне БД"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.extract("epoch", end - start) / 3600.0
+    return (func.julianday(end) - func.julianday(start)) * 24.0
+
+
+def monthly_summary(db: Session, user_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None) -> List[dict]:
+    """Итоги пользователя по месяцам (новые месяцы первыми)"""
+    months = defaultdict(lambda: {
+        "trips": 0, "trip_hours": 0.0, "trip_cost": 0.0,
+        "transactions": 0, "deposits": 0.0, "payments": 0.0
+    })
+
+    booking = models.Booking
+    month = month_of(db, booking.start_time)
+    completed = booking.status == "completed"
+    # duration_hours при создании бронирования не заполняется - часы считаются по времени поездки
+    hours = hours_between(db, booking.start_time, booking.end_time)
+    query = db.query(
+        month,
+        func.count(booking.id),
+        func.sum(case((and_(completed, booking.end_time.isnot(None)), hours), else_=0.0)),
+        func.sum(case((completed, booking.total_cost), else_=0.0))
+    ).filter(booking.user_id == user_id)
+    query = filter_range(query, booking.start_time, date_from, date_to)
+    for key, trips, hours, cost in query.group_by(month):
+        row = months[key]
+        row["trips"] = trips
+        row["trip_hours"] = round(hours or 0.0, 2)
+        row["trip_cost"] = round(cost or 0.0, 2)
+
+    transaction = models.Transaction
+    month = month_of(db, transaction.created_at)
+    query = db.query(
+        month,
+        func.count(transaction.id),
+        func.sum(case((transaction.transaction_type == "deposit", transaction.amount), else_=0.0)),
+        func.sum(case((transaction.transaction_type == "payment", transaction.amount), else_=0.0))
+    ).filter(transaction.user_id == user_id, transaction.created_at.isnot(None))
+    query = filter_range(query, transaction.created_at, date_from, date_to)
+    for key, count, deposits, payments in query.group_by(month):
+        row = months[key]
+        row["transactions"] = count
+        row["deposits"] = round(deposits or 0.0, 2)
+        row["payments"] = round(payments or 0.0, 2)
+
+    return [{"month": key, **months[key]} for key in sorted(months, reverse=True)]
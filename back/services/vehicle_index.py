@@ -0,0 +1,364 @@
+"""
+Индекс доступности автомобилей в памяти процесса.
+
+Для каждого фильтруемого поля (status, vehicle_type, tariff_id,
+parking_zone_id, brand) хранится отображение значение -> множество id.
+Фильтрованный запрос каталога - это пересечение множеств, без SQL.
+
+Индекс поддерживается вызовами upsert/remove/invalidate из мест,
+которые меняют автомобили (бронирования, админка, обновление картинок).
+Изменения из других процессов (воркеры API, отдельный обработчик
+бронирований) видны по версии коллекции vehicles в БД (VersionWatch в
+services/versions.py): если ее увеличил другой процесс, при следующем
+чтении, не позже чем через COLLECTION_SYNC_INTERVAL секунд, из БД
+перечитываются только измененные автомобили. Целиком индекс
+перестраивается, если изменение массовое (импорт, пакетное обновление).
+Заодно поддерживаются поисковый индекс по марке/модели (vehicle_search)
+и сетка координат для поиска ближайших машин (geo_index).
+Отключается переменной окружения VEHICLE_INDEX_ENABLED=0 - тогда
+каталог снова читается из БД.
+"""
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from db import models
+from schemas import vehicle as vehicle_schemas
+from services.geo_index import GridIndex
+from services.vehicle_search import VehicleSearchIndex
+from services.versions import VersionWatch
+
+# Больше стольких измененных автомобилей - перестроить индекс целиком
+MAX_DELTA = 1000
+
+# Поля, по которым строятся множества id (brand хранится в нижнем регистре)
+DIMENSIONS = ("status", "vehicle_type", "tariff_id", "parking_zone_id", "brand")
+
+
+def _dimension_key(dimension: str, value):
+    if dimension == "brand" and value is not None:
+        return value.lower()
+    return value
+
+
+class VehicleIndex:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.loaded = False
+        self._lock = threading.RLock()
+        # Растет при каждом точечном изменении: rebuild по нему узнает, что прочитанное из БД устарело
+        self._generation = 0
+        self._watch = VersionWatch("vehicles")
+        self._rows: Dict[int, dict] = {}
+        self._postings: Dict[str, Dict[object, Set[int]]] = {
+            dimension: defaultdict(set) for dimension in DIMENSIONS
+        }
+        self.search = VehicleSearchIndex()
+        self.geo = GridIndex()
+        self._zone_coords: Dict[int, Tuple[float, float]] = {}
+
+    def _position(self, row: dict, zone_coords: Dict[int, Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+        """Координаты автомобиля: собственные, иначе координаты его парковки"""
+        if row.get("latitude") is not None and row.get("longitude") is not None:
+            return row["latitude"], row["longitude"]
+        return zone_coords.get(row["parking_zone_id"])
+
+    # === Построение ===
+
+    # Сколько раз rebuild перечитывает БД, если во время чтения пришли точечные изменения
+    REBUILD_ATTEMPTS = 3
+
+    def rebuild(self, db: Session):
+        """Полностью перестроить индекс из таблицы vehicles.
+
+        БД читается без блокировки. Если за это время был upsert/remove/
+        invalidate, прочитанное могло их не увидеть - чтение повторяется.
+        Если изменения идут непрерывно, индекс подменяется, но остается
+        незагруженным и перестраивается при следующем чтении.
+        """
+        for attempt in range(self.REBUILD_ATTEMPTS):
+            with self._lock:
+                generation = self._generation
+            # Версия до чтения: запись между ними даст лишнее перестроение, а не пропуск
+            version = self._watch.current(db)
+            built = self._build(db)
+            with self._lock:
+                if self._generation == generation or attempt == self.REBUILD_ATTEMPTS - 1:
+                    self._rows, self._postings, self.search, self.geo, self._zone_coords = built
+                    self.loaded = self._generation == generation
+                    if self.loaded:
+                        self._watch.synced(version)
+                    return
+
+    def _build(self, db: Session):
+        rows = {}
+        postings = {dimension: defaultdict(set) for dimension in DIMENSIONS}
+        search = VehicleSearchIndex()
+        geo = GridIndex()
+        zone_coords = {
+            zone.id: (zone.latitude, zone.longitude)
+            for zone in db.query(models.ParkingZone).all()
+            if zone.latitude is not None and zone.longitude is not None
+        }
+
+        for vehicle in db.query(models.Vehicle).yield_per(1000):
+            row = vehicle_schemas.VehicleResponse.model_validate(vehicle).model_dump()
+            rows[row["id"]] = row
+            for dimension in DIMENSIONS:
+                postings[dimension][_dimension_key(dimension, row[dimension])].add(row["id"])
+            search.add(row["id"], row["brand"], row["model"])
+            position = self._position(row, zone_coords)
+            if position is not None:
+                geo.add(row["id"], *position)
+
+        return rows, postings, search, geo, zone_coords
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.rebuild(db)
+            return
+        changes = self._watch.changes(db)
+        if changes is None:
+            return
+        version, vehicle_ids = changes
+        if vehicle_ids is None or len(vehicle_ids) > MAX_DELTA:
+            self.rebuild(db)
+        elif self._apply_changes(db, vehicle_ids):
+            self._watch.advance(version)
+        else:
+            self._watch.retry()
+
+    def _apply_changes(self, db: Session, vehicle_ids) -> bool:
+        """Перечитать измененные другим процессом автомобили. False - мешали точечные изменения"""
+        with self._lock:
+            generation = self._generation
+        rows = {
+            vehicle.id: vehicle_schemas.VehicleResponse.model_validate(vehicle).model_dump()
+            for vehicle in db.query(models.Vehicle).filter(models.Vehicle.id.in_(vehicle_ids))
+        }
+        with self._lock:
+            # Свой upsert после чтения новее прочитанного - повторим при следующем чтении
+            if self._generation != generation or not self.loaded:
+                return False
+            for vehicle_id in vehicle_ids:
+                if vehicle_id in rows:
+                    self._store(rows[vehicle_id])
+                else:
+                    self._drop(vehicle_id)
+        return True
+
+    def invalidate(self):
+        """Сбросить индекс - он будет перестроен при следующем чтении"""
+        with self._lock:
+            self._generation += 1
+            self.loaded = False
+
+    # === Точечные изменения ===
+
+    def _unlink(self, row: dict):
+        for dimension in DIMENSIONS:
+            key = _dimension_key(dimension, row[dimension])
+            ids = self._postings[dimension].get(key)
+            if ids is not None:
+                ids.discard(row["id"])
+                if not ids:
+                    del self._postings[dimension][key]
+
+    def upsert(self, vehicle: models.Vehicle):
+        """Добавить или обновить автомобиль (вызывать после commit)"""
+        row = vehicle_schemas.VehicleResponse.model_validate(vehicle).model_dump()
+        with self._lock:
+            self._generation += 1
+            if not self.loaded:
+                return
+            self._store(row)
+
+    def _store(self, row: dict):
+        old = self._rows.get(row["id"])
+        if old is not None:
+            self._unlink(old)
+        self._rows[row["id"]] = row
+        for dimension in DIMENSIONS:
+            self._postings[dimension][_dimension_key(dimension, row[dimension])].add(row["id"])
+        self.search.add(row["id"], row["brand"], row["model"])
+        self._place(row)
+
+    def _place(self, row: dict):
+        position = self._position(row, self._zone_coords)
+        if position is not None:
+            self.geo.add(row["id"], *position)
+        else:
+            self.geo.discard(row["id"])
+
+    def remove(self, vehicle_id: int):
+        """Удалить автомобиль из индекса (вызывать после commit)"""
+        with self._lock:
+            self._generation += 1
+            if not self.loaded:
+                return
+            self._drop(vehicle_id)
+
+    def _drop(self, vehicle_id: int):
+        old = self._rows.pop(vehicle_id, None)
+        if old is not None:
+            self._unlink(old)
+        self.search.discard(vehicle_id)
+        self.geo.discard(vehicle_id)
+
+    def update_zone(self, zone_id: int, latitude: Optional[float], longitude: Optional[float]):
+        """Парковка создана/перемещена: пересчитать координаты ее автомобилей"""
+        with self._lock:
+            self._generation += 1
+            if not self.loaded:
+                return
+            if latitude is not None and longitude is not None:
+                self._zone_coords[zone_id] = (latitude, longitude)
+            else:
+                self._zone_coords.pop(zone_id, None)
+            for vehicle_id in self._postings["parking_zone_id"].get(zone_id, ()):
+                self._place(self._rows[vehicle_id])
+
+    def remove_zone(self, zone_id: int):
+        self.update_zone(zone_id, None, None)
+
+    # === Чтение ===
+
+    def get(self, vehicle_id: int) -> Optional[dict]:
+        with self._lock:
+            return self._rows.get(vehicle_id)
+
+    def query(
+        self,
+        status: Optional[str] = None,
+        vehicle_type: Optional[str] = None,
+        tariff_id: Optional[int] = None,
+        parking_zone_id: Optional[int] = None,
+        brand: Optional[str] = None,
+        after: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[List[dict], Optional[int]]:
+        """Те же фильтры, что и у SQL-запроса каталога. Возвращает (строки, следующий курсор)"""
+        with self._lock:
+            ids = self._filter_ids(status, vehicle_type, tariff_id, parking_zone_id, brand)
+            if ids is None:
+                ids = self._rows.keys()
+
+            if after is not None:
+                ordered = sorted(i for i in ids if i > after)
+            else:
+                ordered = sorted(ids)
+
+            next_cursor = None
+            if limit is not None and len(ordered) > limit:
+                ordered = ordered[:limit]
+                next_cursor = ordered[-1]
+
+            return [self._rows[i] for i in ordered], next_cursor
+
+    def nearby(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_m: float,
+        limit: int,
+        status: Optional[str] = None,
+        vehicle_type: Optional[str] = None,
+        tariff_id: Optional[int] = None,
+        parking_zone_id: Optional[int] = None,
+        brand: Optional[str] = None
+    ) -> List[Tuple[dict, float]]:
+        """Ближайшие автомобили с фильтрами каталога: [(строка, расстояние в метрах)]"""
+        with self._lock:
+            allowed = self._filter_ids(status, vehicle_type, tariff_id, parking_zone_id, brand)
+            found = self.geo.nearest(latitude, longitude, radius_m, limit, allowed=allowed)
+            return [(self._rows[vehicle_id], distance) for vehicle_id, distance in found]
+
+    def find(self, query: str, limit: int, status: Optional[str] = None) -> List[dict]:
+        """Поиск по марке/модели среди машин с заданным статусом: [{brand, model, score, ids}]"""
+        with self._lock:
+            allowed = self._filter_ids(status, None, None, None, None)
+            return self.search.search(query, limit=limit, allowed=allowed)
+
+    def _filter_ids(
+        self,
+        status: Optional[str],
+        vehicle_type: Optional[str],
+        tariff_id: Optional[int],
+        parking_zone_id: Optional[int],
+        brand: Optional[str]
+    ) -> Optional[Set[int]]:
+        """Пересечение множеств id по фильтрам; None - фильтров нет"""
+        with self._lock:
+            candidate_sets = []
+            if status:
+                candidate_sets.append(self._postings["status"].get(status, set()))
+            if vehicle_type:
+                candidate_sets.append(self._postings["vehicle_type"].get(vehicle_type, set()))
+            if tariff_id:
+                candidate_sets.append(self._postings["tariff_id"].get(tariff_id, set()))
+            if parking_zone_id:
+                candidate_sets.append(self._postings["parking_zone_id"].get(parking_zone_id, set()))
+            if brand:
+                # Аналог ilike '%brand%': различных марок немного, перебираем ключи
+                needle = brand.lower()
+                matched = set()
+                for key, ids in self._postings["brand"].items():
+                    if key is not None and needle in key:
+                        matched |= ids
+                candidate_sets.append(matched)
+
+            if not candidate_sets:
+                return None
+
+            # Пересекаем начиная с самого маленького множества
+            candidate_sets.sort(key=len)
+            ids = set(candidate_sets[0])
+            for other in candidate_sets[1:]:
+                ids &= other
+                if not ids:
+                    break
+            return ids
+
+    # === Проверка согласованности ===
+
+    def check(self, db: Session, repair: bool = False) -> dict:
+        """Сравнить индекс с БД. При repair=True индекс перестраивается"""
+        with self._lock:
+            loaded = self.loaded
+            indexed = dict(self._rows)
+
+        actual = {
+            vehicle.id: vehicle_schemas.VehicleResponse.model_validate(vehicle).model_dump()
+            for vehicle in db.query(models.Vehicle).yield_per(1000)
+        }
+
+        missing = sorted(set(actual) - set(indexed))
+        stale = sorted(set(indexed) - set(actual))
+        mismatched = sorted(
+            vehicle_id for vehicle_id in set(actual) & set(indexed)
+            if actual[vehicle_id] != indexed[vehicle_id]
+        )
+        consistent = loaded and not (missing or stale or mismatched)
+
+        if repair and not consistent:
+            self.rebuild(db)
+
+        return {
+            "enabled": self.enabled,
+            "loaded": loaded,
+            "consistent": consistent,
+            "indexed_count": len(indexed),
+            "db_count": len(actual),
+            "missing_ids": missing,
+            "stale_ids": stale,
+            "mismatched_ids": mismatched,
+            "repaired": repair and not consistent
+        }
+
+
+vehicle_index = VehicleIndex(
+    enabled=os.getenv("VEHICLE_INDEX_ENABLED", "1").lower() not in ("0", "false", "no")
+)
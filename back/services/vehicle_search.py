@@ -0,0 +1,193 @@
+"""
+Поиск и автодополнение по марке и модели автомобиля.
+
+Индекс строится не по автомобилям, а по различным парам "марка модель"
+(их сотни даже при тысячах машин): для каждой пары хранятся триграммы
+(как в pg_trgm) и множество id автомобилей. Префиксы для автодополнения
+лежат в отсортированном списке и ищутся бинарным поиском.
+"""
+import bisect
+import heapq
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+# Минимальное сходство по триграммам, ниже которого совпадение не считается
+MIN_SIMILARITY = 0.2
+
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def trigrams(text: str) -> Set[str]:
+    """Триграммы слов с отступами по краям: 'kia' -> '  k', ' ki', 'kia', 'ia '"""
+    result = set()
+    for word in normalize(text).split(" "):
+        if not word:
+            continue
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+
+class VehicleSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # "kia rio" -> {"brand": "Kia", "model": "Rio", "label": "Kia Rio", "ids": {...}, "trigrams": {...}}
+        self._terms: Dict[str, dict] = {}
+        self._by_trigram: Dict[str, Set[str]] = {}
+        # Отсортированные фразы для префиксного поиска: марка, модель, "марка модель"
+        self._phrases: List[str] = []
+        self._phrase_terms: Dict[str, Set[str]] = {}
+        self._id_term: Dict[int, str] = {}
+
+    def clear(self):
+        with self._lock:
+            self._terms = {}
+            self._by_trigram = {}
+            self._phrases = []
+            self._phrase_terms = {}
+            self._id_term = {}
+
+    @staticmethod
+    def _phrases_for(brand: str, model: str) -> Tuple[str, ...]:
+        return tuple({normalize(brand), normalize(model), normalize(f"{brand} {model}")} - {""})
+
+    def add(self, vehicle_id: int, brand: str, model: str):
+        key = normalize(f"{brand} {model}")
+        with self._lock:
+            if self._id_term.get(vehicle_id) == key:
+                return
+            self.discard(vehicle_id)
+
+            term = self._terms.get(key)
+            if term is None:
+                term = {
+                    "brand": brand,
+                    "model": model,
+                    "label": f"{brand} {model}",
+                    "ids": set(),
+                    "trigrams": trigrams(key)
+                }
+                self._terms[key] = term
+                for gram in term["trigrams"]:
+                    self._by_trigram.setdefault(gram, set()).add(key)
+                for phrase in self._phrases_for(brand, model):
+                    keys = self._phrase_terms.get(phrase)
+                    if keys is None:
+                        keys = self._phrase_terms[phrase] = set()
+                        bisect.insort(self._phrases, phrase)
+                    keys.add(key)
+
+            term["ids"].add(vehicle_id)
+            self._id_term[vehicle_id] = key
+
+    def discard(self, vehicle_id: int):
+        with self._lock:
+            key = self._id_term.pop(vehicle_id, None)
+            if key is None:
+                return
+            term = self._terms[key]
+            term["ids"].discard(vehicle_id)
+            if term["ids"]:
+                return
+
+            # Пара больше не встречается - убираем ее из всех структур
+            del self._terms[key]
+            for gram in term["trigrams"]:
+                keys = self._by_trigram.get(gram)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._by_trigram[gram]
+            for phrase in self._phrases_for(term["brand"], term["model"]):
+                keys = self._phrase_terms.get(phrase)
+                if keys is None:
+                    continue
+                keys.discard(key)
+                if not keys:
+                    del self._phrase_terms[phrase]
+                    i = bisect.bisect_left(self._phrases, phrase)
+                    if i < len(self._phrases) and self._phrases[i] == phrase:
+                        self._phrases.pop(i)
+
+    def _prefix_phrases(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._phrases, prefix)
+        end = bisect.bisect_left(self._phrases, prefix + "\uffff")
+        return self._phrases[start:end]
+
+    def search(self, query: str, limit: int = 20, allowed: Optional[Set[int]] = None) -> List[dict]:
+        """
+        Ранжированные пары марка/модель: [{brand, model, score, ids}].
+        allowed - допустимые id (фильтры каталога): пары без таких машин
+        не занимают место в limit, а в ids остаются только допустимые
+        """
+        q = normalize(query)
+        if not q:
+            return []
+
+        with self._lock:
+            scores: Dict[str, float] = {}
+
+            # Префиксные совпадения всегда выше нечетких
+            for phrase in self._prefix_phrases(q):
+                for key in self._phrase_terms[phrase]:
+                    bonus = 2.0 if phrase == q else 1.0 + len(q) / len(phrase)
+                    scores[key] = max(scores.get(key, 0.0), bonus)
+
+            # Нечеткое совпадение по триграммам (опечатки, середина слова)
+            q_grams = trigrams(q)
+            shared: Dict[str, int] = {}
+            for gram in q_grams:
+                for key in self._by_trigram.get(gram, ()):
+                    shared[key] = shared.get(key, 0) + 1
+            for key, count in shared.items():
+                if key in scores:
+                    continue
+                # Коэффициент Жаккара: |A ∩ B| / |A ∪ B|
+                similarity = count / (len(q_grams) + len(self._terms[key]["trigrams"]) - count)
+                if similarity >= MIN_SIMILARITY:
+                    scores[key] = similarity
+
+            ids_of = {}
+            for key in scores:
+                ids = self._terms[key]["ids"]
+                ids_of[key] = ids if allowed is None else ids & allowed
+            scores = {key: score for key, score in scores.items() if ids_of[key]}
+
+            ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+            return [
+                {
+                    "brand": self._terms[key]["brand"],
+                    "model": self._terms[key]["model"],
+                    "score": round(score, 3),
+                    "ids": sorted(ids_of[key])
+                }
+                for key, score in ranked
+            ]
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        """Автодополнение: фразы с заданным префиксом, популярные (больше машин) первыми"""
+        p = normalize(prefix)
+        if not p:
+            return []
+
+        with self._lock:
+            phrases = self._prefix_phrases(p)
+
+            def popularity(phrase):
+                return sum(len(self._terms[key]["ids"]) for key in self._phrase_terms[phrase])
+
+            ranked = heapq.nsmallest(limit, phrases, key=lambda phrase: (-popularity(phrase), phrase))
+            result = []
+            for phrase in ranked:
+                # Возвращаем написание из данных, а не нормализованное
+                term = self._terms[min(self._phrase_terms[phrase])]
+                if phrase == normalize(term["brand"]):
+                    result.append(term["brand"])
+                elif phrase == normalize(term["model"]):
+                    result.append(term["model"])
+                else:
+                    result.append(term["label"])
+            return result
@@ -0,0 +1,280 @@
+"""
+Версии коллекций для условных GET-запросов (ETag / Last-Modified).
+
+Каждая коллекция (tariffs, parking_zones, vehicles) имеет строку в таблице
+collection_versions: номер версии и время последнего изменения. Запись
+увеличивает версию в той же транзакции, что и сами данные (bump до
+commit), поэтому все воркеры API видят одну и ту же версию. Проверка
+условного запроса - один SELECT по первичному ключу, ответ 304 отдается
+без чтения коллекции и без сериализации.
+
+ETag включает версию и время изменения с микросекундами: после
+пересоздания БД версия может повториться, время - нет.
+
+Та же версия - сигнал для индексов в памяти процесса (VersionWatch):
+изменение, сделанное другим воркером API или отдельным процессом
+(scripts/booking_expiry_worker.py), видно по выросшей версии. Каждая
+версия записывает в collection_changes id измененных записей, и индекс
+перечитывает только их; полная перестройка - если версия изменила всю
+коллекцию (массовые операции) или индекс отстал дальше журнала.
+Версии коммитятся строго по порядку: bump держит блокировку строки
+версии до commit, поэтому журнал до прочитанной версии уже полный.
+Версию, увеличенную своим процессом, индекс принимает без чтения -
+свои изменения он уже применил через upsert/add.
+
+Коллекции индексов: vehicles - автомобили (каталог), bookings -
+календарь занятости; в журнале bookings - id автомобилей, чьи
+интервалы изменились. Бронирование меняет vehicles, только если
+меняет статус автомобиля.
+
+Кэш справочников процесса (services/cache.py) хранит данные под ключом
+с версией коллекции (cache_key): после изменения в любом воркере ключ
+новый, и тело ответа всегда не старше его ETag.
+
+Last-Modified в HTTP - с точностью до секунды, и две записи в одну
+секунду дают одинаковое значение. Поэтому, пока секунда последнего
+изменения не закончилась, Last-Modified не отдается: клиент, получивший
+его, получил и все изменения этой секунды, и If-Modified-Since не может
+вернуть ложный 304. ETag проверяется всегда.
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from db import models
+from db.database import dialect_insert
+
+# Время изменения коллекции, которую еще ни разу не меняли
+EPOCH = datetime(2000, 1, 1)
+# Как часто индексы в памяти сверяют версию с БД (секунды)
+SYNC_INTERVAL = float(os.getenv("COLLECTION_SYNC_INTERVAL", "1"))
+# Сколько последних версий каждой коллекции хранит collection_changes
+CHANGE_LOG_SIZE = int(os.getenv("COLLECTION_CHANGE_LOG_SIZE", "10000"))
+
+# Ключ в session.info: коллекция -> (версия до первого bump, версия после последнего)
+_PENDING = "collection_versions"
+
+
+class CollectionVersions:
+    table = models.CollectionVersion.__table__
+    changes = models.CollectionChange.__table__
+
+    def __init__(self):
+        self._listeners: Dict[str, List[Callable[[int, int], None]]] = {}
+
+    def subscribe(self, collection: str, listener: Callable[[int, int], None]):
+        """listener(before, after) вызывается после commit транзакции этого процесса, увеличившей версию"""
+        self._listeners.setdefault(collection, []).append(listener)
+
+    def bump(self, db: Session, *collections: str, changed: Optional[Iterable[int]] = None):
+        """Отметить изменение коллекций в текущей транзакции (вызывать до commit).
+
+        changed - id измененных записей (для bookings - id автомобилей),
+        None - изменена вся коллекция.
+        """
+        entity_ids = [None] if changed is None else sorted(set(changed))
+        if not entity_ids:
+            return
+        connection = db.connection()
+        insert = dialect_insert(connection)
+        now = datetime.utcnow()
+        # Один порядок строк во всех транзакциях - без взаимных блокировок
+        pending = db.info.setdefault(_PENDING, {})
+        for collection in sorted(set(collections)):
+            statement = insert(self.table).values(name=collection, version=1, modified_at=now)
+            version = connection.execute(statement.on_conflict_do_update(
+                index_elements=[self.table.c.name],
+                set_={"version": self.table.c.version + 1, "modified_at": now}
+            ).returning(self.table.c.version)).scalar_one()
+            connection.execute(self.changes.insert(), [
+                {"collection": collection, "version": version, "entity_id": entity_id} for entity_id in entity_ids
+            ])
+            connection.execute(self.changes.delete().where(
+                self.changes.c.collection == collection,
+                self.changes.c.version <= version - CHANGE_LOG_SIZE
+            ))
+            before = pending[collection][0] if collection in pending else version - 1
+            pending[collection] = (before, version)
+
+    def _notify(self, pending: Dict[str, Tuple[int, int]]):
+        for collection, (before, after) in pending.items():
+            for listener in self._listeners.get(collection, ()):
+                listener(before, after)
+
+    def read(self, db: Session, collection: str) -> Tuple[int, datetime]:
+        """Версия и время последнего изменения коллекции (naive UTC)"""
+        row = db.execute(
+            select(self.table.c.version, self.table.c.modified_at).where(self.table.c.name == collection)
+        ).first()
+        if row is None:
+            return 0, EPOCH
+        return row.version, row.modified_at
+
+    def changed_ids(self, db: Session, collection: str, after: int, upto: int) -> Optional[Set[int]]:
+        """id записей, измененных версиями (after, upto]; None - нужна полная перестройка"""
+        if upto - after > CHANGE_LOG_SIZE:
+            return None
+        rows = db.execute(
+            select(self.changes.c.version, self.changes.c.entity_id).where(
+                self.changes.c.collection == collection,
+                self.changes.c.version > after,
+                self.changes.c.version <= upto
+            )
+        ).all()
+        ids, versions = set(), set()
+        for version, entity_id in rows:
+            if entity_id is None:
+                return None
+            versions.add(version)
+            ids.add(entity_id)
+        # Версия без записей в журнале - его уже подрезали
+        if len(versions) != upto - after:
+            return None
+        return ids
+
+    def etag(self, collection: str, version, modified: datetime, variant: str = "") -> str:
+        digest = hashlib.sha1(variant.encode()).hexdigest()[:12]
+        return f'"{collection}-{version}-{_stamp(modified):x}-{digest}"'
+
+    def cache_key(self, db: Session, collection: str, key: str) -> str:
+        """Ключ кэша процесса для данных коллекции: читается после проверки ETag, данные - после ключа"""
+        version, modified = self.read(db, collection)
+        return f"{key}@{version}-{_stamp(modified):x}"
+
+
+def _stamp(modified: datetime) -> int:
+    return int(modified.replace(tzinfo=timezone.utc).timestamp() * 1_000_000)
+
+
+collection_versions = CollectionVersions()
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session: Session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        collection_versions._notify(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _rolled_back(session: Session):
+    session.info.pop(_PENDING, None)
+
+
+class VersionWatch:
+    """Согласованность индекса процесса с версией коллекции в БД.
+
+    Индекс запоминает версию, прочитанную перед построением (synced).
+    changes() не чаще раза в SYNC_INTERVAL секунд читает версию из БД:
+    если она другая - коллекцию изменил другой процесс, и changes()
+    возвращает id измененных записей (None - перестроить целиком).
+    Свои изменения сдвигают synced через subscribe.
+    """
+
+    def __init__(self, collection: str, interval: float = SYNC_INTERVAL):
+        self.collection = collection
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._synced: Optional[int] = None
+        self._checked_at = 0.0
+        collection_versions.subscribe(collection, self._local_bump)
+
+    def current(self, db: Session) -> int:
+        return collection_versions.read(db, self.collection)[0]
+
+    def synced(self, version: int):
+        with self._lock:
+            self._synced = version
+            self._checked_at = time.monotonic()
+
+    def advance(self, version: int):
+        """Изменения до version применены точечно"""
+        with self._lock:
+            if self._synced is not None and version > self._synced:
+                self._synced = version
+
+    def retry(self):
+        """Проверить версию при следующем чтении, не дожидаясь интервала"""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def changes(self, db: Session) -> Optional[Tuple[int, Optional[Set[int]]]]:
+        """None - индекс актуален; иначе (версия в БД, id измененных записей или None)"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.interval:
+                return None
+            self._checked_at = now
+            synced = self._synced
+        version = self.current(db)
+        if version == synced:
+            return None
+        if synced is None or version < synced:
+            # Индекс не построен или БД пересоздана
+            return version, None
+        return version, collection_versions.changed_ids(db, self.collection, synced, version)
+
+    def _local_bump(self, before: int, after: int):
+        with self._lock:
+            # Между before и after не было чужих изменений - индекс уже актуален
+            if self._synced == before:
+                self._synced = after
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified(db: Session, request: Request, response: Response, *collections: str) -> Optional[Response]:
+    """Проверить условный запрос к данным одной или нескольких коллекций.
+
+    Если у клиента актуальная копия - вернуть готовый ответ 304.
+    Иначе проставить ETag/Last-Modified в response и вернуть None.
+    """
+    versions = [collection_versions.read(db, collection) for collection in collections]
+    version = ".".join(str(number) for number, _ in versions)
+    modified = max(changed for _, changed in versions)
+    variant = request.url.path + "?" + "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    etag = collection_versions.etag("+".join(collections), version, modified, variant)
+    last_modified = modified.replace(microsecond=0, tzinfo=timezone.utc)
+    # Секунда последнего изменения еще идет - в нее может попасть следующая запись
+    second_closed = datetime.now(timezone.utc) >= last_modified + timedelta(seconds=1)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if second_closed:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, etag)
+    else:
+        # If-Modified-Since учитывается только без If-None-Match (RFC 9110)
+        fresh = False
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and second_closed:
+            try:
+                fresh = last_modified <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                fresh = False
+
+    if fresh:
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
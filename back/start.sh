@@ -1,4 +1,7 @@
 #!/usr/bin/env bash
 
+# Миграции схемы БД - один раз до старта воркеров
+python scripts/migrate.py
+
 # Запуск uvicorn на порту, который предоставляет Render
 uvicorn main:app --host 0.0.0.0 --port ${PORT:-8000}
@@ -0,0 +1,53 @@
+"""
+Общие настройки тестов: отдельная SQLite во временном каталоге.
+
+DATABASE_URL задается до первого импорта db.database - engine создается
+при импорте модуля.
+
+    pip install pytest
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+
+BACK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACK_DIR)
+
+_temp_dir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_temp_dir.name, 'test.db')}"
+os.environ.setdefault("DB_MODE", "sync")
+
+import pytest
+
+from db.database import SessionLocal
+from db.migrations import upgrade
+from scripts.migrate import initialize_derived
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    # Как scripts/migrate.py: шаги схемы, затем заполнение счетчиков и сводки выручки
+    initialize_derived(upgrade())
+    yield
+    _temp_dir.cleanup()
+
+
+@pytest.fixture(scope="session")
+def client(schema):
+    """Клиент API без запуска фоновых задач (lifespan не выполняется)"""
+    from fastapi.testclient import TestClient
+
+    # main проверяет версию схемы при импорте - схема к этому моменту уже создана
+    import main
+
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
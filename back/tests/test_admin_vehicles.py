@@ -0,0 +1,115 @@
+"""Массовое изменение автомобилей: dry_run, обязательный фильтр, конфликт с ограничениями БД"""
+import itertools
+
+import pytest
+from sqlalchemy import event
+
+from db import models
+from db.database import engine
+from services import stats_counters
+
+_numbers = itertools.count(1)
+
+
+def make_vehicles(client, count: int, color: str) -> list:
+    ids = []
+    for _ in range(count):
+        response = client.post("/admin/vehicles/", json={
+            "license_plate": f"М{next(_numbers):05d}АС",
+            "brand": "Lada",
+            "model": "Largus",
+            "vehicle_type": "wagon",
+            "color": color,
+            "tariff_id": 1
+        })
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+    return ids
+
+
+def bulk(client, body: dict):
+    return client.patch("/admin/vehicles/bulk", json=body)
+
+
+@pytest.fixture
+def foreign_keys():
+    """Проверка внешних ключей в SQLite (по умолчанию выключена) на время теста"""
+    def enable(dbapi_connection, connection_record, connection_proxy):
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    event.listen(engine, "checkout", enable)
+    yield
+    event.remove(engine, "checkout", enable)
+    # Соединения из пула с включенной проверкой больше не нужны
+    engine.dispose()
+
+
+def test_dry_run_counts_without_changes(client, db):
+    ids = make_vehicles(client, 3, "белый")
+
+    response = bulk(client, {"filter": {"ids": ids}, "patch": {"color": "синий"}, "dry_run": True})
+
+    assert response.status_code == 200
+    assert response.json() == {"matched": 3, "updated": 0, "dry_run": True}
+    colors = {color for (color,) in db.query(models.Vehicle.color).filter(models.Vehicle.id.in_(ids))}
+    assert colors == {"белый"}
+
+
+def test_update_by_filter(client, db):
+    ids = make_vehicles(client, 3, "серый")
+    etag = client.get("/vehicles/").headers["ETag"]
+
+    response = bulk(client, {"filter": {"ids": ids, "vehicle_type": "wagon"}, "patch": {"color": "черный"}})
+
+    assert response.json() == {"matched": 3, "updated": 3, "dry_run": False}
+    colors = {color for (color,) in db.query(models.Vehicle.color).filter(models.Vehicle.id.in_(ids))}
+    assert colors == {"черный"}
+    # Каталог видит изменение: ETag сменился, индекс перечитан
+    catalog = client.get("/vehicles/", headers={"If-None-Match": etag})
+    assert catalog.status_code == 200
+    assert {row["color"] for row in catalog.json() if row["id"] in ids} == {"черный"}
+
+
+def test_status_change_moves_counters(client, db):
+    ids = make_vehicles(client, 2, "красный")
+    before = stats_counters.read(db)
+
+    response = bulk(client, {"filter": {"ids": ids}, "patch": {"status": "maintenance"}})
+
+    assert response.json()["updated"] == 2
+    db.expire_all()
+    after = stats_counters.read(db)
+    assert after["vehicles:available"] == before["vehicles:available"] - 2
+    assert after["vehicles:maintenance"] == before.get("vehicles:maintenance", 0) + 2
+    assert stats_counters.reconcile(db, fix=False)["drift"] == {}
+
+
+def test_filter_is_required(client):
+    response = bulk(client, {"filter": {}, "patch": {"color": "зеленый"}})
+
+    assert response.status_code == 400
+
+
+def test_empty_patch_is_rejected(client):
+    ids = make_vehicles(client, 1, "желтый")
+
+    assert bulk(client, {"filter": {"ids": ids}, "patch": {}}).status_code == 400
+
+
+def test_unknown_patch_field_is_rejected(client):
+    ids = make_vehicles(client, 1, "желтый")
+
+    response = bulk(client, {"filter": {"ids": ids}, "patch": {"license_plate": "А000АА"}})
+
+    assert response.status_code == 400
+
+
+def test_constraint_violation_is_conflict(client, db, foreign_keys):
+    ids = make_vehicles(client, 2, "оранжевый")
+
+    response = bulk(client, {"filter": {"ids": ids}, "patch": {"parking_zone_id": 10 ** 6}})
+
+    assert response.status_code == 409
+    # Изменение откатилось целиком
+    zones = {zone for (zone,) in db.query(models.Vehicle.parking_zone_id).filter(models.Vehicle.id.in_(ids))}
+    assert zones == {None}
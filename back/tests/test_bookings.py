@@ -0,0 +1,150 @@
+"""Бронирование: полуинтервалы дат, проверка пересечений в одной транзакции, параллельные заказы"""
+import itertools
+import threading
+from datetime import date, timedelta
+
+from fastapi.testclient import TestClient
+
+from db import models
+from services.availability import availability_index
+
+_numbers = itertools.count(1)
+
+
+def make_user(db, opening_balance=100000.0) -> int:
+    number = next(_numbers)
+    user = models.User(
+        first_name="Тест",
+        last_name="Тестов",
+        email=f"booking{number}@example.com",
+        phone=f"+7100{number:07d}",
+        password="x",
+        opening_balance=opening_balance
+    )
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def make_vehicle(client) -> int:
+    response = client.post("/admin/vehicles/", json={
+        "license_plate": f"Б{next(_numbers):05d}ТС",
+        "brand": "Lada",
+        "model": "Vesta",
+        "vehicle_type": "sedan",
+        "tariff_id": 1
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def book(client, user_id: int, vehicle_id: int, start: date, end: date):
+    return client.post("/bookings/", params={"user_id": user_id}, json={
+        "vehicle_id": vehicle_id,
+        "tariff_id": 1,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat()
+    })
+
+
+def days(n: int) -> date:
+    return date.today() + timedelta(days=n)
+
+
+def test_future_booking_is_pending_and_half_open(client, db):
+    user_id = make_user(db)
+    vehicle_id = make_vehicle(client)
+
+    response = book(client, user_id, vehicle_id, days(10), days(12))
+
+    assert response.status_code == 200
+    booking = response.json()
+    assert booking["status"] == "pending"
+    assert booking["start_time"] == f"{days(10).isoformat()}T00:00:00"
+    assert booking["end_time"] == f"{days(12).isoformat()}T00:00:00"
+    # Будущее бронирование не забирает машину из каталога
+    assert client.get(f"/vehicles/{vehicle_id}").json()["status"] == "available"
+
+
+def test_overlapping_booking_is_rejected(client, db):
+    user_id = make_user(db)
+    vehicle_id = make_vehicle(client)
+    assert book(client, user_id, vehicle_id, days(10), days(12)).status_code == 200
+
+    for start, end in ((days(11), days(13)), (days(9), days(11)), (days(10), days(12)), (days(8), days(14))):
+        response = book(client, user_id, vehicle_id, start, end)
+        assert response.status_code == 400, (start, end)
+        assert "забронирован" in response.json()["detail"]
+
+
+def test_adjacent_bookings_do_not_overlap(client, db):
+    user_id = make_user(db)
+    vehicle_id = make_vehicle(client)
+
+    assert book(client, user_id, vehicle_id, days(10), days(12)).status_code == 200
+    # Аренда заканчивается в начале дня 12 - с этого дня машина свободна
+    assert book(client, user_id, vehicle_id, days(12), days(13)).status_code == 200
+    assert book(client, user_id, vehicle_id, days(9), days(10)).status_code == 200
+
+    busy = client.get(f"/vehicles/{vehicle_id}/availability", params={
+        "from": days(8).isoformat(),
+        "to": days(14).isoformat()
+    }).json()["busy"]
+    assert len(busy) == 3
+
+
+def test_insufficient_balance_creates_nothing(client, db):
+    user_id = make_user(db, opening_balance=0.0)
+    vehicle_id = make_vehicle(client)
+
+    response = book(client, user_id, vehicle_id, days(10), days(12))
+
+    assert response.status_code == 400
+    assert db.query(models.Booking).filter(models.Booking.vehicle_id == vehicle_id).count() == 0
+    assert db.query(models.Transaction).filter(models.Transaction.user_id == user_id).count() == 0
+
+
+def test_concurrent_bookings_of_same_dates(client, db, monkeypatch):
+    # Без быстрой проверки по индексу: все запросы доходят до проверки в транзакции
+    monkeypatch.setattr(availability_index, "find_overlap", lambda *args: None)
+    user_ids = [make_user(db) for _ in range(6)]
+    vehicle_id = make_vehicle(client)
+    barrier = threading.Barrier(len(user_ids))
+    statuses = []
+
+    def worker(user_id):
+        # Отдельный клиент на поток: у каждого свой event loop
+        own_client = TestClient(client.app)
+        barrier.wait()
+        statuses.append(book(own_client, user_id, vehicle_id, days(20), days(22)).status_code)
+
+    threads = [threading.Thread(target=worker, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [200] + [400] * (len(user_ids) - 1)
+    assert db.query(models.Booking).filter(
+        models.Booking.vehicle_id == vehicle_id,
+        models.Booking.status == "pending"
+    ).count() == 1
+    # Оплата списана только у победителя
+    paid = db.query(models.Transaction.user_id).filter(
+        models.Transaction.user_id.in_(user_ids),
+        models.Transaction.transaction_type == "payment"
+    ).all()
+    assert len(paid) == 1
+
+
+def test_booking_from_today_claims_vehicle(client, db):
+    user_id = make_user(db)
+    vehicle_id = make_vehicle(client)
+
+    response = book(client, user_id, vehicle_id, days(0), days(1))
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "active"
+    assert client.get(f"/vehicles/{vehicle_id}").json()["status"] == "in_use"
+    # Машина занята - второе бронирование на сегодня невозможно
+    assert book(client, make_user(db), vehicle_id, days(0), days(1)).status_code == 400
@@ -0,0 +1,104 @@
+"""Каталог и списки: курсорная пагинация, общее количество, условные GET (ETag/304)"""
+
+
+def collect_pages(client, url: str, params: dict, cursor_param: str) -> list:
+    """Пройти все страницы по X-Next-Cursor и вернуть строки подряд"""
+    rows = []
+    params = dict(params)
+    for _ in range(1000):
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        rows.extend(response.json())
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if next_cursor is None:
+            return rows
+        params[cursor_param] = next_cursor
+    raise AssertionError("Пагинация не закончилась")
+
+
+def test_vehicle_pages_cover_catalog_once(client):
+    full = client.get("/vehicles/", params={"status": "available"}).json()
+    assert len(full) > 7
+
+    paged = collect_pages(client, "/vehicles/", {"status": "available", "limit": 7}, "after")
+
+    ids = [vehicle["id"] for vehicle in paged]
+    assert ids == sorted(ids)
+    assert ids == [vehicle["id"] for vehicle in full]
+
+
+def test_last_vehicle_page_has_no_cursor(client):
+    full = client.get("/vehicles/", params={"status": "available"}).json()
+
+    response = client.get("/vehicles/", params={"status": "available", "limit": len(full)})
+
+    assert len(response.json()) == len(full)
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_admin_bookings_keyset_by_cost(client):
+    full = client.get("/admin/bookings/", params={"sort": "-total_cost"}).json()
+    assert len(full) > 4
+
+    paged = collect_pages(client, "/admin/bookings/", {"sort": "-total_cost", "limit": 4}, "cursor")
+
+    assert [booking["id"] for booking in paged] == [booking["id"] for booking in full]
+    costs = [booking["total_cost"] or 0.0 for booking in paged]
+    assert costs == sorted(costs, reverse=True)
+
+
+def test_admin_bookings_total_count(client):
+    full = client.get("/admin/bookings/", params={"status": "completed"}).json()
+
+    response = client.get("/admin/bookings/", params={"status": "completed", "limit": 2, "with_total": True})
+
+    assert int(response.headers["X-Total-Count"]) == len(full)
+    assert response.headers["X-Total-Count-Source"]
+
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.get("/admin/bookings/", params={"sort": "-total_cost", "limit": 2, "cursor": "не курсор"})
+
+    assert response.status_code == 400
+
+
+def test_catalog_etag_and_not_modified(client):
+    first = client.get("/vehicles/", params={"limit": 5})
+    etag = first.headers["ETag"]
+
+    cached = client.get("/vehicles/", params={"limit": 5}, headers={"If-None-Match": etag})
+
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+
+
+def test_etag_depends_on_query(client):
+    small = client.get("/vehicles/", params={"limit": 5}).headers["ETag"]
+    large = client.get("/vehicles/", params={"limit": 6}).headers["ETag"]
+
+    assert small != large
+    assert client.get("/vehicles/", params={"limit": 6}, headers={"If-None-Match": small}).status_code == 200
+
+
+def test_vehicle_change_invalidates_etag(client):
+    first = client.get("/vehicles/")
+    etag = first.headers["ETag"]
+    vehicle = first.json()[0]
+
+    changed = client.patch(f"/admin/vehicles/{vehicle['id']}", json={"color": "ETag-" + etag[-6:]})
+    assert changed.status_code == 200
+
+    response = client.get("/vehicles/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    updated = next(row for row in response.json() if row["id"] == vehicle["id"])
+    assert updated["color"] == "ETag-" + etag[-6:]
+
+
+def test_reference_etag(client):
+    first = client.get("/tariffs/")
+    etag = first.headers["ETag"]
+
+    assert client.get("/tariffs/", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/tariffs/", headers={"If-None-Match": '"stale"'}).status_code == 200
@@ -0,0 +1,144 @@
+"""Счетчики дашборда и сводка выручки после завершения бронирований вручную и обработчиком"""
+import itertools
+from datetime import date, datetime, time, timedelta
+
+from db import models
+from services import revenue_rollup, stats_counters
+from services.booking_expiry import BookingExpiryWorker
+
+_numbers = itertools.count(1)
+
+
+def make_user(db) -> int:
+    number = next(_numbers)
+    user = models.User(
+        first_name="Тест",
+        last_name="Тестов",
+        email=f"counters{number}@example.com",
+        phone=f"+7300{number:07d}",
+        password="x",
+        opening_balance=100000.0
+    )
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def make_vehicle(client) -> int:
+    response = client.post("/admin/vehicles/", json={
+        "license_plate": f"С{next(_numbers):05d}ЧТ",
+        "brand": "Lada",
+        "model": "Niva",
+        "vehicle_type": "suv",
+        "tariff_id": 1
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def book(client, user_id: int, vehicle_id: int, start: int, end: int) -> dict:
+    response = client.post("/bookings/", params={"user_id": user_id}, json={
+        "vehicle_id": vehicle_id,
+        "tariff_id": 1,
+        "start_date": (date.today() + timedelta(days=start)).isoformat(),
+        "end_date": (date.today() + timedelta(days=end)).isoformat()
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def rollup(db) -> dict:
+    db.expire_all()
+    return {
+        (row.day, row.tariff_id, row.parking_zone_id): (round(row.revenue, 2), row.bookings_count)
+        for row in db.query(models.RevenueDaily)
+        if row.bookings_count
+    }
+
+
+def revenue(client, params: dict) -> tuple:
+    """(выручка, число бронирований) за период из /admin/stats/revenue"""
+    series = client.get("/admin/stats/revenue", params=params).json()["revenue"]
+    return round(sum(item["revenue"] for item in series), 2), sum(item["bookings"] for item in series)
+
+
+def assert_consistent(db):
+    """Счетчики совпадают с пересчетом, сводка - с перестроением по бронированиям"""
+    db.expire_all()
+    assert stats_counters.reconcile(db, fix=False)["drift"] == {}
+    maintained = rollup(db)
+    revenue_rollup.rebuild(db)
+    assert rollup(db) == maintained
+
+
+def test_manual_completion(client, db):
+    assert_consistent(db)
+    user_id = make_user(db)
+    vehicle_id = make_vehicle(client)
+    booking = book(client, user_id, vehicle_id, 0, 1)
+    completed_before = stats_counters.value(db, "bookings:completed")
+
+    end_time = datetime.combine(date.today(), time(18, 30))
+    response = client.patch(f"/bookings/{booking['id']}/complete", json={
+        "end_time": end_time.isoformat(),
+        "total_cost": 1234.5
+    })
+
+    assert response.status_code == 200
+    assert stats_counters.value(db, "bookings:completed") == completed_before + 1
+    assert client.get(f"/vehicles/{vehicle_id}").json()["status"] == "available"
+    assert_consistent(db)
+
+    # Повторное завершение ничего не меняет
+    assert client.patch(f"/bookings/{booking['id']}/complete", json={
+        "end_time": end_time.isoformat(),
+        "total_cost": 1234.5
+    }).status_code == 400
+    assert_consistent(db)
+
+
+def test_revenue_endpoint_uses_rollup(client, db):
+    user_id = make_user(db)
+    vehicle_id = make_vehicle(client)
+    booking = book(client, user_id, vehicle_id, 0, 1)
+    day = date.today() - timedelta(days=400)
+    params = {"from": day.isoformat(), "to": day.isoformat()}
+    before = revenue(client, params)
+
+    client.patch(f"/bookings/{booking['id']}/complete", json={
+        "end_time": datetime.combine(day, time(12)).isoformat(),
+        "total_cost": 500.0
+    })
+
+    assert revenue(client, params) == (before[0] + 500.0, before[1] + 1)
+    assert_consistent(db)
+
+
+def test_expiry_completes_and_activates(client, db):
+    user_id = make_user(db)
+    current = make_vehicle(client)
+    future = make_vehicle(client)
+    ending = book(client, user_id, current, 0, 1)
+    starting = book(client, user_id, future, 2, 4)
+    worker = BookingExpiryWorker(batch_size=5)
+
+    # Аренда закончилась в начале завтрашнего дня
+    worker.run(now=datetime.combine(date.today() + timedelta(days=1), time(9)))
+
+    assert db.get(models.Booking, ending["id"]).status == "completed"
+    assert client.get(f"/vehicles/{current}").json()["status"] == "available"
+    assert_consistent(db)
+
+    worker.run(now=datetime.combine(date.today() + timedelta(days=2), time(9)))
+
+    db.expire_all()
+    assert db.get(models.Booking, starting["id"]).status == "active"
+    assert client.get(f"/vehicles/{future}").json()["status"] == "in_use"
+    assert_consistent(db)
+
+    worker.run(now=datetime.combine(date.today() + timedelta(days=5), time(9)))
+
+    db.expire_all()
+    assert db.get(models.Booking, starting["id"]).status == "completed"
+    assert client.get(f"/vehicles/{future}").json()["status"] == "available"
+    assert_consistent(db)
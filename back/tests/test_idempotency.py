@@ -0,0 +1,130 @@
+"""Idempotency-Key: повтор запроса отдает сохраненный ответ и не выполняет обработчик второй раз"""
+import itertools
+import uuid
+from datetime import date, timedelta
+
+from db import models
+
+_numbers = itertools.count(1)
+
+
+def make_user(db, opening_balance=0.0) -> int:
+    number = next(_numbers)
+    user = models.User(
+        first_name="Тест",
+        last_name="Тестов",
+        email=f"idempotency{number}@example.com",
+        phone=f"+7200{number:07d}",
+        password="x",
+        opening_balance=opening_balance
+    )
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def deposits(db, user_id: int) -> int:
+    return db.query(models.Transaction).filter(
+        models.Transaction.user_id == user_id,
+        models.Transaction.transaction_type == "deposit"
+    ).count()
+
+
+def test_top_up_replay(client, db):
+    user_id = make_user(db)
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+
+    first = client.post(f"/profile/{user_id}/top-up", json={"amount": 150.0}, headers=headers)
+    second = client.post(f"/profile/{user_id}/top-up", json={"amount": 150.0}, headers=headers)
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.headers["Idempotency-Replayed"] == "true"
+    assert "Idempotency-Replayed" not in first.headers
+    assert second.json() == first.json()
+    assert deposits(db, user_id) == 1
+    assert client.get(f"/profile/{user_id}").json()["balance"] == 150.0
+
+
+def test_replay_survives_process_cache(client, db):
+    from services import idempotency
+
+    user_id = make_user(db)
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    first = client.post(f"/profile/{user_id}/top-up", json={"amount": 70.0}, headers=headers)
+
+    # Другой воркер: ответа нет в кэше процесса, он читается из таблицы idempotency_keys
+    idempotency._responses.clear()
+    second = client.post(f"/profile/{user_id}/top-up", json={"amount": 70.0}, headers=headers)
+
+    assert second.headers["Idempotency-Replayed"] == "true"
+    assert second.json() == first.json()
+    assert deposits(db, user_id) == 1
+
+
+def test_booking_replay_creates_one_booking(client, db):
+    user_id = make_user(db, opening_balance=100000.0)
+    vehicle = client.post("/admin/vehicles/", json={
+        "license_plate": f"И{next(_numbers):05d}ДМ",
+        "brand": "Lada",
+        "model": "Granta",
+        "vehicle_type": "sedan",
+        "tariff_id": 1
+    }).json()
+    payload = {
+        "vehicle_id": vehicle["id"],
+        "tariff_id": 1,
+        "start_date": (date.today() + timedelta(days=30)).isoformat(),
+        "end_date": (date.today() + timedelta(days=31)).isoformat()
+    }
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+
+    first = client.post("/bookings/", params={"user_id": user_id}, json=payload, headers=headers)
+    # Без ключа тот же запрос был бы отклонен как пересечение дат
+    second = client.post("/bookings/", params={"user_id": user_id}, json=payload, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json()["id"] == first.json()["id"]
+    assert db.query(models.Booking).filter(models.Booking.vehicle_id == vehicle["id"]).count() == 1
+
+
+def test_same_key_with_other_body_is_rejected(client, db):
+    user_id = make_user(db)
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    assert client.post(f"/profile/{user_id}/top-up", json={"amount": 10.0}, headers=headers).status_code == 200
+
+    response = client.post(f"/profile/{user_id}/top-up", json={"amount": 20.0}, headers=headers)
+
+    assert response.status_code == 422
+    assert deposits(db, user_id) == 1
+
+
+def test_requests_without_key_are_not_deduplicated(client, db):
+    user_id = make_user(db)
+
+    for _ in range(2):
+        assert client.post(f"/profile/{user_id}/top-up", json={"amount": 5.0}).status_code == 200
+
+    assert deposits(db, user_id) == 2
+
+
+def test_client_error_is_replayed(client, db):
+    user_id = make_user(db)
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+
+    # Сохраняются все ответы, кроме 5xx: повтор получает ту же ошибку
+    first = client.post(f"/profile/{user_id}/top-up", json={"amount": -1.0}, headers=headers)
+    second = client.post(f"/profile/{user_id}/top-up", json={"amount": -1.0}, headers=headers)
+
+    assert first.status_code == second.status_code == 400
+    assert second.headers["Idempotency-Replayed"] == "true"
+    assert deposits(db, user_id) == 0
+
+
+def test_key_length_is_limited(client, db):
+    user_id = make_user(db)
+
+    response = client.post(f"/profile/{user_id}/top-up", json={"amount": 5.0}, headers={"Idempotency-Key": "k" * 101})
+
+    assert response.status_code == 400
+    assert deposits(db, user_id) == 0
@@ -0,0 +1,188 @@
+"""Журнал баланса: баланс по журналу, компакция в снимки, параллельные пополнения и списания"""
+import itertools
+import threading
+import time
+
+from sqlalchemy import event
+
+from db import models
+from db.database import SessionLocal, engine
+from services import ledger
+
+_numbers = itertools.count(1)
+
+
+def make_user(db, opening_balance=0.0) -> int:
+    number = next(_numbers)
+    user = models.User(
+        first_name="Тест",
+        last_name="Тестов",
+        email=f"ledger{number}@example.com",
+        phone=f"+7000{number:07d}",
+        password="x",
+        opening_balance=opening_balance
+    )
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def post(db, user_id: int, delta: float, transaction_type: str = "deposit"):
+    db.add(models.Transaction(
+        user_id=user_id,
+        transaction_type=transaction_type,
+        amount=abs(delta),
+        balance_delta=delta,
+        status="completed"
+    ))
+    db.commit()
+
+
+def snapshot(db, user_id: int):
+    db.expire_all()
+    return db.get(models.BalanceSnapshot, user_id)
+
+
+def test_balance_is_opening_plus_journal(db):
+    user_id = make_user(db, opening_balance=100.0)
+    post(db, user_id, 50.0)
+    post(db, user_id, -30.0, "payment")
+    # Запись без balance_delta (старые данные) в баланс не входит
+    db.add(models.Transaction(user_id=user_id, transaction_type="payment", amount=999.0, status="completed"))
+    db.commit()
+
+    assert ledger.balance(db, user_id) == 120.0
+    assert ledger.balance(db, 10 ** 9) is None
+
+
+def test_compaction_keeps_balance_and_folds_tail(db):
+    user_id = make_user(db, opening_balance=10.0)
+    for delta in (5.0, -3.0, 8.0):
+        post(db, user_id, delta)
+
+    result = ledger.run_compaction()
+
+    assert result["entries"] >= 3
+    current = snapshot(db, user_id)
+    assert current.balance == 20.0
+    last_id = db.query(models.Transaction.id).filter(models.Transaction.user_id == user_id).order_by(
+        models.Transaction.id.desc()
+    ).first()[0]
+    assert current.last_transaction_id == last_id
+    assert ledger.balance(db, user_id) == 20.0
+
+    # Новые записи - хвост после снимка; повторная компакция добавляет их к снимку
+    post(db, user_id, -7.0, "payment")
+    assert ledger.balance(db, user_id) == 13.0
+    ledger.run_compaction()
+    assert snapshot(db, user_id).balance == 13.0
+    assert ledger.balance(db, user_id) == 13.0
+
+
+def test_uncommitted_entry_survives_compaction(db):
+    """Запись, начатая до компакции и закоммиченная во время нее, не теряется"""
+    user_id = make_user(db)
+    post(db, user_id, 1.0)
+
+    writer = SessionLocal()
+    writer.add(models.Transaction(
+        user_id=user_id, transaction_type="deposit", amount=2.0, balance_delta=2.0, status="completed"
+    ))
+    writer.flush()
+
+    compaction = threading.Thread(target=ledger.run_compaction)
+    compaction.start()
+    time.sleep(0.3)
+    writer.commit()
+    writer.close()
+    compaction.join(timeout=10)
+
+    assert not compaction.is_alive()
+    assert ledger.balance(db, user_id) == 3.0
+    ledger.run_compaction()
+    assert snapshot(db, user_id).balance == 3.0
+    assert ledger.balance(db, user_id) == 3.0
+
+
+def test_credit_is_insert_only(db):
+    """Пополнение и запись без изменения баланса не пишут в строку пользователя"""
+    user_id = make_user(db)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        post(db, user_id, 5.0)
+        post(db, user_id, 0.0, "payment")
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    writes = [s for s in statements if s.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))]
+    assert writes and all(s.lstrip().upper().startswith("INSERT INTO TRANSACTIONS") for s in writes)
+
+
+def test_concurrent_debits_do_not_overdraw(db):
+    user_id = make_user(db, opening_balance=50.0)
+    results = []
+
+    def debit():
+        session = SessionLocal()
+        try:
+            ledger.lock_account(session, user_id)
+            if ledger.balance(session, user_id) < 10.0:
+                session.rollback()
+                results.append(False)
+                return
+            post(session, user_id, -10.0, "payment")
+            results.append(True)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=debit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 5
+    assert ledger.balance(db, user_id) == 0.0
+
+
+def test_concurrent_top_ups_with_compaction(db):
+    user_id = make_user(db, opening_balance=0.0)
+    threads_count, per_thread = 4, 25
+    errors = []
+    done = threading.Event()
+
+    def top_up():
+        session = SessionLocal()
+        try:
+            for _ in range(per_thread):
+                post(session, user_id, 1.0)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            session.close()
+
+    def compact_loop():
+        while not done.is_set():
+            ledger.run_compaction()
+
+    compactor = threading.Thread(target=compact_loop)
+    writers = [threading.Thread(target=top_up) for _ in range(threads_count)]
+    compactor.start()
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    done.set()
+    compactor.join()
+
+    assert not errors
+    expected = float(threads_count * per_thread)
+    assert ledger.balance(db, user_id) == expected
+    ledger.run_compaction()
+    assert snapshot(db, user_id).balance == expected
+    assert ledger.balance(db, user_id) == expected
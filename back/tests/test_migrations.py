@@ -0,0 +1,81 @@
+"""Версионированные миграции: шаги по порядку, повторный запуск, перевод бронирований на полуинтервалы"""
+import os
+from datetime import datetime, time
+
+import pytest
+from sqlalchemy import create_engine
+
+from db import models
+from db.database import SessionLocal
+from db.migrations import LATEST_VERSION, current_version, upgrade
+
+HALF_OPEN_STEP = 12
+
+
+@pytest.fixture
+def fresh_engine(tmp_path):
+    """Пустая БД, отдельная от общей тестовой"""
+    bind = create_engine(f"sqlite:///{os.path.join(tmp_path, 'migrations.db')}")
+    yield bind
+    bind.dispose()
+
+
+def add_booking(db, status: str, start: datetime, end) -> int:
+    booking = models.Booking(user_id=1, vehicle_id=1, tariff_id=1, start_time=start, end_time=end, status=status)
+    db.add(booking)
+    db.commit()
+    return booking.id
+
+
+def test_upgrade_applies_steps_once(fresh_engine):
+    assert current_version(fresh_engine) == 0
+
+    applied = upgrade(bind=fresh_engine)
+
+    assert [migration.version for migration in applied] == list(range(1, LATEST_VERSION + 1))
+    assert current_version(fresh_engine) == LATEST_VERSION
+    assert upgrade(bind=fresh_engine) == []
+
+
+def test_upgrade_stops_at_target(fresh_engine):
+    upgrade(HALF_OPEN_STEP - 1, bind=fresh_engine)
+    assert current_version(fresh_engine) == HALF_OPEN_STEP - 1
+
+    applied = upgrade(bind=fresh_engine)
+
+    assert applied[0].version == HALF_OPEN_STEP
+    assert applied[0].name == "bookings_half_open_end"
+
+
+def test_half_open_end_step(fresh_engine):
+    upgrade(HALF_OPEN_STEP - 1, bind=fresh_engine)
+    db = SessionLocal(bind=fresh_engine)
+    try:
+        start = datetime(2025, 3, 5)
+        # Конец дня end_date - прежний формат закрытого интервала
+        closed = add_booking(db, "active", start, datetime.combine(datetime(2025, 3, 6), time.max))
+        pending = add_booking(db, "pending", start, datetime.combine(datetime(2025, 3, 8), time.max))
+        open_ended = add_booking(db, "active", start, None)
+        # Уже полуинтервал и завершенные бронирования не трогаются
+        half_open = add_booking(db, "pending", start, datetime(2025, 3, 7))
+        completed_end = datetime.combine(datetime(2025, 3, 6), time.max)
+        completed = add_booking(db, "completed", start, completed_end)
+        partial = add_booking(db, "active", start, datetime(2025, 3, 6, 15, 30))
+    finally:
+        db.close()
+
+    upgrade(HALF_OPEN_STEP, bind=fresh_engine)
+
+    db = SessionLocal(bind=fresh_engine)
+    try:
+        def end_of(booking_id):
+            return db.get(models.Booking, booking_id).end_time
+
+        assert end_of(closed) == datetime(2025, 3, 6)
+        assert end_of(pending) == datetime(2025, 3, 8)
+        assert end_of(open_ended) == datetime(2025, 3, 6)
+        assert end_of(half_open) == datetime(2025, 3, 7)
+        assert end_of(completed) == completed_end
+        assert end_of(partial) == datetime(2025, 3, 6, 15, 30)
+    finally:
+        db.close()
@@ -193,6 +193,14 @@ export interface DashboardStats {
 }
 
 export interface RevenueStats {
+  from: string;
+  to: string;
+  granularity: 'day' | 'week' | 'month';
+  revenue: Array<{
+    date: string;
+    revenue: number;
+    bookings: number;
+  }>;
   daily_revenue_last_30_days: Array<{
     date: string;
     revenue: number;
@@ -202,4 +210,10 @@ export interface RevenueStats {
     revenue: number;
     bookings: number;
   }>;
+  revenue_by_zone: Array<{
+    parking_zone_id: number | null;
+    parking_zone: string | null;
+    revenue: number;
+    bookings: number;
+  }>;
 }